@@ -0,0 +1,105 @@
+"""
+Measures authenticated request throughput with and without the
+session-to-principal cache.
+
+Needs a reachable database configured through ``POSTGRESQL_URL``; a
+throwaway user and session are created and removed again.
+
+Usage:
+    python -m benchmarks.auth_cache [--requests 2000] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+from sqlmodel import Session, delete
+
+from db import User, UserSession, engine
+from main import app
+from routers.auth import create_session, session_cache
+
+ENDPOINTS = ["/users/profile", "/bookings/user"]
+
+
+def create_user() -> User:
+    with Session(engine) as session:
+        user = User(
+            username=f"bench_{uuid.uuid4().hex[:12]}",
+            name="Benchmark",
+            password=User.hash_password("benchpass"),
+        )
+
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+        return user
+
+
+def remove_user(user: User):
+    with Session(engine) as session:
+        session.execute(
+            delete(UserSession).where(UserSession.user_id == user.id)
+        )
+        session.execute(delete(User).where(User.id == user.id))
+        session.commit()
+
+
+async def measure(path: str, headers: dict, requests: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    remaining = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for _ in remaining:
+            response = await client.get(path, headers=headers)
+            assert response.status_code == 200, response.text
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    return requests / (time.perf_counter() - started)
+
+
+def run(requests: int, concurrency: int):
+    user = create_user()
+    ttl = session_cache.ttl
+
+    try:
+        with Session(engine) as session:
+            session_id = create_session(session, user.id)
+
+        headers = {"Cookie": f"session_id={session_id}"}
+
+        for path in ENDPOINTS:
+            session_cache.ttl = 0
+            session_cache.clear()
+            uncached = asyncio.run(
+                measure(path, headers, requests, concurrency)
+            )
+
+            session_cache.ttl = ttl
+            cached = asyncio.run(measure(path, headers, requests, concurrency))
+
+            print(
+                f"{path:<20}"
+                f"{uncached:>10.0f} req/s uncached"
+                f"{cached:>10.0f} req/s cached"
+                f"{cached / uncached:>8.2f}x"
+            )
+    finally:
+        session_cache.ttl = ttl
+        remove_user(user)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    run(args.requests, args.concurrency)
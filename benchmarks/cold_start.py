@@ -0,0 +1,130 @@
+"""
+Measures how long a fresh worker takes to serve its first request, and
+which modules its import spends the most time on.
+
+Every run starts a new interpreter that imports ``main``, runs the app's
+startup and serves ``GET /fields/``. Needs a reachable database
+configured through ``POSTGRESQL_URL``.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 5] [--top 20]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+WORKER = """
+import asyncio, json, time
+
+import httpx
+
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+
+async def first_request():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            response = await client.get("/fields/")
+            assert response.status_code == 200, response.text
+
+    return ready, time.perf_counter()
+
+
+ready, served = asyncio.run(first_request())
+print(json.dumps({
+    "import": imported - started,
+    "startup": ready - imported,
+    "first request": served - ready,
+}))
+"""
+
+
+def spawn() -> tuple[dict, float]:
+    started = time.perf_counter()
+    worker = subprocess.run(
+        [sys.executable, "-c", WORKER],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    return json.loads(worker.stdout), elapsed
+
+
+def profile_import() -> str:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+
+def import_costs(report: str) -> list[tuple[str, int, int]]:
+    """
+    Parses ``-X importtime`` output into (module, self, cumulative)
+    microseconds.
+    """
+    costs = []
+
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        own, cumulative, module = line.removeprefix("import time:").split("|")
+        costs.append((module.strip(), int(own), int(cumulative)))
+
+    return costs
+
+
+def run(runs: int, top: int):
+    phases = defaultdict(list)
+    totals = []
+
+    for _ in range(runs):
+        timings, elapsed = spawn()
+        totals.append(elapsed)
+
+        for phase, seconds in timings.items():
+            phases[phase].append(seconds)
+
+    print(f"{'phase':<24}{'median':>10}")
+    for phase, seconds in phases.items():
+        print(f"{phase:<24}{statistics.median(seconds) * 1000:>8.1f}ms")
+    print(
+        f"{'time to first request':<24}{statistics.median(totals) * 1000:>8.1f}ms"
+    )
+
+    costs = import_costs(profile_import())
+
+    packages = defaultdict(int)
+    for module, own, _ in costs:
+        packages[module.split(".")[0]] += own
+
+    print(f"\n{'package':<40}{'self':>10}")
+    for package, own in sorted(packages.items(), key=lambda x: -x[1])[:top]:
+        print(f"{package:<40}{own / 1000:>8.1f}ms")
+
+    print(f"\n{'module':<40}{'self':>10}{'cumulative':>12}")
+    for module, own, cumulative in sorted(costs, key=lambda x: -x[2])[:top]:
+        print(f"{module:<40}{own / 1000:>8.1f}ms{cumulative / 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    run(args.runs, args.top)
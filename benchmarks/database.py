@@ -0,0 +1,143 @@
+"""
+Compares throughput of the sync handlers, which hold a threadpool thread
+for every database round-trip, with their async variants on the asyncpg
+engine at high concurrency.
+
+Needs a reachable database configured through ``POSTGRESQL_URL`` and
+asyncpg installed; a throwaway owner, field and bookings are created and
+removed again.
+
+Usage:
+    python -m benchmarks.database [--requests 4000] [--concurrency 128]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, time as dtime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session
+
+from db import (
+    Booking,
+    FootballField,
+    Owner,
+    dispose_async_engine,
+    engine,
+)
+from db.maintenance import delete_owner
+from routers.auth import create_session
+from routers.bookings import get_field_bookings, get_field_bookings_async
+from routers.fields import get_fields, get_fields_async
+
+
+def build_app(fields_endpoint, field_bookings_endpoint) -> FastAPI:
+    app = FastAPI()
+    app.add_api_route("/fields/", fields_endpoint)
+    app.add_api_route("/bookings/field/{field_id}", field_bookings_endpoint)
+
+    return app
+
+
+def create_owner(bookings: int) -> tuple[int, int, str]:
+    with Session(engine) as session:
+        owner = Owner(
+            username=f"bench_{uuid.uuid4().hex[:12]}",
+            name="Benchmark",
+            password=Owner.hash_password("benchpass"),
+        )
+        session.add(owner)
+        session.commit()
+
+        field = FootballField(
+            name="Benchmark",
+            owner_id=owner.id,
+            location="Astana",
+            surface_type="grass",
+            price=2600,
+            width=68,
+            length=105,
+            start_time=dtime(10, 0, 0),
+            end_time=dtime(22, 0, 0),
+        )
+        session.add(field)
+        session.commit()
+
+        started = datetime(2023, 10, 1, 10, 0, 0)
+        session.add_all(
+            Booking(
+                user_id=owner.id,
+                field_id=field.id,
+                booking_date=started + timedelta(days=i),
+                booked_until=started + timedelta(days=i, hours=1),
+                total_price=2600,
+            )
+            for i in range(bookings)
+        )
+        session.commit()
+
+        owner_id, field_id = owner.id, field.id
+        session_id = create_session(session, owner_id, is_owner=True)
+
+        return owner_id, field_id, session_id
+
+
+async def measure(
+    app: FastAPI, path: str, headers: dict, requests: int, concurrency: int
+) -> float:
+    transport = httpx.ASGITransport(app=app)
+    remaining = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for _ in remaining:
+            response = await client.get(path, headers=headers)
+            assert response.status_code == 200, response.text
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    await dispose_async_engine()
+
+    return requests / elapsed
+
+
+def run(requests: int, concurrency: int, bookings: int):
+    owner_id, field_id, session_id = create_owner(bookings)
+    headers = {"Cookie": f"session_id={session_id}"}
+
+    sync_app = build_app(get_fields, get_field_bookings)
+    async_app = build_app(get_fields_async, get_field_bookings_async)
+
+    try:
+        for path in ["/fields/", f"/bookings/field/{field_id}"]:
+            sync = asyncio.run(
+                measure(sync_app, path, headers, requests, concurrency)
+            )
+            async_ = asyncio.run(
+                measure(async_app, path, headers, requests, concurrency)
+            )
+
+            print(
+                f"{path:<24}"
+                f"{sync:>10.0f} req/s sync"
+                f"{async_:>10.0f} req/s async"
+                f"{async_ / sync:>8.2f}x"
+            )
+    finally:
+        delete_owner(owner_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--bookings", type=int, default=20)
+    args = parser.parse_args()
+
+    run(args.requests, args.concurrency, args.bookings)
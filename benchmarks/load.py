@@ -0,0 +1,301 @@
+"""
+Load-tests the hot endpoints against a dataset of realistic size and
+writes latency percentiles and throughput per scenario to a JSON file, to
+compare between commits.
+
+``--seed`` first replaces everything in the database configured through
+``POSTGRESQL_URL`` with a generated dataset, see ``db.generate``, so point
+it at a throwaway database. Without ``--seed`` the data of an
+earlier seeding is reused.
+
+Requests go through ASGI to the app in this process by default, or over
+HTTP to a running server with ``--url``.
+
+Usage:
+    python -m benchmarks.load [--seed] [--fields 10000] [--users 100000]
+        [--bookings 1000000] [--requests 2000] [--concurrency 32]
+        [--url http://localhost:8000] [--output load.json]
+        [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import statistics
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+from sqlalchemy import text
+from sqlmodel import Session
+
+from db import engine
+from db.generate import DatasetOptions, generate
+from routers.auth import create_session
+
+PASSWORD = "benchpass"
+
+
+def seed(fields: int, users: int, bookings: int):
+    """
+    Replaces the database's contents with a generated dataset of
+    ``fields`` fields, a fifth as many owners, ``users`` users and
+    ``bookings`` bookings, see ``db.generate``.
+    """
+    generate(
+        engine,
+        DatasetOptions(
+            owners=max(fields // 5, 1),
+            fields=fields,
+            users=users,
+            bookings=bookings,
+            password=PASSWORD,
+            seed=0,
+        ),
+        truncate=True,
+    )
+
+
+def dataset() -> dict[str, int]:
+    with engine.connect() as connection:
+        return {
+            table: connection.execute(
+                text(f"SELECT count(*) FROM {table}")
+            ).scalar()
+            for table in ("owners", "football_fields", "users", "bookings")
+        }
+
+
+def booking_days() -> tuple[date, date]:
+    with engine.connect() as connection:
+        first, last = connection.execute(
+            text("SELECT min(booking_date), max(booking_date) FROM bookings")
+        ).one()
+
+    return first.date(), last.date()
+
+
+def create_sessions(count: int, users: int) -> list[str]:
+    with Session(engine) as session:
+        return [
+            create_session(session, user_id, username=f"user_{user_id}")
+            for user_id in random.sample(range(1, users + 1), count)
+        ]
+
+
+def scenarios(
+    sizes: dict[str, int],
+    days: tuple[date, date],
+    session_ids: list[str],
+) -> dict:
+    """
+    Returns, per scenario, a function that sends one request with the given
+    client, and the response statuses that count as success.
+    """
+    fields, users = sizes["football_fields"], sizes["users"]
+    first_day, last_day = days
+    booked_days = (last_day - first_day).days + 1
+
+    def cookie() -> dict:
+        return {"Cookie": f"session_id={random.choice(session_ids)}"}
+
+    def login(client: httpx.AsyncClient):
+        return client.post(
+            "/users/login",
+            json={
+                "username": f"user_{random.randint(1, users)}",
+                "password": PASSWORD,
+            },
+        )
+
+    def create_booking(client: httpx.AsyncClient):
+        # Past the seeded days, to conflict only with each other, and
+        # within the hours every generated field is open.
+        start = datetime.combine(
+            last_day + timedelta(days=1 + random.randrange(365)),
+            datetime.min.time(),
+        ) + timedelta(hours=random.randrange(10, 20))
+
+        return client.post(
+            "/bookings/",
+            json={
+                "field_id": random.randint(1, fields),
+                "booking_date": start.isoformat(),
+                "booked_until": (start + timedelta(hours=1)).isoformat(),
+            },
+            headers=cookie(),
+        )
+
+    def get_fields(client: httpx.AsyncClient):
+        return client.get("/fields/")
+
+    def get_field_day(client: httpx.AsyncClient):
+        day = first_day + timedelta(days=random.randrange(booked_days))
+        return client.get(
+            f"/fields/{random.randint(1, fields)}/bookings/{day.isoformat()}"
+        )
+
+    def get_profile(client: httpx.AsyncClient):
+        return client.get("/users/profile", headers=cookie())
+
+    return {
+        "login": (login, {200}),
+        "create_booking": (create_booking, {201, 422}),
+        "get_fields": (get_fields, {200}),
+        "get_field_day": (get_field_day, {200}),
+        "get_profile": (get_profile, {200}),
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    send,
+    expected: set[int],
+    requests: int,
+    concurrency: int,
+) -> dict:
+    remaining = iter(range(requests))
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await send(client)
+            latencies.append(time.perf_counter() - started)
+
+            if response.status_code not in expected:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": requests / elapsed,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentiles[49] * 1000,
+        "p95_ms": percentiles[94] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+    }
+
+
+async def load(
+    scenarios: dict, requests: int, concurrency: int, url: str | None
+) -> dict:
+    if url:
+        transport, base_url = None, url
+        lifespan = contextlib.nullcontext()
+    else:
+        from main import app
+
+        transport, base_url = httpx.ASGITransport(app=app), "http://bench"
+        lifespan = app.router.lifespan_context(app)
+
+    async with lifespan, httpx.AsyncClient(
+        transport=transport,
+        base_url=base_url,
+        timeout=60,
+        limits=httpx.Limits(max_connections=concurrency),
+    ) as client:
+        return {
+            name: await drive(client, send, expected, requests, concurrency)
+            for name, (send, expected) in scenarios.items()
+        }
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results: dict, baseline: dict | None):
+    print(
+        f"{'scenario':<16}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+        f"{'errors':>8}"
+    )
+
+    for name, x in results["scenarios"].items():
+        print(
+            f"{name:<16}{x['throughput']:>10.0f}"
+            f"{x['p50_ms']:>8.1f}ms{x['p95_ms']:>8.1f}ms{x['p99_ms']:>8.1f}ms"
+            f"{x['errors']:>8}"
+        )
+
+        old = (baseline or {}).get("scenarios", {}).get(name)
+        if old:
+            print(
+                f"{'  vs baseline':<16}"
+                f"{x['throughput'] / old['throughput'] - 1:>+10.0%}"
+                f"{x['p50_ms'] / old['p50_ms'] - 1:>+10.0%}"
+                f"{x['p95_ms'] / old['p95_ms'] - 1:>+10.0%}"
+                f"{x['p99_ms'] / old['p99_ms'] - 1:>+10.0%}"
+            )
+
+
+def run(args: argparse.Namespace):
+    if args.seed:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        seed(args.fields, args.users, args.bookings)
+
+    sizes = dataset()
+    session_ids = create_sessions(
+        min(args.sessions, sizes["users"]), sizes["users"]
+    )
+
+    results = {
+        "commit": commit(),
+        "date": datetime.utcnow().isoformat(),
+        "dataset": sizes,
+        "concurrency": args.concurrency,
+        "target": args.url or "asgi",
+        "scenarios": asyncio.run(
+            load(
+                scenarios(sizes, booking_days(), session_ids),
+                args.requests,
+                args.concurrency,
+                args.url,
+            )
+        ),
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    report(results, baseline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--fields", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--bookings", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--url")
+    parser.add_argument("--output", default="load.json")
+    parser.add_argument("--compare")
+
+    run(parser.parse_args())
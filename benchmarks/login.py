@@ -0,0 +1,107 @@
+"""
+Drives concurrent logins against the app while probing event loop lag,
+to show login throughput and how much a login burst delays everything
+else scheduled on the same worker.
+
+Needs a reachable database configured through ``POSTGRESQL_URL``;
+throwaway users are created and removed again.
+
+Usage:
+    python -m benchmarks.login [--users 32] [--logins 256] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+from sqlmodel import Session, delete
+
+from db import User, UserSession, engine, passwords
+from main import app
+
+
+def create_users(count: int) -> list[str]:
+    prefix = f"bench_{uuid.uuid4().hex[:8]}"
+    password = passwords.hash_password("benchpass")
+
+    with Session(engine) as session:
+        usernames = [f"{prefix}_{i}" for i in range(count)]
+        session.add_all(
+            User(username=username, name="Benchmark", password=password)
+            for username in usernames
+        )
+        session.commit()
+
+    return usernames
+
+
+def remove_users(usernames: list[str]):
+    with Session(engine) as session:
+        ids = session.scalars(
+            User.__table__.select()
+            .with_only_columns(User.id)
+            .where(User.username.in_(usernames))
+        ).all()
+        session.execute(
+            delete(UserSession).where(UserSession.user_id.in_(ids))
+        )
+        session.execute(delete(User).where(User.id.in_(ids)))
+        session.commit()
+
+
+async def run(users: int, logins: int, concurrency: int):
+    usernames = create_users(users)
+    transport = httpx.ASGITransport(app=app)
+    remaining = iter(range(logins))
+    done = asyncio.Event()
+    probe_latencies = []
+
+    async def login_worker(worker: int):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for i in remaining:
+                response = await client.post(
+                    "/users/login",
+                    json={
+                        "username": usernames[(worker + i) % users],
+                        "password": "benchpass",
+                    },
+                )
+                assert response.status_code == 200, response.text
+                client.cookies.clear()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            probe_latencies.append(time.perf_counter() - started - 0.01)
+
+    try:
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+    finally:
+        remove_users(usernames)
+
+    quantiles = statistics.quantiles(probe_latencies, n=100)
+    print(f"bcrypt rounds      {passwords.BCRYPT_ROUNDS}")
+    print(f"hashing threads    {passwords.password_pool.max_workers}")
+    print(f"logins/s           {logins / elapsed:.1f}")
+    print(f"loop lag p50       {quantiles[49] * 1000:.1f} ms")
+    print(f"loop lag p95       {quantiles[94] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--logins", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.users, args.logins, args.concurrency))
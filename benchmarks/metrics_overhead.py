@@ -0,0 +1,96 @@
+"""
+Measures the per-request cost of the telemetry middlewares by driving a
+FastAPI app with a trivial endpoint directly through ASGI, without and
+with the middlewares installed.
+
+No database is needed.
+
+Usage:
+    python -m benchmarks.metrics_overhead [--requests 20000]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from telemetry import MetricsMiddleware, QueryTimingMiddleware
+from telemetry.metrics import RequestMetrics
+
+
+def build_app(*middlewares) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/bookings/{booking_id}")
+    async def get_booking(booking_id: int):
+        return {"id": booking_id}
+
+    for middleware, options in middlewares:
+        app.add_middleware(middleware, **options)
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope(i: int) -> dict:
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/bookings/{i}",
+            "raw_path": f"/bookings/{i}".encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [],
+            "client": ("127.0.0.1", 1234),
+            "server": ("bench", 80),
+        }
+
+    for i in range(100):
+        await app(scope(i), receive, send)
+
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(scope(i), receive, send)
+
+    return (time.perf_counter() - started) / requests
+
+
+def run(requests: int):
+    variants = {
+        "bare": build_app(),
+        "metrics": build_app(
+            (MetricsMiddleware, {"metrics": RequestMetrics()})
+        ),
+        "metrics + queries": build_app(
+            (QueryTimingMiddleware, {}),
+            (MetricsMiddleware, {"metrics": RequestMetrics()}),
+        ),
+    }
+
+    bare = None
+    for name, app in variants.items():
+        seconds = asyncio.run(measure(app, requests))
+        bare = bare or seconds
+
+        print(
+            f"{name:<20}"
+            f"{seconds * 1e6:>8.1f} us/request"
+            f"{(seconds - bare) * 1e6:>+8.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    run(args.requests)
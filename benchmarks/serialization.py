@@ -0,0 +1,89 @@
+"""
+Compares the old ``vars()``-based serialization path with the explicit
+model serializers on large result lists.
+
+Usage:
+    python -m benchmarks.serialization [--rows 10000] [--repeat 5]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from db import Booking, FootballField
+
+
+def make_bookings(rows: int) -> list[Booking]:
+    return [
+        Booking(
+            id=i,
+            user_id=i % 1000,
+            field_id=i % 100,
+            booking_date=datetime(2023, 10, 21, 9, 0, 0),
+            booked_until=datetime(2023, 10, 21, 10, 0, 0),
+            total_price=2600,
+            status="pending",
+        )
+        for i in range(rows)
+    ]
+
+
+def make_fields(rows: int) -> list[FootballField]:
+    return [
+        FootballField(
+            id=i,
+            owner_id=i % 100,
+            name=f"field{i}",
+            location="Astana",
+            surface_type="grass",
+            price=2600,
+            width=68,
+            length=105,
+            start_time=time(10, 0, 0),
+            end_time=time(22, 0, 0),
+        )
+        for i in range(rows)
+    ]
+
+
+def old_path(rows: list) -> bytes:
+    """
+    The previous response path: ``dict(vars(row))`` per row, FastAPI's
+    ``jsonable_encoder`` and the stdlib JSON encoder.
+    """
+    content = jsonable_encoder([dict(vars(row).items()) for row in rows])
+    return json.dumps(content).encode()
+
+
+def new_path(rows: list) -> bytes:
+    """
+    The current response path: explicit ``json()`` serializers rendered
+    straight by ``ORJSONResponse``.
+    """
+    return orjson.dumps([row.json() for row in rows])
+
+
+def run(rows: int, repeat: int):
+    for name, dataset in (
+        ("bookings", make_bookings(rows)),
+        ("fields", make_fields(rows)),
+    ):
+        for label, path in (("old", old_path), ("new", new_path)):
+            best = min(
+                timeit.repeat(lambda: path(dataset), number=1, repeat=repeat)
+            )
+            print(
+                f"{name:<10}{label:<5}{rows:>8} rows {best * 1000:>10.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    run(args.rows, args.repeat)
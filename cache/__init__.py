@@ -0,0 +1,17 @@
+from .responses import (
+    MemoryBackend,
+    RedisBackend,
+    ResponseCache,
+    ResponseCacheMiddleware,
+    response_cache,
+)
+from .ttl import TTLCache
+
+__all__ = [
+    "MemoryBackend",
+    "RedisBackend",
+    "ResponseCache",
+    "ResponseCacheMiddleware",
+    "TTLCache",
+    "response_cache",
+]
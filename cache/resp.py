@@ -0,0 +1,148 @@
+import queue
+import socket
+from typing import Any
+from urllib.parse import unquote, urlparse
+
+
+class RedisError(Exception):
+    """
+    An error reply from the server.
+    """
+
+
+class RedisClient:
+    """
+    A minimal blocking client of the Redis protocol (RESP2), enough for
+    the response cache, with a small pool of connections shared between
+    threads.
+
+    Args:
+        url (str): ``redis://[:password@]host[:port][/db]``.
+        timeout (float): Seconds to wait for a connection or a reply.
+        max_idle (int): Idle connections kept open for reuse.
+    """
+
+    def __init__(self, url: str, timeout: float = 0.5, max_idle: int = 8):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported cache URL scheme {parsed.scheme}")
+
+        self.address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def execute(self, *commands: tuple) -> list[Any]:
+        """
+        Sends the commands in one round trip and returns their replies.
+
+        Raises:
+            OSError: If the server cannot be reached or does not answer.
+            RedisError: If a command fails.
+        """
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+
+        try:
+            connection.send(commands)
+            replies = [connection.read() for _ in commands]
+        except BaseException:
+            connection.close()
+            raise
+
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+
+        return replies
+
+    def _connect(self) -> "Connection":
+        connection = Connection(
+            socket.create_connection(self.address, timeout=self.timeout)
+        )
+
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+
+        if setup:
+            connection.send(setup)
+            for _ in setup:
+                reply = connection.read()
+                if isinstance(reply, RedisError):
+                    connection.close()
+                    raise reply
+
+        return connection
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class Connection:
+    def __init__(self, sock: socket.socket):
+        self.socket = sock
+        self.file = sock.makefile("rb")
+
+    def send(self, commands):
+        self.socket.sendall(b"".join(encode(command) for command in commands))
+
+    def read(self) -> Any:
+        line = self.file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the cache server")
+
+        kind, value = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return value.decode()
+        if kind == b"-":
+            return RedisError(value.decode())
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            length = int(value)
+            if length < 0:
+                return None
+
+            data = self.file.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(value)
+            if length < 0:
+                return None
+
+            return [self.read() for _ in range(length)]
+
+        raise ConnectionError(f"Unexpected reply from the cache: {line!r}")
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def encode(command: tuple) -> bytes:
+    parts = [b"*%d\r\n" % len(command)]
+
+    for arg in command:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+
+    return b"".join(parts)
@@ -0,0 +1,363 @@
+"""
+Caches the responses of public GET routes, keyed by path and query string,
+and drops them by tag when the data behind them changes.
+
+Routes opt in with ``response_cache.cache_route``, giving a TTL and tags
+formatted with the path parameters. Mutation handlers then call
+``response_cache.invalidate`` with the tags they affect. A response
+computed while a change commits can still be stored after the change's
+invalidation, so the TTL bounds how stale an entry can get.
+
+The default backend keeps entries in process, so every worker caches and
+invalidates on its own. With ``RESPONSE_CACHE_URL`` pointing at a Redis
+server, workers share entries and invalidations.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .resp import RedisClient
+from .ttl import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """
+    Keeps responses in a TTLCache of this process.
+
+    Args:
+        maxsize (int): The maximum number of responses kept.
+    """
+
+    io_bound = False
+    shared = False
+
+    def __init__(self, maxsize: int):
+        self.entries = TTLCache(maxsize=maxsize, ttl=float("inf"))
+
+    def get(self, key: str) -> bytes | None:
+        entry = self.entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]):
+        self.entries.set(key, (frozenset(tags), value), ttl=ttl)
+
+    def invalidate(self, tags: Iterable[str]):
+        tags = set(tags)
+        self.entries.evict(lambda _, entry: not tags.isdisjoint(entry[0]))
+
+    def clear(self):
+        self.entries.clear()
+
+
+class RedisBackend:
+    """
+    Keeps responses on a Redis server, shared between processes. Every tag
+    is a set of the keys cached under it, which an invalidation deletes
+    along with the keys.
+
+    Args:
+        url (str): ``redis://[:password@]host[:port][/db]``.
+        prefix (str): Prepended to every key, to share a database.
+        tag_ttl (float): Seconds a tag's set outlives its last addition,
+            longer than any route's TTL.
+    """
+
+    io_bound = True
+    shared = True
+
+    def __init__(
+        self, url: str, prefix: str = "responses:", tag_ttl: float = 3600
+    ):
+        self.client = RedisClient(url)
+        self.prefix = prefix
+        self.tag_ttl = tag_ttl
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.execute(("GET", self.prefix + key))[0]
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]):
+        key = self.prefix + key
+        commands = [("SET", key, value, "PX", max(int(ttl * 1000), 1))]
+
+        for tag in tags:
+            commands.append(("SADD", self.tag_key(tag), key))
+            commands.append(
+                ("PEXPIRE", self.tag_key(tag), int(self.tag_ttl * 1000))
+            )
+
+        self.client.execute(*commands)
+
+    def invalidate(self, tags: Iterable[str]):
+        tag_keys = [self.tag_key(tag) for tag in tags]
+        members = self.client.execute(*(("SMEMBERS", x) for x in tag_keys))
+
+        keys = {key for keys in members for key in keys}
+        self.client.execute(("DEL", *keys, *tag_keys))
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def clear(self):
+        cursor = 0
+        while True:
+            cursor, keys = self.client.execute(
+                ("SCAN", cursor, "MATCH", f"{self.prefix}*", "COUNT", 1000)
+            )[0]
+            if keys:
+                self.client.execute(("DEL", *keys))
+
+            cursor = int(cursor)
+            if not cursor:
+                return
+
+
+@dataclass
+class CacheRule:
+    path: str
+    ttl: float
+    tags: tuple[str, ...]
+
+    def __post_init__(self):
+        self.regex, _, self.convertors = compile_path(self.path)
+
+    def match(self, path: str) -> dict | None:
+        match = self.regex.match(path)
+        if match is None:
+            return None
+
+        return {
+            name: self.convertors[name].convert(value)
+            for name, value in match.groupdict().items()
+        }
+
+
+class ResponseCache:
+    """
+    Caches GET responses of the registered routes in ``backend``.
+
+    A backend failing is logged and treated as a miss, so the cache never
+    fails a request.
+
+    Args:
+        backend: A MemoryBackend or a RedisBackend.
+        enabled (bool): Whether responses are cached at all.
+    """
+
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.rules: list[CacheRule] = []
+
+        self.hits = 0
+        self.misses = 0
+
+    def cache_route(self, path: str, ttl: float, tags: Iterable[str] = ()):
+        """
+        Caches the responses of a route for ``ttl`` seconds.
+
+        Args:
+            path (str): The route's path template. Parameters should carry
+                a convertor, such as ``{field_id:int}``, wherever a fixed
+                path like ``/fields/owner`` could match them too.
+            ttl (float): Seconds a response stays cached.
+            tags (Iterable[str]): Tags to invalidate the responses by,
+                formatted with the path parameters, as in
+                ``field:{field_id}``.
+        """
+        self.rules.append(CacheRule(path, ttl, tuple(tags)))
+
+    def match(self, path: str) -> tuple[CacheRule, dict] | None:
+        for rule in self.rules:
+            params = rule.match(path)
+            if params is not None:
+                return rule, params
+
+        return None
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            logger.warning("Response cache lookup failed", exc_info=True)
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]):
+        try:
+            self.backend.set(key, value, ttl, tags)
+        except Exception:
+            logger.warning("Response cache store failed", exc_info=True)
+
+    def invalidate(self, *tags: str):
+        """
+        Drops every cached response tagged with one of ``tags``.
+        """
+        if not self.enabled or not tags:
+            return
+
+        try:
+            self.backend.invalidate(tags)
+        except Exception:
+            logger.error(
+                "Response cache invalidation of %s failed, cached responses "
+                "may be stale until they expire",
+                ", ".join(tags),
+                exc_info=True,
+            )
+
+    def clear(self):
+        self.backend.clear()
+
+
+def cache_key(scope: Scope) -> str:
+    query = sorted(
+        parse_qsl(scope["query_string"].decode(), keep_blank_values=True)
+    )
+    return f"{scope['path']}?{urlencode(query)}"
+
+
+# Recomputed or specific to the request that computed the response.
+UNCACHED_HEADERS = {b"content-length", b"server-timing", b"set-cookie"}
+
+
+def encode_entry(headers: list[tuple[bytes, bytes]], body: bytes) -> bytes:
+    """
+    Serializes a response's headers and body, one ``name: value`` line per
+    header and a blank line before the body, as in HTTP/1.1.
+    """
+    lines = [
+        name + b": " + value
+        for name, value in headers
+        if name.lower() not in UNCACHED_HEADERS
+    ]
+    return b"".join(line + b"\r\n" for line in lines) + b"\r\n" + body
+
+
+def decode_entry(entry: bytes) -> tuple[list[tuple[bytes, bytes]], bytes]:
+    if entry.startswith(b"\r\n"):
+        return [], entry[2:]
+
+    # Header lines cannot hold a blank line, the first one ends them.
+    head, _, body = entry.partition(b"\r\n\r\n")
+    headers = [tuple(line.split(b": ", 1)) for line in head.split(b"\r\n")]
+    return headers, body
+
+
+class ResponseCacheMiddleware:
+    """
+    Serves GET requests of the routes registered with ``cache`` from it,
+    and stores their successful responses. Responses carry an
+    ``X-Cache`` header saying whether they were a hit or a miss.
+    """
+
+    def __init__(self, app: ASGIApp, cache: ResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not self.cache.enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        matched = self.cache.match(scope["path"])
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        rule, params = matched
+        key = cache_key(scope)
+
+        cached = await self.call(self.cache.get, key)
+        if cached is not None:
+            headers, body = decode_entry(cached)
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        *headers,
+                        (b"content-length", str(len(body)).encode()),
+                        (b"x-cache", b"hit"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start = {}
+        chunks = []
+
+        async def send_and_keep(message: Message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-cache", b"miss"),
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+            await send(message)
+
+        started = time.monotonic()
+        await self.app(scope, receive, send_and_keep)
+
+        headers = start.get("headers", [])
+        if start.get("status") != 200 or any(
+            name.lower() == b"set-cookie" for name, _ in headers
+        ):
+            return
+
+        # Counted from the start, the response may be stale from then.
+        ttl = rule.ttl - (time.monotonic() - started)
+        if ttl <= 0:
+            return
+
+        await self.call(
+            self.cache.set,
+            key,
+            encode_entry(headers, b"".join(chunks)),
+            ttl,
+            [tag.format(**params) for tag in rule.tags],
+        )
+
+    async def call(self, func, *args):
+        if self.cache.backend.io_bound:
+            return await run_in_threadpool(func, *args)
+
+        return func(*args)
+
+
+def create_backend():
+    url = os.environ.get("RESPONSE_CACHE_URL")
+    if url:
+        return RedisBackend(url)
+
+    return MemoryBackend(
+        maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", 10000))
+    )
+
+
+response_cache = ResponseCache(
+    create_backend(),
+    enabled=os.environ.get("RESPONSE_CACHE", "true").lower() == "true",
+)
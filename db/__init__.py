@@ -1,12 +1,52 @@
-from .database import engine, session
-from .models import Booking, FootballField, Owner, User, UserSession
+from .database import (
+    ASYNC_DATABASE,
+    dispose_async_engine,
+    get_async_engine,
+    get_async_session,
+    get_engine,
+    get_session,
+    pool_status,
+)
+from .models import (
+    Booking,
+    FootballField,
+    Job,
+    OutboxEvent,
+    OutboxOffset,
+    Owner,
+    RevokedToken,
+    User,
+    UserSession,
+)
+from .replicas import get_read_session, pin_to_primary, replica_set
 
 __all__ = [
+    "ASYNC_DATABASE",
     "Booking",
     "FootballField",
+    "Job",
+    "OutboxEvent",
+    "OutboxOffset",
     "Owner",
+    "RevokedToken",
     "User",
-    "session",
     "UserSession",
+    "dispose_async_engine",
     "engine",
+    "get_async_engine",
+    "get_async_session",
+    "get_engine",
+    "get_read_session",
+    "get_session",
+    "pin_to_primary",
+    "pool_status",
+    "replica_set",
 ]
+
+
+def __getattr__(name: str):
+    # The engine is created on first use, see get_engine.
+    if name == "engine":
+        return get_engine()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,164 @@
 import os
+import threading
+import time
+from typing import AsyncIterator, Iterator
 
 from dotenv import load_dotenv
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .models import *  # noqa
 
 load_dotenv()
 
+
+class ObservedQueuePool(QueuePool):
+    """
+    A QueuePool that records how long checkouts wait for a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class ObservedAsyncQueuePool(ObservedQueuePool, AsyncAdaptedQueuePool):
+    """
+    The asyncio flavour of ObservedQueuePool, used by the async engine.
+    """
+
+
 database_url = os.environ.get("POSTGRESQL_URL")
-engine = create_engine(database_url)
+pool_options = dict(
+    pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+    max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    pool_pre_ping=os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+)
+
+
+def get_database_url() -> str:
+    if not database_url:
+        raise RuntimeError("POSTGRESQL_URL must be set")
+
+    return database_url
+
+
+_engine: Engine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    Returns the primary's engine, creating it on first use so that
+    importing the app neither loads the driver nor needs a database URL.
+    """
+    global _engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    get_database_url(),
+                    poolclass=ObservedQueuePool,
+                    **pool_options,
+                )
+
+    return _engine
+
+
+# Serves the hot handlers from async variants on an asyncpg engine
+# instead of blocking a threadpool thread per request.
+ASYNC_DATABASE = os.environ.get("DB_ASYNC", "false").lower() == "true"
+
+_async_engine: AsyncEngine | None = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Returns the asyncpg engine, creating it on first use so that asyncpg
+    is only required when the async handlers are enabled.
+    """
+    global _async_engine
+
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            make_url(get_database_url()).set(drivername="postgresql+asyncpg"),
+            poolclass=ObservedAsyncQueuePool,
+            **pool_options,
+        )
+
+    return _async_engine
+
+
+def get_session() -> Iterator[Session]:
+    """
+    Yields a database session scoped to a single request.
+    """
+    with Session(get_engine()) as session:
+        yield session
+
+
+async def dispose_async_engine():
+    """
+    Closes the async engine's connections, which are bound to the event
+    loop that opened them.
+    """
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """
+    Yields an async database session scoped to a single request.
+    """
+    async with AsyncSession(
+        get_async_engine(), expire_on_commit=False
+    ) as session:
+        yield session
+
+
+def pool_status() -> dict:
+    """
+    Returns the connection pools' usage and checkout wait statistics.
+    """
+    status = _pool_stats(get_engine().pool)
+
+    if _async_engine is not None:
+        status["async"] = _pool_stats(_async_engine.pool)
+
+    return status
 
 
-SQLModel.metadata.create_all(bind=engine)
-session = Session(autocommit=False, autoflush=False, bind=engine)
+def _pool_stats(pool: ObservedQueuePool) -> dict:
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool.checkouts,
+        "wait_seconds_total": pool.wait_seconds_total,
+        "wait_seconds_max": pool.wait_seconds_max,
+    }
@@ -0,0 +1,412 @@
+"""
+Generates realistic owners, fields, users and bookings and bulk-loads them
+with ``COPY``.
+
+Rows get explicit IDs following the tables' current maximum, so a dataset
+can be appended to existing data as long as nothing else writes meanwhile.
+The ID sequences are moved past the loaded rows afterwards.
+
+Every generated owner and user shares one password, hashed once up front.
+"""
+import io
+import itertools
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from db import passwords
+
+logger = logging.getLogger(__name__)
+
+FIRST_NAMES = """
+    Aigerim Alikhan Arman Aruzhan Asel Aibek Daniyar Dana Dias Madina
+    Nursultan Saule Timur Yerlan Zhanna Ilyas Kamila Miras Togzhan Adil
+""".split()
+LAST_NAMES = """
+    Abenov Akhmetov Bekov Dzhaksybekov Ibraimov Kassymov Nurlanov Omarov
+    Sadykov Seitkali Tokayev Zhumabekov
+""".split()
+CITIES = ["Astana", "Almaty", "Shymkent", "Karaganda", "Aktobe", "Taraz"]
+SURFACES = ["grass", "artificial", "indoor", "futsal"]
+
+# Field sizes in meters: full-size, seven-a-side and five-a-side pitches.
+SIZES = [(68, 105), (45, 65), (25, 42)]
+
+# Bookings start on the hour or half past, within a block of four
+# half-hour slots, and last one, one and a half or two hours.
+SLOT = timedelta(minutes=30)
+BLOCK = 4
+DURATIONS = {2: 5, 3: 2, 4: 3}
+
+STATUSES = {"confirmed": 0.75, "pending": 0.15, "canceled": 0.10}
+
+
+@dataclass
+class DatasetOptions:
+    """
+    The shape of a generated dataset.
+
+    Attributes:
+        owners (int): Owners to generate.
+        fields (int): Fields, spread over the owners.
+        users (int): Users booking the fields.
+        bookings (int): Bookings, fewer if the fields fill half of their
+            time within ``days``.
+        start (date): The first day bookings fall on.
+        days (int): The number of days bookings are spread over.
+        popularity (float): The Zipf exponent of how bookings spread over
+            fields, 0 for evenly.
+        evening_peak (float): How much likelier an evening slot is booked
+            than a morning one.
+        password (str): Every owner's and user's password.
+        seed (int | None): The random seed, for reproducible datasets.
+    """
+
+    owners: int = 2_000
+    fields: int = 10_000
+    users: int = 100_000
+    bookings: int = 1_000_000
+    start: date = date(2024, 1, 1)
+    days: int = 365
+    popularity: float = 1.0
+    evening_peak: float = 3.0
+    password: str = "password"
+    seed: int | None = None
+
+
+class Generator:
+    """
+    Produces the rows of a dataset as tuples in the column order of
+    ``COLUMNS``, with IDs starting after ``first_ids``.
+    """
+
+    COLUMNS = {
+        "owners": (
+            "id",
+            "username",
+            "name",
+            "password",
+            "email",
+            "phone_number",
+            "instagram",
+        ),
+        "football_fields": (
+            "id",
+            "owner_id",
+            "name",
+            "location",
+            "surface_type",
+            "about",
+            "image",
+            "width",
+            "length",
+            "price",
+            "start_time",
+            "end_time",
+        ),
+        "users": ("id", "username", "name", "password"),
+        "bookings": (
+            "id",
+            "user_id",
+            "field_id",
+            "booking_date",
+            "booked_until",
+            "total_price",
+            "status",
+        ),
+    }
+
+    def __init__(self, options: DatasetOptions, first_ids: dict[str, int]):
+        self.options = options
+        self.first_ids = first_ids
+        self.random = random.Random(options.seed)
+        self.password = passwords.hash_password(options.password)
+
+        # Filled in while generating fields, read while generating bookings.
+        self.fields = []
+
+    def name(self) -> str:
+        return (
+            f"{self.random.choice(FIRST_NAMES)} "
+            f"{self.random.choice(LAST_NAMES)}"
+        )
+
+    def owners(self) -> Iterator[tuple]:
+        first = self.first_ids["owners"]
+
+        for id in range(first, first + self.options.owners):
+            yield (
+                id,
+                f"owner_{id}",
+                self.name(),
+                self.password,
+                f"owner_{id}@example.com",
+                f"+7701{id % 10**7:07d}",
+                None,
+            )
+
+    def football_fields(self) -> Iterator[tuple]:
+        first = self.first_ids["football_fields"]
+        first_owner = self.first_ids["owners"]
+
+        for id in range(first, first + self.options.fields):
+            width, length = self.random.choice(SIZES)
+            opens = self.random.choice([6, 7, 8, 9, 10])
+            closes = self.random.choice([21, 22, 23])
+            price = self.random.randrange(1500, 6001, 100)
+
+            self.fields.append((id, opens, closes, price))
+
+            yield (
+                id,
+                first_owner + self.random.randrange(self.options.owners),
+                f"Field {id}",
+                self.random.choice(CITIES),
+                self.random.choice(SURFACES),
+                None,
+                None,
+                width,
+                length,
+                price,
+                f"{opens:02d}:00",
+                f"{closes:02d}:00",
+            )
+
+    def users(self) -> Iterator[tuple]:
+        first = self.first_ids["users"]
+
+        for id in range(first, first + self.options.users):
+            yield (id, f"user_{id}", self.name(), self.password)
+
+    def bookings(self) -> Iterator[tuple]:
+        """
+        Yields bookings field by field. A field's day is cut into two-hour
+        blocks, and each booking takes a block of its own, so that none of
+        them overlap.
+        """
+        options = self.options
+        ids = itertools.count(self.first_ids["bookings"])
+        first_user = self.first_ids["users"]
+        days = [
+            datetime.combine(options.start, datetime.min.time())
+            + timedelta(days=day)
+            for day in range(options.days)
+        ]
+
+        for (field_id, opens, closes, price), count in zip(
+            self.fields, self.field_bookings()
+        ):
+            blocks = range(self.blocks_per_day(opens, closes))
+            weights = self.block_weights(len(blocks))
+
+            taken = set()
+            while len(taken) < count:
+                missing = count - len(taken)
+                taken.update(
+                    zip(
+                        self.random.choices(range(options.days), k=missing),
+                        self.random.choices(blocks, weights, k=missing),
+                    )
+                )
+
+            # Rows are drawn in bulk per field, which is much faster.
+            opening = timedelta(hours=opens)
+            for (day, block), offset, length, user, status in zip(
+                sorted(taken),
+                self.random.choices((0, 1), k=count),
+                self.random.choices(
+                    list(DURATIONS), list(DURATIONS.values()), k=count
+                ),
+                self.random.choices(range(options.users), k=count),
+                self.random.choices(
+                    list(STATUSES), list(STATUSES.values()), k=count
+                ),
+            ):
+                length = min(length, BLOCK - offset)
+                start = days[day] + opening + (block * BLOCK + offset) * SLOT
+
+                yield (
+                    next(ids),
+                    first_user + user,
+                    field_id,
+                    start,
+                    start + length * SLOT,
+                    price * length / 2,
+                    status,
+                )
+
+    def blocks_per_day(self, opens: int, closes: int) -> int:
+        return (closes - opens) * 2 // BLOCK
+
+    def field_bookings(self) -> list[int]:
+        """
+        Splits the bookings over the fields following a Zipf distribution,
+        so that a few fields are far busier than most.
+
+        A field takes at most half of its blocks, what a busy field would
+        exceed is handed on to the others.
+        """
+        weights = [
+            1 / (rank**self.options.popularity)
+            for rank in range(1, len(self.fields) + 1)
+        ]
+        self.random.shuffle(weights)
+
+        capacity = [
+            self.options.days * self.blocks_per_day(opens, closes) // 2
+            for _, opens, closes, _ in self.fields
+        ]
+        counts = [0] * len(self.fields)
+        remaining = self.options.bookings
+
+        while remaining > 0:
+            open_fields = [
+                i for i, count in enumerate(counts) if count < capacity[i]
+            ]
+            if not open_fields:
+                break
+
+            total = sum(weights[i] for i in open_fields)
+            handed_out = 0
+
+            for i in open_fields:
+                share = max(round(remaining * weights[i] / total), 1)
+                share = min(share, capacity[i] - counts[i], remaining)
+
+                counts[i] += share
+                handed_out += share
+                remaining -= share
+
+                if not remaining:
+                    break
+
+            if not handed_out:
+                break
+
+        return counts
+
+    def block_weights(self, blocks: int) -> list[float]:
+        # Linearly from 1 at opening to evening_peak at closing.
+        return [
+            1 + (self.options.evening_peak - 1) * block / max(blocks - 1, 1)
+            for block in range(blocks)
+        ]
+
+
+def encode(rows: Iterator[tuple], chunk: int) -> tuple[io.StringIO, int]:
+    """
+    Renders up to ``chunk`` rows in ``COPY``'s text format.
+    """
+    buffer = io.StringIO()
+    count = 0
+
+    for row in itertools.islice(rows, chunk):
+        buffer.write("\t".join(r"\N" if x is None else str(x) for x in row))
+        buffer.write("\n")
+        count += 1
+
+    buffer.seek(0)
+    return buffer, count
+
+
+def copy_rows(
+    cursor, table: str, columns: Iterable[str], rows, chunk: int = 50_000
+) -> int:
+    """
+    Streams rows into ``table`` with ``COPY`` in chunks of ``chunk`` rows.
+
+    The next chunk is generated on a second thread while the database
+    ingests the current one.
+
+    Returns:
+        int: The number of copied rows.
+    """
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    copied = 0
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_chunk = executor.submit(encode, rows, chunk)
+
+        while True:
+            buffer, count = next_chunk.result()
+            if not count:
+                return copied
+
+            next_chunk = executor.submit(encode, rows, chunk)
+            cursor.copy_expert(statement, buffer)
+            copied += count
+
+
+def generate(
+    engine: Engine, options: DatasetOptions, truncate: bool = False
+) -> dict[str, int]:
+    """
+    Generates a dataset and loads it in one transaction.
+
+    Args:
+        engine (Engine): A psycopg2 engine of the database to load into.
+        options (DatasetOptions): The shape of the dataset.
+        truncate (bool, optional): Whether to delete every owner, field,
+            user, booking and session first. Defaults to False.
+
+    Returns:
+        dict[str, int]: The number of rows loaded per table.
+    """
+    connection = engine.raw_connection()
+
+    try:
+        cursor = connection.cursor()
+
+        if truncate:
+            cursor.execute(
+                "TRUNCATE owners, football_fields, users, bookings, "
+                "sessions RESTART IDENTITY CASCADE"
+            )
+
+        first_ids = {}
+        for table in Generator.COLUMNS:
+            cursor.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+            first_ids[table] = cursor.fetchone()[0]
+
+        generator = Generator(options, first_ids)
+        loaded = {}
+
+        for table, columns in Generator.COLUMNS.items():
+            started = time.perf_counter()
+            loaded[table] = copy_rows(
+                cursor, table, columns, getattr(generator, table)()
+            )
+
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT coalesce(max(id), 1) FROM {table}))"
+            )
+            logger.info(
+                "Loaded %d %s in %.1fs",
+                loaded[table],
+                table,
+                time.perf_counter() - started,
+            )
+
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    with engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as connection:
+        connection.execute(
+            text("ANALYZE owners, football_fields, users, bookings")
+        )
+
+    return loaded
@@ -0,0 +1,83 @@
+"""
+Usage:
+    python -m db.generate [--owners 2000] [--fields 10000] [--users 100000]
+        [--bookings 1000000] [--start 2024-01-01] [--days 365]
+        [--popularity 1.0] [--evening-peak 3.0] [--password password]
+        [--seed SEED] [--truncate]
+"""
+import argparse
+import logging
+import time
+from datetime import date
+
+from db.database import get_engine
+from db.generate import DatasetOptions, generate
+
+
+def main():
+    defaults = DatasetOptions()
+
+    parser = argparse.ArgumentParser(prog="python -m db.generate")
+    parser.add_argument("--owners", type=int, default=defaults.owners)
+    parser.add_argument("--fields", type=int, default=defaults.fields)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--bookings", type=int, default=defaults.bookings)
+    parser.add_argument(
+        "--start",
+        type=date.fromisoformat,
+        default=defaults.start,
+        help="the first day bookings fall on",
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=defaults.days,
+        help="the number of days bookings are spread over",
+    )
+    parser.add_argument(
+        "--popularity",
+        type=float,
+        default=defaults.popularity,
+        help="the Zipf exponent of bookings per field, 0 for evenly",
+    )
+    parser.add_argument(
+        "--evening-peak",
+        type=float,
+        default=defaults.evening_peak,
+        help="how much likelier the last slot of a day is than the first",
+    )
+    parser.add_argument(
+        "--password",
+        default=defaults.password,
+        help="every owner's and user's password",
+    )
+    parser.add_argument("--seed", type=int, help="for reproducible datasets")
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="delete every owner, field, user, booking and session first",
+    )
+
+    args = parser.parse_args()
+    options = DatasetOptions(
+        owners=args.owners,
+        fields=args.fields,
+        users=args.users,
+        bookings=args.bookings,
+        start=args.start,
+        days=args.days,
+        popularity=args.popularity,
+        evening_peak=args.evening_peak,
+        password=args.password,
+        seed=args.seed,
+    )
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    started = time.perf_counter()
+    generate(get_engine(), options, truncate=args.truncate)
+    print(f"Loaded in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Carries cache invalidations between worker processes over Postgres
+``LISTEN``/``NOTIFY``.
+
+A cache registers an eviction per kind of key with ``subscribe``, and
+mutation handlers call ``publish`` with the keys they changed. The keys
+are evicted in the publishing process right away, then broadcast on a
+channel that every worker's ``listen`` task follows. Notifications sent
+while a listener is disconnected are lost, so a listener clears every
+subscribed cache whenever it (re)connects.
+
+Handlers go through ``invalidate_caches``, which also drops cached
+responses, directly when the response cache is shared by every worker.
+"""
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import response_cache
+from db.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must stay under 8000 bytes, keys are sent in chunks.
+KEYS_PER_MESSAGE = 100
+
+
+@dataclass
+class Subscription:
+    evict: Callable[[list[str]], None]
+    clear: Callable[[], None]
+
+
+class InvalidationBus:
+    """
+    Broadcasts evicted cache keys to the other workers.
+
+    Args:
+        channel (str): The ``NOTIFY`` channel.
+        enabled (bool): Whether keys are broadcast at all, otherwise they
+            are only evicted in the publishing process.
+        keepalive (float): Seconds without notifications after which the
+            listener checks its connection.
+        max_reconnect_delay (float): The longest wait between attempts to
+            reconnect, which back off exponentially from one second.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        enabled: bool = True,
+        keepalive: float = 30,
+        max_reconnect_delay: float = 30,
+    ):
+        self.channel = channel
+        self.enabled = enabled
+        self.keepalive = keepalive
+        self.max_reconnect_delay = max_reconnect_delay
+
+        # Tells this process's own notifications apart from the others'.
+        self.origin = uuid.uuid4().hex
+        self.subscriptions: dict[str, Subscription] = {}
+
+        self.connected = threading.Event()
+        self.connections = 0
+        self.received = 0
+
+    def subscribe(
+        self,
+        kind: str,
+        evict: Callable[[list[str]], None],
+        clear: Callable[[], None],
+    ):
+        """
+        Registers how to evict keys of ``kind``, and how to clear the
+        cache they belong to when notifications may have been missed.
+        """
+        self.subscriptions[kind] = Subscription(evict, clear)
+
+    def publish(self, **keys: Iterable):
+        """
+        Evicts the given keys per kind, as in
+        ``publish(availability=[1, 2])``, here and then on the other
+        workers. All kinds go out in one statement.
+        """
+        keys = {
+            kind: [str(x) for x in values] for kind, values in keys.items()
+        }
+        keys = {kind: values for kind, values in keys.items() if values}
+        if not keys:
+            return
+
+        self.deliver(keys)
+
+        if not self.enabled:
+            return
+
+        try:
+            with get_engine().begin() as connection:
+                connection.execute(
+                    text(
+                        "SELECT pg_notify(:channel, payload) "
+                        "FROM unnest(CAST(:payloads AS text[])) AS payload"
+                    ),
+                    {"channel": self.channel, "payloads": self.messages(keys)},
+                )
+        except SQLAlchemyError:
+            logger.error(
+                "Could not broadcast evicted %s, other workers may serve "
+                "them until they expire",
+                ", ".join(keys),
+                exc_info=True,
+            )
+
+    def messages(self, keys: dict[str, list[str]]) -> list[str]:
+        flat = [(kind, key) for kind, values in keys.items() for key in values]
+        messages = []
+
+        for start in range(0, len(flat), KEYS_PER_MESSAGE):
+            chunk = {}
+            for kind, key in flat[start : start + KEYS_PER_MESSAGE]:
+                chunk.setdefault(kind, []).append(key)
+
+            messages.append(
+                orjson.dumps({"origin": self.origin, "keys": chunk}).decode()
+            )
+
+        return messages
+
+    def deliver(self, keys: dict[str, list[str]]):
+        for kind, values in keys.items():
+            subscription = self.subscriptions.get(kind)
+            if subscription is None:
+                continue
+
+            try:
+                subscription.evict(values)
+            except Exception:
+                logger.exception("Evicting %s %s failed", kind, values)
+
+    def receive(self, payload: str):
+        try:
+            message = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            logger.warning("Ignored a malformed invalidation: %s", payload)
+            return
+
+        if message.get("origin") == self.origin:
+            return
+
+        self.received += 1
+        self.deliver(message.get("keys", {}))
+
+    def clear(self):
+        for kind, subscription in self.subscriptions.items():
+            try:
+                subscription.clear()
+            except Exception:
+                logger.exception("Clearing the %s cache failed", kind)
+
+    def connect(self):
+        """
+        Opens a connection of its own, outside of the pool, and listens on
+        the channel.
+        """
+        engine = get_engine()
+        args, kwargs = engine.dialect.create_connect_args(engine.url)
+
+        connection = engine.dialect.dbapi.connect(*args, **kwargs)
+        connection.autocommit = True
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+
+        return connection
+
+    async def listen(self):
+        """
+        Evicts the keys other workers publish, until cancelled. A lost
+        connection is reopened, waiting longer after every failed attempt.
+        """
+        delay = 1
+
+        while True:
+            try:
+                connection = await asyncio.to_thread(self.connect)
+            except Exception:
+                logger.warning(
+                    "Could not listen for cache invalidations, retrying in "
+                    "%.0fs",
+                    delay,
+                    exc_info=True,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            delay = 1
+            self.connections += 1
+            self.clear()
+            self.connected.set()
+
+            try:
+                await self.consume(connection)
+            except Exception:
+                logger.warning(
+                    "Lost the cache invalidation listener, reconnecting",
+                    exc_info=True,
+                )
+            finally:
+                self.connected.clear()
+                connection.close()
+
+    async def consume(self, connection):
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        fd = connection.fileno()
+        loop.add_reader(fd, readable.set)
+
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(readable.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    # Quiet for a while, make sure the server is still there.
+                    await asyncio.to_thread(ping, connection)
+                    continue
+
+                readable.clear()
+                connection.poll()
+
+                while connection.notifies:
+                    self.receive(connection.notifies.pop(0).payload)
+        finally:
+            loop.remove_reader(fd)
+
+
+def ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+invalidation_bus = InvalidationBus(
+    channel=os.environ.get("CACHE_INVALIDATION_CHANNEL", "cache_invalidation"),
+    enabled=os.environ.get("CACHE_INVALIDATION", "true").lower() == "true",
+)
+
+
+def clear_responses():
+    # A shared cache never misses an invalidation, nor should one worker
+    # wipe it for all of them.
+    if not response_cache.backend.shared:
+        response_cache.clear()
+
+
+invalidation_bus.subscribe(
+    "responses", lambda tags: response_cache.invalidate(*tags), clear_responses
+)
+
+
+def invalidate_caches(responses: Iterable[str] = (), **keys: Iterable):
+    """
+    Drops cached entries on every worker, with a single notification.
+
+    Args:
+        responses (Iterable[str]): Tags of cached responses to drop. A
+            shared response cache is invalidated directly instead.
+        **keys: Keys of the other kinds subscribed to the bus, such as
+            ``availability``.
+    """
+    responses = list(responses)
+    if responses and response_cache.backend.shared:
+        response_cache.invalidate(*responses)
+        responses = []
+
+    invalidation_bus.publish(responses=responses, **keys)
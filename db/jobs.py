@@ -0,0 +1,266 @@
+"""
+A persistent queue of background jobs, run once the transaction that
+queued them commits.
+
+Handlers add a ``background_job`` to the session of their change, so a job
+exists if and only if the change committed, and the request does not wait
+for it. Workers claim due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``,
+so concurrent workers neither run the same job nor wait on each other.
+Jobs are claimed in a short transaction and run outside of it. A failing
+job is retried with exponential backoff, and kept as dead once it has
+failed ``max_attempts`` times. Jobs run at least once, a job whose worker
+crashed runs again once its lease expires, so they should be idempotent.
+
+``python worker.py`` runs the queue in a process of its own.
+"""
+import asyncio
+import logging
+import os
+import random
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable
+
+import orjson
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from .database import get_engine
+from .models import Job
+from .models.job import JobStatus
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+
+Handler = Callable[[dict], None]
+
+
+def background_job(
+    name: str,
+    payload: dict,
+    delay: float = 0,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> Job:
+    """
+    Returns a job to add to the session of the change it follows.
+
+    Args:
+        name (str): The job's handler, e.g. ``booking.notify``.
+        payload (dict): The handler's argument, made JSON-safe.
+        delay (float, optional): Seconds to wait before the first attempt.
+            Defaults to 0.
+        max_attempts (int, optional): Failures after which the job is dead.
+            Defaults to ``JOB_MAX_ATTEMPTS``.
+
+    Returns:
+        Job: The pending job.
+    """
+    return Job(
+        name=name,
+        payload=orjson.loads(orjson.dumps(payload)),
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+
+
+class JobQueue:
+    """
+    Runs due jobs with their registered handlers, claiming ``batch_size``
+    at a time, polling every ``interval`` seconds.
+
+    A failed attempt ``n`` is retried after ``backoff * 2 ** (n - 1)``
+    seconds, at most ``max_backoff``, less up to half of it at random so
+    that jobs failing together do not retry together.
+
+    A claimed job is leased for ``lease`` seconds, after which another
+    worker may claim it again, as when its worker crashed. The lease
+    should outlast the slowest job.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 10,
+        interval: float = 1.0,
+        backoff: float = 10,
+        max_backoff: float = 3600,
+        lease: float = 300,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.handlers: dict[str, Handler] = {}
+
+    def task(self, name: str, handler: Handler | None = None):
+        """
+        Registers the handler of the jobs named ``name``. Can be used as a
+        decorator.
+        """
+        if handler is None:
+            return lambda handler: self.task(name, handler)
+
+        self.handlers[name] = handler
+        return handler
+
+    def retry_delay(self, attempts: int) -> float:
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+        return delay * random.uniform(0.5, 1)
+
+    def drain(self) -> int:
+        """
+        Runs every due job.
+
+        Returns:
+            int: The number of attempted jobs, whether or not they failed.
+        """
+        attempted = 0
+
+        while True:
+            batch = self.run_batch()
+            attempted += batch
+
+            if batch < self.batch_size:
+                return attempted
+
+    def run_batch(self) -> int:
+        jobs = self.claim()
+
+        for job in jobs:
+            self.attempt(job)
+
+        return len(jobs)
+
+    def claim(self) -> list[Job]:
+        """
+        Claims up to ``batch_size`` due jobs in a short transaction,
+        counting the attempt and leasing them by moving ``run_at`` past
+        the lease. Handlers run after it commits, so their locks are not
+        held, nor its transaction ID, which would hold back the outbox.
+        """
+        now = datetime.utcnow()
+
+        with Session(get_engine(), expire_on_commit=False) as session:
+            jobs = session.scalars(
+                select(Job)
+                .where(
+                    Job.status == JobStatus.pending.value,
+                    Job.run_at <= now,
+                )
+                .order_by(Job.run_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+
+            for job in jobs:
+                job.attempts += 1
+                job.run_at = now + timedelta(seconds=self.lease)
+                session.add(job)
+
+            session.commit()
+
+        return jobs
+
+    def attempt(self, job: Job):
+        error = None
+
+        if job.attempts > job.max_attempts:
+            # Claimed again after its lease ran out every time.
+            error = "The job's worker stopped during every attempt"
+        else:
+            try:
+                handler = self.handlers.get(job.name)
+                if handler is None:
+                    raise LookupError(f"No handler for job {job.name}")
+
+                handler(job.payload)
+            except Exception:
+                error = traceback.format_exc()
+
+        # Another worker owns the job if its lease ran out meanwhile.
+        claimed = (Job.id == job.id) & (Job.attempts == job.attempts)
+
+        with get_engine().begin() as connection:
+            if error is None:
+                connection.execute(delete(Job).where(claimed))
+                return
+
+            if job.attempts >= job.max_attempts:
+                connection.execute(
+                    update(Job)
+                    .where(claimed)
+                    .values(status=JobStatus.dead.value, last_error=error)
+                )
+                logger.error(
+                    "Job %d (%s) failed %d times, giving up\n%s",
+                    job.id,
+                    job.name,
+                    job.attempts,
+                    error,
+                )
+                return
+
+            delay = self.retry_delay(job.attempts)
+            connection.execute(
+                update(Job)
+                .where(claimed)
+                .values(
+                    run_at=datetime.utcnow() + timedelta(seconds=delay),
+                    last_error=error,
+                )
+            )
+            logger.warning(
+                "Job %d (%s) failed, retrying in %.0fs\n%s",
+                job.id,
+                job.name,
+                delay,
+                error,
+            )
+
+    def requeue_dead(self, name: str | None = None) -> int:
+        """
+        Makes dead jobs pending again, with their attempts reset.
+
+        Args:
+            name (str, optional): Only requeues the jobs of this handler.
+
+        Returns:
+            int: The number of requeued jobs.
+        """
+        stmt = (
+            update(Job)
+            .where(Job.status == JobStatus.dead.value)
+            .values(
+                status=JobStatus.pending.value,
+                attempts=0,
+                run_at=datetime.utcnow(),
+            )
+        )
+        if name is not None:
+            stmt = stmt.where(Job.name == name)
+
+        with get_engine().begin() as connection:
+            return connection.execute(stmt).rowcount
+
+    async def run(self):
+        """
+        Drains the queue every interval until cancelled.
+        """
+        while True:
+            try:
+                await run_in_threadpool(self.drain)
+            except Exception:
+                logger.exception("Failed to run background jobs")
+
+            await asyncio.sleep(self.interval)
+
+
+job_queue = JobQueue(
+    batch_size=int(os.environ.get("JOB_BATCH_SIZE", 10)),
+    interval=float(os.environ.get("JOB_POLL_INTERVAL", 1)),
+    backoff=float(os.environ.get("JOB_BACKOFF", 10)),
+    max_backoff=float(os.environ.get("JOB_MAX_BACKOFF", 3600)),
+    lease=float(os.environ.get("JOB_LEASE", 300)),
+)
@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import get_engine
+from .models import (
+    Booking,
+    FootballField,
+    OutboxEvent,
+    Owner,
+    RevokedToken,
+    UserSession,
+)
+from .outbox import OUTBOX_RETENTION, outbox_event
+
+logger = logging.getLogger(__name__)
+
+# Dependent rows deleted per transaction when deleting an owner or field.
+DELETE_BATCH_SIZE = int(os.environ.get("DELETE_BATCH_SIZE", 1000))
+
+
+def delete_rows(
+    session: Session, Model, condition, topic: str | None = None
+) -> int:
+    """
+    Deletes the rows of ``Model`` that match ``condition`` in the session's
+    transaction.
+
+    Args:
+        session (Session): The session whose transaction deletes the rows.
+        Model: A table model with an ``id`` column, and a ``json`` method
+            if ``topic`` is given.
+        condition: The ``WHERE`` clause selecting the rows to delete.
+        topic (str, optional): The topic of an outbox event to record for
+            every deleted row, e.g. ``booking.deleted``.
+
+    Returns:
+        int: The number of deleted rows.
+    """
+    statement = delete(Model.__table__).where(condition)
+    if topic is None:
+        return session.execute(statement).rowcount
+
+    rows = session.execute(statement.returning(*Model.__table__.columns)).all()
+    session.add_all(
+        outbox_event(topic, row.id, Model(**row._mapping).json())
+        for row in rows
+    )
+
+    return len(rows)
+
+
+def delete_in_batches(
+    Model,
+    condition,
+    batch_size: int = 1000,
+    skip_locked: bool = False,
+    topic: str | None = None,
+) -> int:
+    """
+    Deletes the rows of ``Model`` that match ``condition``.
+
+    Rows go in batches of ``batch_size``, each in its own short transaction,
+    so that deleting a large number of rows never holds long locks.
+
+    Args:
+        Model: A table model with an ``id`` column.
+        condition: The ``WHERE`` clause selecting the rows to delete.
+        batch_size (int, optional): Rows deleted per transaction.
+            Defaults to 1000.
+        skip_locked (bool, optional): Whether to skip rows locked by other
+            transactions rather than wait on them. Defaults to False.
+        topic (str, optional): The topic of an outbox event recorded for
+            every deleted row, in its batch's transaction.
+
+    Returns:
+        int: The number of deleted rows.
+    """
+    deleted_total = 0
+
+    while True:
+        batch = select(Model.id).where(condition).limit(batch_size)
+        if skip_locked:
+            batch = batch.with_for_update(skip_locked=True)
+
+        with Session(get_engine()) as session:
+            deleted = delete_rows(
+                session, Model, Model.id.in_(batch.scalar_subquery()), topic
+            )
+            session.commit()
+
+        deleted_total += deleted
+        if deleted < batch_size:
+            return deleted_total
+
+
+def purge_expired(Model, batch_size: int = 1000) -> int:
+    """
+    Deletes the rows of ``Model`` whose ``expires_at`` has passed.
+
+    Rows locked by other transactions are skipped rather than waited on, so
+    the purge never holds up a busy table.
+
+    Args:
+        Model: A table model with ``id`` and ``expires_at`` columns.
+        batch_size (int, optional): Rows deleted per transaction.
+            Defaults to 1000.
+
+    Returns:
+        int: The number of deleted rows.
+    """
+    return delete_in_batches(
+        Model,
+        Model.expires_at < datetime.utcnow(),
+        batch_size,
+        skip_locked=True,
+    )
+
+
+def delete_field(field_id: int, batch_size: int = DELETE_BATCH_SIZE) -> int:
+    """
+    Deletes a field and its bookings, recording a ``booking.deleted`` event
+    for every booking and a ``field.deleted`` event for the field.
+
+    The bookings go first in batches, and the field goes last in a short
+    transaction along with the bookings made meanwhile.
+
+    Args:
+        field_id (int): The ID of the field.
+        batch_size (int, optional): Rows deleted per transaction.
+            Defaults to ``DELETE_BATCH_SIZE``.
+
+    Returns:
+        int: The number of deleted bookings.
+    """
+    condition = Booking.field_id == field_id
+    deleted = delete_in_batches(
+        Booking, condition, batch_size, topic="booking.deleted"
+    )
+
+    with Session(get_engine()) as session:
+        deleted += delete_rows(session, Booking, condition, "booking.deleted")
+        session.execute(
+            delete(FootballField).where(FootballField.id == field_id)
+        )
+        session.add(outbox_event("field.deleted", field_id, {"id": field_id}))
+        session.commit()
+
+    return deleted
+
+
+def delete_owner(
+    owner_id: int, batch_size: int = DELETE_BATCH_SIZE
+) -> list[int]:
+    """
+    Deletes an owner along with their fields, the fields' bookings and the
+    owner's sessions, in batches and with events as in ``delete_field``.
+
+    Args:
+        owner_id (int): The ID of the owner.
+        batch_size (int, optional): Rows deleted per transaction.
+            Defaults to ``DELETE_BATCH_SIZE``.
+
+    Returns:
+        list[int]: The IDs of the deleted fields.
+    """
+    with get_engine().connect() as connection:
+        field_ids = (
+            connection.execute(
+                select(FootballField.id).where(
+                    FootballField.owner_id == owner_id
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+    delete_in_batches(
+        Booking,
+        Booking.field_id.in_(field_ids),
+        batch_size,
+        topic="booking.deleted",
+    )
+    delete_in_batches(
+        UserSession,
+        (UserSession.user_id == owner_id)
+        & (UserSession.is_owner == True),  # noqa: E712
+        batch_size,
+    )
+
+    with Session(get_engine()) as session:
+        # Also catches the fields and bookings made since the batches.
+        owned = select(FootballField.id).where(
+            FootballField.owner_id == owner_id
+        )
+        delete_rows(
+            session,
+            Booking,
+            Booking.field_id.in_(owned.scalar_subquery()),
+            "booking.deleted",
+        )
+        field_ids = (
+            session.execute(
+                delete(FootballField.__table__)
+                .where(FootballField.owner_id == owner_id)
+                .returning(FootballField.id)
+            )
+            .scalars()
+            .all()
+        )
+
+        session.execute(delete(Owner).where(Owner.id == owner_id))
+        session.add_all(
+            outbox_event("field.deleted", field_id, {"id": field_id})
+            for field_id in field_ids
+        )
+        session.commit()
+
+    return field_ids
+
+
+def purge_expired_sessions(batch_size: int = 1000) -> int:
+    return purge_expired(UserSession, batch_size) + purge_expired(
+        RevokedToken, batch_size
+    )
+
+
+def purge_outbox(
+    retention: timedelta = OUTBOX_RETENTION, batch_size: int = 1000
+) -> int:
+    """
+    Deletes the outbox events older than ``retention``, in batches.
+    """
+    return delete_in_batches(
+        OutboxEvent,
+        OutboxEvent.created_at < datetime.utcnow() - retention,
+        batch_size,
+        skip_locked=True,
+    )
+
+
+async def purge_periodically(interval: float, batch_size: int = 1000):
+    """
+    Purges expired sessions, revoked tokens and outbox events every
+    ``interval`` seconds until cancelled.
+
+    The first purge runs one interval after startup rather than racing a
+    fresh worker's first requests.
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            purged = await run_in_threadpool(
+                purge_expired_sessions, batch_size
+            )
+            logger.info("Purged %d expired sessions", purged)
+
+            purged = await run_in_threadpool(
+                purge_outbox, batch_size=batch_size
+            )
+            logger.info("Purged %d outbox events", purged)
+        except Exception:
+            logger.exception("Failed to purge expired rows")
@@ -0,0 +1,183 @@
+"""
+A small versioned migration runner.
+
+Migrations live in ``db/migrations/versions`` as modules named
+``<version>_<name>.py`` and are applied in version order. Each module
+defines ``upgrade(connection)`` and may set ``transactional = False`` to
+run outside a transaction, which ``CREATE INDEX CONCURRENTLY`` requires.
+Applied versions are recorded in the ``schema_migrations`` table.
+"""
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+from datetime import datetime
+from types import ModuleType
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+# Serializes concurrent runners, e.g. several workers deploying at once.
+ADVISORY_LOCK_KEY = 7_238_154_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "transactional", True)
+
+    def __str__(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+
+def discover() -> list[Migration]:
+    """
+    Returns every migration in the versions package, ordered by version.
+    """
+    migrations = []
+
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        version, _, name = module_info.name.partition("_")
+        module = importlib.import_module(
+            f"{versions.__name__}.{module_info.name}"
+        )
+        migrations.append(Migration(int(version), name, module))
+
+    migrations.sort(key=lambda migration: migration.version)
+    return migrations
+
+
+def ensure_version_table(connection: Connection):
+    connection.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            )
+            """
+        )
+    )
+
+
+def applied_versions(connection: Connection) -> set[int]:
+    return set(
+        connection.execute(text("SELECT version FROM schema_migrations"))
+        .scalars()
+        .all()
+    )
+
+
+def record(connection: Connection, migration: Migration):
+    connection.execute(
+        text(
+            "INSERT INTO schema_migrations (version, name, applied_at) "
+            "VALUES (:version, :name, :applied_at)"
+        ),
+        {
+            "version": migration.version,
+            "name": migration.name,
+            "applied_at": datetime.utcnow(),
+        },
+    )
+
+
+def pending(engine: Engine) -> list[Migration]:
+    with engine.begin() as connection:
+        ensure_version_table(connection)
+        applied = applied_versions(connection)
+
+    return [
+        migration
+        for migration in discover()
+        if migration.version not in applied
+    ]
+
+
+def upgrade(engine: Engine, target: int | None = None) -> list[Migration]:
+    """
+    Applies every pending migration up to and including ``target``.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+        target (int, optional): The last version to apply.
+            Defaults to the newest one.
+
+    Returns:
+        list[Migration]: The migrations that were applied.
+    """
+    applied = []
+
+    with engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as lock:
+        lock.execute(
+            text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+        )
+
+        try:
+            for migration in pending(engine):
+                if target is not None and migration.version > target:
+                    break
+
+                logger.info("Applying migration %s", migration)
+
+                if migration.transactional:
+                    with engine.begin() as connection:
+                        migration.module.upgrade(connection)
+                        record(connection, migration)
+                else:
+                    with engine.connect().execution_options(
+                        isolation_level="AUTOCOMMIT"
+                    ) as connection:
+                        migration.module.upgrade(connection)
+                        record(connection, migration)
+
+                applied.append(migration)
+        finally:
+            lock.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": ADVISORY_LOCK_KEY},
+            )
+
+    return applied
+
+
+def create_index_concurrently(connection: Connection, name: str, ddl: str):
+    """
+    Builds an index without blocking writes to its table.
+
+    A failed concurrent build leaves an invalid index behind, which
+    ``IF NOT EXISTS`` would then skip, so such leftovers are dropped first.
+
+    Args:
+        connection (Connection): An autocommit connection.
+        name (str): The name of the index.
+        ddl (str): The ``CREATE [UNIQUE] INDEX CONCURRENTLY IF NOT EXISTS``
+            statement that builds it.
+    """
+    invalid = connection.execute(
+        text(
+            """
+            SELECT 1 FROM pg_index
+            JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+            WHERE pg_class.relname = :name AND NOT pg_index.indisvalid
+            """
+        ),
+        {"name": name},
+    ).scalar()
+
+    if invalid:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    connection.execute(text(ddl))
@@ -0,0 +1,42 @@
+"""
+Usage:
+    python -m db.migrations upgrade [--to VERSION]
+    python -m db.migrations status
+"""
+import argparse
+import logging
+
+from db.database import get_engine
+from db.migrations import discover, pending, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m db.migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upgrade_parser = commands.add_parser(
+        "upgrade", help="apply pending migrations"
+    )
+    upgrade_parser.add_argument(
+        "--to", type=int, help="the last version to apply"
+    )
+
+    commands.add_parser("status", help="list migrations and their state")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    engine = get_engine()
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, target=args.to)
+        print(f"Applied {len(applied)} migration(s)")
+    else:
+        waiting = {migration.version for migration in pending(engine)}
+        for migration in discover():
+            state = "pending" if migration.version in waiting else "applied"
+            print(f"{migration}  {state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Creates the tables as they stood when the schema was still built by
+``create_all``, so that existing databases can adopt migrations as is.
+
+``bookings.status`` is the ``bookingstatus`` enum, which the models create
+too. Databases that stored it as ``VARCHAR`` have it converted.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection):
+    connection.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR NOT NULL UNIQUE,
+                name VARCHAR NOT NULL,
+                password VARCHAR NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS owners (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR NOT NULL UNIQUE,
+                name VARCHAR NOT NULL,
+                password VARCHAR NOT NULL,
+                email VARCHAR,
+                phone_number VARCHAR,
+                instagram VARCHAR
+            );
+
+            CREATE TABLE IF NOT EXISTS football_fields (
+                id SERIAL PRIMARY KEY,
+                owner_id INTEGER NOT NULL,
+                name VARCHAR NOT NULL,
+                location VARCHAR NOT NULL,
+                surface_type VARCHAR,
+                about VARCHAR,
+                image VARCHAR,
+                width FLOAT NOT NULL,
+                length FLOAT NOT NULL,
+                price FLOAT NOT NULL,
+                start_time TIME WITHOUT TIME ZONE NOT NULL,
+                end_time TIME WITHOUT TIME ZONE NOT NULL
+            );
+
+            DO $$
+            BEGIN
+                CREATE TYPE bookingstatus AS ENUM (
+                    'pending', 'confirmed', 'canceled'
+                );
+            EXCEPTION
+                WHEN duplicate_object THEN NULL;
+            END
+            $$;
+
+            CREATE TABLE IF NOT EXISTS bookings (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                field_id INTEGER NOT NULL,
+                booking_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                booked_until TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                total_price FLOAT NOT NULL,
+                status bookingstatus NOT NULL
+            );
+
+            DO $$
+            BEGIN
+                IF (
+                    SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'bookings' AND column_name = 'status'
+                ) = 'character varying' THEN
+                    ALTER TABLE bookings ALTER COLUMN status
+                        TYPE bookingstatus USING status::bookingstatus;
+                END IF;
+            END
+            $$;
+
+            CREATE TABLE IF NOT EXISTS sessions (
+                id SERIAL PRIMARY KEY,
+                session_id VARCHAR NOT NULL,
+                user_id INTEGER NOT NULL,
+                is_owner BOOLEAN NOT NULL
+            );
+            """
+        )
+    )
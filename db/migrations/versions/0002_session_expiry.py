@@ -0,0 +1,31 @@
+"""
+Adds session expiry and the revoked_tokens table for signed sessions.
+
+Sessions that predate expiry get a full lifetime from now.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection):
+    connection.execute(
+        text(
+            """
+            ALTER TABLE sessions
+                ADD COLUMN IF NOT EXISTS expires_at
+                TIMESTAMP WITHOUT TIME ZONE;
+
+            UPDATE sessions
+                SET expires_at = (now() AT TIME ZONE 'utc') + interval '7 days'
+                WHERE expires_at IS NULL;
+
+            ALTER TABLE sessions ALTER COLUMN expires_at SET NOT NULL;
+
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                id SERIAL PRIMARY KEY,
+                jti VARCHAR NOT NULL UNIQUE,
+                expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            );
+            """
+        )
+    )
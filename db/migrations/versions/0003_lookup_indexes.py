@@ -0,0 +1,35 @@
+"""
+Indexes the hot lookups: sessions by session_id and expiry, bookings by
+field and date, and fields by owner. The indexes are built concurrently
+so that writes keep flowing on large tables.
+"""
+from sqlalchemy.engine import Connection
+
+from db.migrations import create_index_concurrently
+
+transactional = False
+
+INDEXES = {
+    "ix_sessions_session_id": (
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "
+        "ix_sessions_session_id ON sessions (session_id)"
+    ),
+    "ix_sessions_expires_at": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+        "ix_sessions_expires_at ON sessions (expires_at)"
+    ),
+    "ix_bookings_field_id_booking_date": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+        "ix_bookings_field_id_booking_date "
+        "ON bookings (field_id, booking_date)"
+    ),
+    "ix_football_fields_owner_id": (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+        "ix_football_fields_owner_id ON football_fields (owner_id)"
+    ),
+}
+
+
+def upgrade(connection: Connection):
+    for name, ddl in INDEXES.items():
+        create_index_concurrently(connection, name, ddl)
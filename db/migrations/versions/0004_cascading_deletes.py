@@ -0,0 +1,75 @@
+"""
+Adds foreign keys that delete an owner's fields and a field's bookings
+along with them, and indexes sessions by user so that an owner's sessions
+can be deleted without scanning the table.
+
+Rows orphaned by earlier deletes are removed first. The constraints are
+added as ``NOT VALID`` and validated separately, which checks existing
+rows without blocking writes to the tables.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.migrations import create_index_concurrently
+
+transactional = False
+
+FOREIGN_KEYS = {
+    "fk_football_fields_owner_id": (
+        "football_fields",
+        "FOREIGN KEY (owner_id) REFERENCES owners (id) ON DELETE CASCADE",
+    ),
+    "fk_bookings_field_id": (
+        "bookings",
+        "FOREIGN KEY (field_id) REFERENCES football_fields (id) "
+        "ON DELETE CASCADE",
+    ),
+}
+
+
+def upgrade(connection: Connection):
+    connection.execute(
+        text(
+            """
+            DELETE FROM football_fields f
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM owners o WHERE o.id = f.owner_id
+                );
+
+            DELETE FROM bookings b
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM football_fields f WHERE f.id = b.field_id
+                );
+
+            DELETE FROM sessions s
+                WHERE s.is_owner AND NOT EXISTS (
+                    SELECT 1 FROM owners o WHERE o.id = s.user_id
+                );
+            """
+        )
+    )
+
+    create_index_concurrently(
+        connection,
+        "ix_sessions_user_id",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+        "ix_sessions_user_id ON sessions (user_id)",
+    )
+
+    for name, (table, constraint) in FOREIGN_KEYS.items():
+        exists = connection.execute(
+            text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+            {"name": name},
+        ).scalar()
+
+        if not exists:
+            connection.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD CONSTRAINT {name} {constraint} NOT VALID"
+                )
+            )
+
+        connection.execute(
+            text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+        )
@@ -0,0 +1,35 @@
+"""
+Adds the outbox of booking and field changes and the positions of its
+consumers.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection):
+    connection.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id BIGSERIAL PRIMARY KEY,
+                txid BIGINT NOT NULL DEFAULT txid_current(),
+                topic VARCHAR NOT NULL,
+                key INTEGER NOT NULL,
+                payload JSONB NOT NULL,
+                created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS ix_outbox_txid_id
+                ON outbox (txid, id);
+
+            CREATE INDEX IF NOT EXISTS ix_outbox_created_at
+                ON outbox (created_at);
+
+            CREATE TABLE IF NOT EXISTS outbox_offsets (
+                consumer VARCHAR PRIMARY KEY,
+                txid BIGINT NOT NULL,
+                event_id BIGINT NOT NULL
+            );
+            """
+        )
+    )
@@ -0,0 +1,55 @@
+"""
+Indexes users and owners for the directory searches: lowercased usernames
+and names with ``text_pattern_ops`` for prefix searches, and trigrams of
+both for substring searches.
+
+The trigram indexes need the ``pg_trgm`` extension. Where it is not
+available they are skipped with a warning, and substring searches scan
+the table instead.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from db.migrations import create_index_concurrently
+
+transactional = False
+
+logger = logging.getLogger(__name__)
+
+TABLES = ("users", "owners")
+
+
+def upgrade(connection: Connection):
+    for table in TABLES:
+        for column in ("username", "name"):
+            name = f"ix_{table}_{column}_prefix"
+            create_index_concurrently(
+                connection,
+                name,
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON {table} (lower({column}) text_pattern_ops)",
+            )
+
+    available = connection.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar()
+    if not available:
+        logger.warning(
+            "pg_trgm is not available, substring searches of users and "
+            "owners will not be indexed"
+        )
+        return
+
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+    for table in TABLES:
+        for column in ("username", "name"):
+            name = f"ix_{table}_{column}_trgm"
+            create_index_concurrently(
+                connection,
+                name,
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON {table} USING gin ({column} gin_trgm_ops)",
+            )
@@ -0,0 +1,28 @@
+"""
+Adds the queue of background jobs.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection):
+    connection.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id BIGSERIAL PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                payload JSONB NOT NULL,
+                status VARCHAR NOT NULL,
+                attempts INTEGER NOT NULL,
+                max_attempts INTEGER NOT NULL,
+                run_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                last_error VARCHAR,
+                created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS ix_jobs_pending_run_at
+                ON jobs (run_at) WHERE status = 'pending';
+            """
+        )
+    )
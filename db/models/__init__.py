@@ -1,7 +1,20 @@
 from .booking import Booking
 from .football_field import FootballField
+from .job import Job
+from .outbox import OutboxEvent, OutboxOffset
 from .owner import Owner
+from .revoked_token import RevokedToken
 from .session import UserSession
 from .user import User
 
-__all__ = ["Booking", "FootballField", "Owner", "User", "UserSession"]
+__all__ = [
+    "Booking",
+    "FootballField",
+    "Job",
+    "OutboxEvent",
+    "OutboxOffset",
+    "Owner",
+    "RevokedToken",
+    "User",
+    "UserSession",
+]
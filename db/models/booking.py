@@ -1,6 +1,8 @@
 from datetime import datetime
 from enum import Enum
 
+from sqlalchemy import Column, ForeignKey, Index, Integer
+from sqlalchemy import Enum as SQLEnum
 from sqlmodel import Field, SQLModel
 
 
@@ -12,18 +14,45 @@ class BookingStatus(str, Enum):
 
 class Booking(SQLModel, table=True):
     __tablename__ = "bookings"
+    __table_args__ = (
+        Index("ix_bookings_field_id_booking_date", "field_id", "booking_date"),
+    )
 
     id: int = Field(primary_key=True)
 
     user_id: int
-    field_id: int
+    field_id: int = Field(
+        sa_column=Column(
+            Integer,
+            ForeignKey(
+                "football_fields.id",
+                name="fk_bookings_field_id",
+                ondelete="CASCADE",
+            ),
+            nullable=False,
+        )
+    )
 
     booking_date: datetime
     booked_until: datetime
 
     total_price: float
 
-    status: BookingStatus = Field(default=BookingStatus.pending.value)
+    # Declared explicitly, SQLModel would store a str enum as VARCHAR.
+    status: BookingStatus = Field(
+        default=BookingStatus.pending.value,
+        sa_column=Column(
+            SQLEnum(BookingStatus, name="bookingstatus"), nullable=False
+        ),
+    )
 
     def json(self) -> dict:
-        return dict(vars(self).items())
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "field_id": self.field_id,
+            "booking_date": self.booking_date,
+            "booked_until": self.booked_until,
+            "total_price": self.total_price,
+            "status": self.status,
+        }
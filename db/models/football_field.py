@@ -1,6 +1,7 @@
 from datetime import time
 from typing import Optional
 
+from sqlalchemy import Column, ForeignKey, Integer
 from sqlmodel import Field, SQLModel
 
 Meters = float
@@ -10,7 +11,18 @@ class FootballField(SQLModel, table=True):
     __tablename__ = "football_fields"
 
     id: int = Field(primary_key=True)
-    owner_id: int
+    owner_id: int = Field(
+        sa_column=Column(
+            Integer,
+            ForeignKey(
+                "owners.id",
+                name="fk_football_fields_owner_id",
+                ondelete="CASCADE",
+            ),
+            nullable=False,
+            index=True,
+        )
+    )
 
     name: str
     location: str
@@ -28,4 +40,17 @@ class FootballField(SQLModel, table=True):
     end_time: time
 
     def json(self) -> dict:
-        return dict(vars(self).items())
+        return {
+            "id": self.id,
+            "owner_id": self.owner_id,
+            "name": self.name,
+            "location": self.location,
+            "surface_type": self.surface_type,
+            "about": self.about,
+            "image": self.image,
+            "width": self.width,
+            "length": self.length,
+            "price": self.price,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+        }
@@ -0,0 +1,48 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import BigInteger, Column, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+
+class JobStatus(str, Enum):
+    pending = "pending"
+    dead = "dead"
+
+
+class Job(SQLModel, table=True):
+    """
+    A side effect queued in the same transaction as the change it follows.
+
+    A job that succeeds is deleted. One that fails is retried at ``run_at``
+    until it has failed ``max_attempts`` times, and is then kept as dead
+    along with its last error. While a worker runs the job, ``run_at`` is
+    the end of its lease.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index(
+            "ix_jobs_pending_run_at",
+            "run_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+    id: int | None = Field(
+        default=None, sa_column=Column(BigInteger, primary_key=True)
+    )
+
+    name: str = Field(nullable=False)
+    payload: dict = Field(sa_column=Column(JSONB, nullable=False))
+
+    status: str = Field(default=JobStatus.pending.value, nullable=False)
+    attempts: int = Field(default=0, nullable=False)
+    max_attempts: int = Field(nullable=False)
+    run_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    last_error: str | None = None
+
+    created_at: datetime = Field(
+        default_factory=datetime.utcnow, nullable=False
+    )
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+
+class OutboxEvent(SQLModel, table=True):
+    """
+    A change appended in the same transaction as the mutation it records.
+
+    ``txid`` is the ID of the writing transaction. Ordering by it before
+    ``id`` lets consumers tell when every earlier event has committed, which
+    ``id`` alone cannot, as transactions commit out of sequence order.
+    """
+
+    __tablename__ = "outbox"
+    __table_args__ = (Index("ix_outbox_txid_id", "txid", "id"),)
+
+    id: int | None = Field(
+        default=None, sa_column=Column(BigInteger, primary_key=True)
+    )
+    txid: int | None = Field(
+        default=None,
+        sa_column=Column(
+            BigInteger,
+            nullable=False,
+            server_default=text("txid_current()"),
+        ),
+    )
+
+    topic: str = Field(nullable=False)
+    key: int = Field(nullable=False)
+    payload: dict = Field(sa_column=Column(JSONB, nullable=False))
+    created_at: datetime = Field(
+        default_factory=datetime.utcnow, nullable=False, index=True
+    )
+
+
+class OutboxOffset(SQLModel, table=True):
+    """
+    How far a consumer has read the outbox.
+    """
+
+    __tablename__ = "outbox_offsets"
+
+    consumer: str = Field(primary_key=True)
+    txid: int = Field(sa_column=Column(BigInteger, nullable=False))
+    event_id: int = Field(sa_column=Column(BigInteger, nullable=False))
@@ -1,10 +1,11 @@
 from typing import Optional
 
-from db.models.person import Person
+from db.models.person import Person, directory_indexes
 
 
 class Owner(Person, table=True):
     __tablename__ = "owners"
+    __table_args__ = directory_indexes("owners")
 
     email: Optional[str]
     phone_number: Optional[str]
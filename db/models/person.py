@@ -1,6 +1,28 @@
-import bcrypt
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel
 
+from db import passwords
+
+
+def directory_indexes(table: str) -> tuple[Index, ...]:
+    """
+    Returns the indexes behind case-insensitive prefix searches of a
+    table's usernames and names.
+
+    The trigram indexes behind substring searches need the ``pg_trgm``
+    extension, so only the migration creates them.
+    """
+    return (
+        Index(
+            f"ix_{table}_username_prefix",
+            text("lower(username) text_pattern_ops"),
+        ),
+        Index(
+            f"ix_{table}_name_prefix",
+            text("lower(name) text_pattern_ops"),
+        ),
+    )
+
 
 class Person(SQLModel):
     id: int = Field(primary_key=True)
@@ -11,13 +33,27 @@ class Person(SQLModel):
 
     @staticmethod
     def hash_password(password: str) -> str:
-        return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        return passwords.hash_password(password)
+
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        return await passwords.hash_password_async(password)
 
     def verify_password(self, password: str) -> bool:
-        return bcrypt.checkpw(password.encode(), self.password.encode())
+        return passwords.verify_password(password, self.password)
+
+    async def verify_password_async(self, password: str) -> bool:
+        return await passwords.verify_password_async(password, self.password)
+
+    def needs_rehash(self) -> bool:
+        return passwords.needs_rehash(self.password)
 
     def json(self) -> dict:
-        return self.__repr__()
+        return {
+            "id": self.id,
+            "username": self.username,
+            "name": self.name,
+        }
 
     def __str__(self) -> str:
         return super().__str__()
@@ -0,0 +1,12 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+
+class RevokedToken(SQLModel, table=True):
+    __tablename__ = "revoked_tokens"
+
+    id: int = Field(primary_key=True)
+
+    jti: str = Field(nullable=False, unique=True)
+    expires_at: datetime = Field(nullable=False)
@@ -1,11 +1,19 @@
+from datetime import datetime
+
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class UserSession(SQLModel, table=True):
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_session_id", "session_id", unique=True),
+    )
 
     id: int = Field(primary_key=True)
 
     session_id: str = Field(nullable=False)
-    user_id: int = Field(nullable=False)
+    user_id: int = Field(nullable=False, index=True)
     is_owner: bool = Field(nullable=False, default=False)
+
+    expires_at: datetime = Field(nullable=False, index=True)
@@ -1,5 +1,6 @@
-from db.models.person import Person
+from db.models.person import Person, directory_indexes
 
 
 class User(Person, table=True):
     __tablename__ = "users"
+    __table_args__ = directory_indexes("users")
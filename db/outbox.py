@@ -0,0 +1,172 @@
+"""
+A transactional outbox of booking and field changes.
+
+Mutations append an ``OutboxEvent`` in their own transaction, so an event
+exists if and only if its change committed. ``OutboxDispatcher`` reads the
+events back in batches and hands them to in-process subscribers, at least
+once each.
+"""
+import asyncio
+import fnmatch
+import logging
+import os
+from datetime import timedelta
+from typing import Callable
+
+import orjson
+from sqlalchemy import text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from .database import get_engine
+from .models import OutboxEvent, OutboxOffset
+
+logger = logging.getLogger(__name__)
+
+# Events older than this are purged, whether or not every consumer has
+# read them.
+OUTBOX_RETENTION = timedelta(
+    days=float(os.environ.get("OUTBOX_RETENTION_DAYS", 7))
+)
+
+Subscriber = Callable[[OutboxEvent], None]
+
+
+def outbox_event(topic: str, key: int, payload: dict) -> OutboxEvent:
+    """
+    Returns an event to add to the session of the mutation it records.
+
+    Args:
+        topic (str): What happened, e.g. ``booking.created``.
+        key (int): The ID of the changed booking or field.
+        payload (dict): The changed row, as returned by its ``json``.
+
+    Returns:
+        OutboxEvent: The event, with the payload made JSON-safe.
+    """
+    return OutboxEvent(
+        topic=topic, key=key, payload=orjson.loads(orjson.dumps(payload))
+    )
+
+
+class OutboxDispatcher:
+    """
+    Delivers outbox events to the subscribers of their topic in batches of
+    ``batch_size``, every ``interval`` seconds.
+
+    The consumer's position is stored in ``outbox_offsets`` and advanced in
+    the transaction that locks it, after the batch is delivered. A crash or
+    a failing subscriber therefore means redelivery, never a lost event.
+    Dispatchers sharing a consumer name share one position, so each event
+    goes to one of them. A new consumer starts with the events written
+    after its first drain.
+
+    Events are only read once every transaction that started before them
+    has finished, so an event committed late cannot be skipped.
+    """
+
+    def __init__(
+        self, consumer: str, batch_size: int = 100, interval: float = 1.0
+    ):
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.interval = interval
+        self.subscribers: list[tuple[str, Subscriber]] = []
+
+    def subscribe(self, topic: str, subscriber: Subscriber | None = None):
+        """
+        Registers a subscriber for the topics matching ``topic``, a glob
+        pattern such as ``booking.*``. Can be used as a decorator.
+        """
+        if subscriber is None:
+            return lambda subscriber: self.subscribe(topic, subscriber)
+
+        self.subscribers.append((topic, subscriber))
+        return subscriber
+
+    def drain(self) -> int:
+        """
+        Delivers every pending event.
+
+        Returns:
+            int: The number of delivered events.
+        """
+        delivered = 0
+
+        while True:
+            batch, done = self.dispatch_batch()
+            delivered += batch
+
+            if done:
+                return delivered
+
+    def dispatch_batch(self) -> tuple[int, bool]:
+        # Subscribers may keep the events after the batch commits.
+        with Session(get_engine(), expire_on_commit=False) as session:
+            horizon = session.scalar(
+                text("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+            )
+
+            session.execute(
+                insert(OutboxOffset)
+                .values(consumer=self.consumer, txid=horizon, event_id=0)
+                .on_conflict_do_nothing()
+            )
+            offset = session.scalar(
+                select(OutboxOffset)
+                .where(OutboxOffset.consumer == self.consumer)
+                .with_for_update()
+            )
+
+            events = session.scalars(
+                select(OutboxEvent)
+                .where(
+                    tuple_(OutboxEvent.txid, OutboxEvent.id)
+                    > tuple_(offset.txid, offset.event_id),
+                    OutboxEvent.txid < horizon,
+                )
+                .order_by(OutboxEvent.txid, OutboxEvent.id)
+                .limit(self.batch_size)
+            ).all()
+
+            delivered = 0
+            try:
+                for event in events:
+                    self.deliver(event)
+                    offset.txid, offset.event_id = event.txid, event.id
+                    delivered += 1
+            except Exception:
+                logger.exception(
+                    "Subscriber failed on outbox event %d, retrying later",
+                    event.id,
+                )
+                session.commit()
+                return delivered, True
+
+            session.commit()
+            return delivered, len(events) < self.batch_size
+
+    def deliver(self, event: OutboxEvent):
+        for topic, subscriber in self.subscribers:
+            if fnmatch.fnmatchcase(event.topic, topic):
+                subscriber(event)
+
+    async def run(self):
+        """
+        Drains the outbox every interval until cancelled.
+        """
+        while True:
+            try:
+                await run_in_threadpool(self.drain)
+            except Exception:
+                logger.exception("Failed to dispatch outbox events")
+
+            await asyncio.sleep(self.interval)
+
+
+outbox_dispatcher = OutboxDispatcher(
+    consumer=os.environ.get("OUTBOX_CONSUMER", "app"),
+    batch_size=int(os.environ.get("OUTBOX_BATCH_SIZE", 100)),
+    interval=float(os.environ.get("OUTBOX_POLL_INTERVAL", 1)),
+)
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+import bcrypt
+
+T = TypeVar("T")
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+
+class PasswordPool:
+    """
+    A bounded thread pool dedicated to bcrypt, so that hashing bursts queue
+    up here instead of occupying the request workers.
+    bcrypt releases the GIL while hashing, so threads run in parallel.
+
+    Args:
+        max_workers (int): The number of hashing threads.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.pending = 0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of password jobs waiting for a free thread.
+        """
+        return max(self.pending - self.max_workers, 0)
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        with self._lock:
+            self.pending += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+password_pool = PasswordPool(
+    max_workers=int(
+        os.environ.get("PASSWORD_HASH_WORKERS", min(os.cpu_count() or 1, 4))
+    )
+)
+
+
+def hash_password(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode(), salt).decode()
+
+
+def hash_passwords(
+    passwords: list[str], workers: int | None = None
+) -> list[str]:
+    """
+    Hashes many passwords at once on a pool of its own, one thread per CPU
+    by default, since bcrypt runs them in parallel outside of the GIL.
+
+    Args:
+        passwords (list[str]): The passwords to hash.
+        workers (int, optional): The number of hashing threads.
+
+    Returns:
+        list[str]: The hashes, in the order of the passwords.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(passwords) or 1)
+
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="bcrypt-bulk"
+    ) as executor:
+        return list(executor.map(hash_password, passwords))
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+
+def needs_rehash(hashed: str) -> bool:
+    """
+    Checks whether a hash was made with a cost other than BCRYPT_ROUNDS.
+
+    Args:
+        hashed (str): A bcrypt hash, ``$2b$<cost>$<salt and digest>``.
+
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await password_pool.run(verify_password, password, hashed)
@@ -0,0 +1,212 @@
+import hashlib
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Iterator
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, make_url
+from sqlmodel import Session, create_engine
+
+from cache import TTLCache
+
+from .database import ObservedQueuePool, get_engine, pool_options
+from .invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a replica's connection, so that an unreachable one
+# fails its check quickly instead of hanging on the TCP timeout.
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get("REPLICA_CONNECT_TIMEOUT", 2))
+
+
+class Replica:
+    """
+    A read replica and the outcome of its last health check.
+
+    The engine is created on first use, as the primary's is. A replica
+    only counts as healthy once a health check succeeded.
+
+    Attributes:
+        healthy (bool): Whether the last health check succeeded.
+        checked_at (float): When the replica was last checked.
+        checking (bool): Whether a health check is running.
+    """
+
+    def __init__(self, url: str):
+        self.url = make_url(url)
+        self.healthy = False
+        self.checked_at = float("-inf")
+        self.checking = False
+
+        self._engine: Engine | None = None
+        self._engine_lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = create_engine(
+                        self.url,
+                        poolclass=ObservedQueuePool,
+                        connect_args={
+                            "connect_timeout": REPLICA_CONNECT_TIMEOUT
+                        },
+                        **pool_options,
+                    )
+
+        return self._engine
+
+    @property
+    def name(self) -> str:
+        return self.url.render_as_string(hide_password=True)
+
+
+class ReplicaSet:
+    """
+    Hands out read replicas round-robin, skipping the ones that failed
+    their last health check.
+
+    A replica is checked with a ``SELECT 1`` at most once every
+    ``health_interval`` seconds, when it is next in line. The check runs on
+    a thread of its own, one per replica at a time, and requests go by the
+    replica's last result meanwhile, so an unreachable replica never holds
+    them up. Until its first check, a replica is skipped, so the app runs
+    ``check_all`` on startup.
+    """
+
+    def __init__(self, urls: list[str], health_interval: float = 10):
+        self.replicas = [Replica(url) for url in urls]
+        self.health_interval = health_interval
+
+        self._order = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def choose(self) -> Engine | None:
+        """
+        Returns the next healthy replica's engine, or None if there is no
+        healthy replica.
+        """
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._order)
+                stale = (
+                    time.monotonic() - replica.checked_at
+                    >= self.health_interval
+                    and not replica.checking
+                )
+                if stale:
+                    replica.checking = True
+
+            if stale:
+                threading.Thread(
+                    target=self.check, args=(replica,), daemon=True
+                ).start()
+
+            if replica.healthy:
+                return replica.engine
+
+        return None
+
+    def check_all(self):
+        """
+        Checks every replica now, waiting for the results.
+        """
+        for replica in self.replicas:
+            self.check(replica)
+
+    def check(self, replica: Replica) -> bool:
+        """
+        Checks the replica's health and returns it.
+        """
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception:
+            if replica.healthy:
+                logger.warning("Read replica %s is down", replica.name)
+
+            replica.healthy = False
+        else:
+            if not replica.healthy:
+                logger.info("Read replica %s is back up", replica.name)
+
+            replica.healthy = True
+
+        replica.checked_at = time.monotonic()
+        replica.checking = False
+        return replica.healthy
+
+    def status(self) -> list[dict]:
+        return [
+            {"replica": replica.name, "healthy": replica.healthy}
+            for replica in self.replicas
+        ]
+
+
+replica_set = ReplicaSet(
+    [
+        url
+        for url in os.environ.get("POSTGRESQL_REPLICA_URLS", "").split(",")
+        if url
+    ],
+    health_interval=float(os.environ.get("REPLICA_HEALTH_INTERVAL", 10)),
+)
+
+# Digests of the session IDs that recently wrote, read from the primary
+# until the replicas have caught up.
+primary_pins = TTLCache(
+    maxsize=10_000,
+    ttl=float(os.environ.get("READ_YOUR_WRITES_WINDOW", 5)),
+)
+
+
+def pin_key(session_id: str) -> str:
+    # Pins are broadcast, and any database user may listen to the channel.
+    return hashlib.sha256(session_id.encode()).hexdigest()[:32]
+
+
+def add_pins(keys: list[str]):
+    for key in keys:
+        primary_pins.set(key, True)
+
+
+# Pins missed while disconnected cannot be recovered, and clearing the
+# others would not help.
+invalidation_bus.subscribe("pins", add_pins, lambda: None)
+
+
+def pin_to_primary(session_id: str):
+    """
+    Routes the session's reads to the primary for the read-your-writes
+    window, on every worker.
+
+    Args:
+        session_id (str): The session ID of the client that wrote.
+    """
+    if replica_set:
+        invalidation_bus.publish(pins=[pin_key(session_id)])
+
+
+def get_read_session(request: Request) -> Iterator[Session]:
+    """
+    Yields a database session for read-only handlers, bound to a replica
+    unless there is none available or the client wrote recently.
+    """
+    bind = get_engine()
+
+    session_id = request.cookies.get("session_id")
+    if replica_set and not (
+        session_id and primary_pins.get(pin_key(session_id))
+    ):
+        bind = replica_set.choose() or bind
+
+    with Session(bind) as session:
+        yield session
@@ -1,14 +1,74 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 
 import routers
+from cache import ResponseCacheMiddleware, response_cache
+from db import dispose_async_engine, get_engine, replica_set
+from db.invalidation import invalidation_bus
+from db.maintenance import purge_periodically
+from db.outbox import outbox_dispatcher
+from routers.auth import SESSION_MODE, revocation_list
+from routers.system import authorize_profiling
+from telemetry import (
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    QueryTimingMiddleware,
+    instrument,
+    slow_query_log,
+)
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Created here rather than on import, so a misconfigured database URL
+    # fails the worker's startup instead of every importer.
+    get_engine()
+    if replica_set:
+        await run_in_threadpool(replica_set.check_all)
+
+    tasks = [
+        asyncio.create_task(
+            purge_periodically(
+                interval=float(os.environ.get("SESSION_PURGE_INTERVAL", 3600)),
+                batch_size=int(
+                    os.environ.get("SESSION_PURGE_BATCH_SIZE", 1000)
+                ),
+            )
+        )
+    ]
+
+    # Subscribers register on import, the dispatcher only polls if any did.
+    if outbox_dispatcher.subscribers:
+        tasks.append(asyncio.create_task(outbox_dispatcher.run()))
+
+    if invalidation_bus.enabled:
+        tasks.append(asyncio.create_task(invalidation_bus.listen()))
+
+    if SESSION_MODE == "signed":
+        tasks.append(
+            asyncio.create_task(revocation_list.refresh_periodically())
+        )
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    # Lets the listener close its connection.
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await dispose_async_engine()
+    slow_query_log.close()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 allow_origins = [
     "http://localhost:5173",
@@ -16,6 +76,11 @@ allow_origins = [
     os.environ.get("WEBSITE_URL"),
 ]
 
+instrument()
+app.add_middleware(QueryTimingMiddleware)
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware, authorize=authorize_profiling)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
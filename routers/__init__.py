@@ -2,6 +2,15 @@ from .users import router as users_router
 from .bookings import router as bookings_router
 from .owners import router as owners_router
 from .fields import router as fields_router
+from .system import router as system_router
+from .metrics import router as metrics_router
 
 
-__all__ = ["users_router", "bookings_router", "owners_router", "fields_router"]
+__all__ = [
+    "users_router",
+    "bookings_router",
+    "owners_router",
+    "fields_router",
+    "system_router",
+    "metrics_router",
+]
@@ -1,11 +1,44 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
 import os
+import threading
+import time
 import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 
 from fastapi import Depends, HTTPException, Request, Response, status
 from pydantic import BaseModel
-from sqlmodel import select
-
-from db import Owner, User, UserSession, session
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from cache import TTLCache
+from db import (
+    Owner,
+    RevokedToken,
+    User,
+    UserSession,
+    get_async_session,
+    get_engine,
+    get_read_session,
+    get_session,
+)
+from db.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+SESSION_LIFETIME = 60 * 60 * 24 * 7
+
+# "db" keeps sessions in the sessions table, "signed" issues stateless
+# HMAC-signed tokens that are verified without touching the database.
+SESSION_MODE = os.environ.get("SESSION_MODE", "db")
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "")
 
 
 class Credentials(BaseModel):
@@ -14,12 +47,309 @@ class Credentials(BaseModel):
     password: str
 
 
-def authenticate_user(
-    credentials: Credentials, is_owner: bool = False
+@dataclass(frozen=True)
+class Principal:
+    """
+    The identity behind a session, cheap enough to cache per session ID.
+
+    Attributes:
+        id (int): The ID of the user or owner.
+        is_owner (bool): Whether the principal is an owner.
+        username (str): The username, used for admin checks.
+    """
+
+    id: int
+    is_owner: bool
+    username: str
+
+
+session_cache = TTLCache(
+    maxsize=int(os.environ.get("SESSION_CACHE_SIZE", 10_000)),
+    ttl=float(os.environ.get("SESSION_CACHE_TTL", 60)),
+)
+
+
+def principal_key(user_id: int, is_owner: bool = False) -> str:
+    return f"{'owner' if is_owner else 'user'}:{user_id}"
+
+
+def evict_principals(keys: list[str]):
+    keys = set(keys)
+    session_cache.evict(
+        lambda _, principal: principal_key(principal.id, principal.is_owner)
+        in keys
+    )
+
+
+def evict_sessions(session_ids: list[str]):
+    for session_id in session_ids:
+        session_cache.pop(session_id)
+
+
+invalidation_bus.subscribe("principals", evict_principals, session_cache.clear)
+invalidation_bus.subscribe("sessions", evict_sessions, session_cache.clear)
+
+
+def invalidate_principal(user_id: int, is_owner: bool = False):
+    """
+    Evicts every cached session that belongs to the given user or owner,
+    on every worker.
+
+    Args:
+        user_id (int): The ID of the user or owner.
+        is_owner (bool, optional): Whether the ID refers to an owner.
+            Defaults to False.
+    """
+    invalidation_bus.publish(principals=[principal_key(user_id, is_owner)])
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    if not SESSION_SECRET:
+        raise RuntimeError("SESSION_SECRET must be set for signed sessions")
+
+    digest = hmac.new(
+        SESSION_SECRET.encode(), payload.encode(), hashlib.sha256
+    ).digest()
+    return _b64encode(digest)
+
+
+def issue_token(principal: Principal) -> str:
+    """
+    Issues a signed session token for the given principal.
+
+    Args:
+        principal (Principal): The principal the token authenticates.
+
+    Returns:
+        str: The token, ``<payload>.<signature>``.
+    """
+    claims = {
+        "sub": principal.id,
+        "own": principal.is_owner,
+        "usr": principal.username,
+        "iat": time.time(),
+        "exp": int(time.time()) + SESSION_LIFETIME,
+        "jti": uuid.uuid4().hex,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> dict | None:
+    """
+    Verifies a signed session token in memory.
+
+    Args:
+        token (str): The token to verify.
+
+    Returns:
+        dict | None: The token's claims, or None if the token is malformed,
+            forged, expired or revoked.
+    """
+    payload, _, signature = token.partition(".")
+    # Compared as bytes, compare_digest rejects non-ASCII strings.
+    if not signature or not hmac.compare_digest(
+        signature.encode(), _sign(payload).encode()
+    ):
+        return None
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+
+    if claims["exp"] < time.time() or revocation_list.revoked(claims):
+        return None
+
+    return claims
+
+
+class RevocationList:
+    """
+    The IDs of revoked signed tokens that have not expired yet, and the
+    times before which every token of a revoked subject was issued.
+
+    A subject, such as a deleted owner or a renamed user, is stored in the
+    revoked_tokens table as ``sub:<owner|user>:<id>``, expiring one session
+    lifetime after its revocation, when its tokens have expired anyway.
+
+    Both live in memory, so checking a token never touches the database.
+    ``refresh_periodically`` reloads them from the table every
+    ``refresh_interval`` seconds in the background, keeping the last ones
+    when the reload fails. A revocation on one worker is also broadcast on
+    the invalidation bus, so it reaches the others right away, or within
+    that interval if the notification is missed.
+
+    Args:
+        refresh_interval (float): Seconds between reloads from the database.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+
+        self._revoked: set[str] = set()
+        self._not_before: dict[str, float] = {}
+        self._refreshed_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with Session(get_engine()) as session:
+            stmt = select(RevokedToken).where(
+                RevokedToken.expires_at > datetime.utcnow()
+            )
+            rows = session.scalars(stmt).all()
+
+        revoked = {x.jti for x in rows if not x.jti.startswith("sub:")}
+        not_before = {
+            x.jti.removeprefix("sub:"): x.expires_at.replace(
+                tzinfo=timezone.utc
+            ).timestamp()
+            - SESSION_LIFETIME
+            for x in rows
+            if x.jti.startswith("sub:")
+        }
+
+        with self._lock:
+            self._revoked = revoked
+            self._not_before = not_before
+            self._refreshed_at = time.monotonic()
+
+    async def refresh_periodically(self):
+        """
+        Reloads the list every interval, or soon after ``expire``, until
+        cancelled.
+        """
+        while True:
+            if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                try:
+                    await run_in_threadpool(self.refresh)
+                except Exception:
+                    logger.exception(
+                        "Failed to reload revoked tokens, keeping the last ones"
+                    )
+                    self._refreshed_at = time.monotonic()
+
+            await asyncio.sleep(min(1, self.refresh_interval))
+
+    def revoked(self, claims: dict) -> bool:
+        if claims["jti"] in self._revoked:
+            return True
+
+        # Tokens issued before the claim existed are dated by their expiry.
+        issued_at = claims.get("iat", claims["exp"] - SESSION_LIFETIME)
+        not_before = self._not_before.get(
+            principal_key(claims["sub"], claims["own"])
+        )
+        return not_before is not None and issued_at <= not_before
+
+    def revoke(self, jti: str, expires_at: int):
+        with Session(get_engine()) as session:
+            session.add(
+                RevokedToken(
+                    jti=jti, expires_at=datetime.utcfromtimestamp(expires_at)
+                )
+            )
+            session.commit()
+
+        invalidation_bus.publish(revocations=[jti])
+
+    def revoke_subject(self, key: str):
+        """
+        Revokes every token issued so far to the subject ``key``, as
+        returned by ``principal_key``.
+        """
+        revoked_at = time.time()
+        expires_at = datetime.utcfromtimestamp(revoked_at + SESSION_LIFETIME)
+
+        with get_engine().begin() as connection:
+            connection.execute(
+                insert(RevokedToken)
+                .values(jti=f"sub:{key}", expires_at=expires_at)
+                .on_conflict_do_update(
+                    index_elements=["jti"], set_={"expires_at": expires_at}
+                )
+            )
+
+        invalidation_bus.publish(subjects=[f"{key}@{revoked_at}"])
+
+    def add(self, jtis: list[str]):
+        with self._lock:
+            self._revoked.update(jtis)
+
+    def add_subjects(self, keys: list[str]):
+        with self._lock:
+            for key in keys:
+                subject, _, revoked_at = key.rpartition("@")
+                self._not_before[subject] = max(
+                    float(revoked_at), self._not_before.get(subject, 0)
+                )
+
+    def expire(self):
+        """
+        Has the list reloaded from the database within a second.
+        """
+        self._refreshed_at = float("-inf")
+
+
+revocation_list = RevocationList(
+    refresh_interval=float(os.environ.get("SESSION_REVOCATION_REFRESH", 30))
+)
+invalidation_bus.subscribe(
+    "revocations", revocation_list.add, revocation_list.expire
+)
+invalidation_bus.subscribe(
+    "subjects", revocation_list.add_subjects, revocation_list.expire
+)
+
+
+def revoke_tokens(user_id: int, is_owner: bool = False):
+    """
+    Revokes the signed tokens issued so far to the given user or owner, so
+    that a deleted or renamed principal cannot keep using their claims.
+    Sessions stored in the database need not be, they are looked up.
+
+    Args:
+        user_id (int): The ID of the user or owner.
+        is_owner (bool, optional): Whether the ID refers to an owner.
+            Defaults to False.
+    """
+    if SESSION_MODE == "signed":
+        revocation_list.revoke_subject(principal_key(user_id, is_owner))
+
+
+def find_person(
+    session: Session, Entity: type[User | Owner], username: str
+) -> User | Owner:
+    stmt = select(Entity).where(Entity.username == username)
+    return session.scalar(stmt)
+
+
+def save_person(session: Session, person: User | Owner):
+    session.add(person)
+    session.commit()
+    session.refresh(person)
+
+
+async def authenticate_user(
+    credentials: Credentials,
+    is_owner: bool = False,
+    session: Session = Depends(get_session),
 ) -> User:
     """
     Authenticates a user with the given credentials.
 
+    The password is checked on the bcrypt pool, and a hash made with an
+    outdated cost is transparently replaced.
+
     Args:
         credentials (Credentials): The user's credentials.
         is_owner (bool, optional): Whether the user is an owner. Defaults to False.
@@ -32,52 +362,78 @@ def authenticate_user(
     """
     Entity = Owner if is_owner else User
 
-    with session:
-        stmt = select(Entity).where(Entity.username == credentials.username)
-        user: Entity = session.scalar(stmt)
+    user: Entity = await run_in_threadpool(
+        find_person, session, Entity, credentials.username
+    )
 
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                headers={"WWW-Authenticate": "Basic"},
-                detail="User not found",
-            )
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            headers={"WWW-Authenticate": "Basic"},
+            detail="User not found",
+        )
 
-        if not user.verify_password(credentials.password):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                headers={"WWW-Authenticate": "Basic"},
-            )
+    if not await user.verify_password_async(credentials.password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            headers={"WWW-Authenticate": "Basic"},
+        )
 
-        return user
+    if user.needs_rehash():
+        user.password = await Entity.hash_password_async(credentials.password)
+        await run_in_threadpool(save_person, session, user)
+
+    return user
 
 
-def authenticate_owner(credentials: Credentials) -> Owner:
-    return authenticate_user(credentials, is_owner=True)
+async def authenticate_owner(
+    credentials: Credentials, session: Session = Depends(get_session)
+) -> Owner:
+    return await authenticate_user(credentials, is_owner=True, session=session)
 
 
-def create_session(user_id: int, is_owner: bool = False):
+def create_session(
+    session: Session,
+    user_id: int,
+    is_owner: bool = False,
+    username: str | None = None,
+):
     """
     Creates a new user session and returns the session ID.
 
     Args:
+        session (Session): The database session of the request.
         user_id (int): The ID of the user for whom the session is being created.
         is_owner (bool, optional):
             Whether the user is the owner of the session.
             Defaults to False.
+        username (str, optional):
+            The user's username, embedded in signed session tokens.
+            Looked up when omitted.
 
     Returns:
         str: The session ID of the newly created session.
     """
-    with session:
-        user_session = UserSession(
-            user_id=user_id, session_id=str(uuid.uuid4()), is_owner=is_owner
+    if SESSION_MODE == "signed":
+        if username is None:
+            Entity = Owner if is_owner else User
+            username = session.get(Entity, user_id).username
+
+        return issue_token(
+            Principal(id=user_id, is_owner=is_owner, username=username)
         )
-        session.add(user_session)
-        session.commit()
-        session.refresh(user_session)
 
-        return user_session.session_id
+    user_session = UserSession(
+        user_id=user_id,
+        session_id=str(uuid.uuid4()),
+        is_owner=is_owner,
+        expires_at=datetime.utcnow() + timedelta(seconds=SESSION_LIFETIME),
+    )
+    session.add(user_session)
+    session.commit()
+    session.refresh(user_session)
+
+    return user_session.session_id
 
 
 def get_session_id(request: Request):
@@ -103,49 +459,226 @@ def get_session_id(request: Request):
     return session_id
 
 
-def get_authenticated_user(request: Request) -> User:
+def get_principal(
+    request: Request, session: Session = Depends(get_session)
+) -> Principal:
     """
-    Returns the authenticated user for the given request.
+    Returns the principal behind the request's session,
+    serving it from the session cache when possible.
 
     Args:
         request (Request): The incoming request.
+        session (Session): The database session of the request.
 
     Returns:
-        User: The authenticated user.
+        Principal: The authenticated principal.
 
     Raises:
         HTTPException: If the session_id is invalid.
     """
     session_id = get_session_id(request)
 
-    with session:
-        stmt = select(UserSession).where(UserSession.session_id == session_id)
-        user_session = session.scalar(stmt)
-        if not user_session:
+    if SESSION_MODE == "signed":
+        claims = verify_token(session_id)
+        if claims is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid session_id",
             )
 
-        user = get_user_from_session(user_session)
-        return user
+        return Principal(
+            id=claims["sub"], is_owner=claims["own"], username=claims["usr"]
+        )
+
+    principal = session_cache.get(session_id)
+    if principal is not None:
+        return principal
 
+    stmt = select(UserSession).where(
+        UserSession.session_id == session_id,
+        UserSession.expires_at > datetime.utcnow(),
+    )
+    user_session = session.scalar(stmt)
+    if not user_session:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid session_id",
+        )
 
-def get_authenticated_owner(request: Request) -> Owner:
-    owner = get_authenticated_user(request)
+    user = get_user_from_session(session, user_session)
+    principal = Principal(
+        id=user.id,
+        is_owner=user_session.is_owner,
+        username=user.username,
+    )
 
-    if not isinstance(owner, Owner):
+    # Spares get_authenticated_user a reload on a cache miss.
+    request.state.user = user
+
+    session_cache.set(
+        session_id,
+        principal,
+        ttl=(user_session.expires_at - datetime.utcnow()).total_seconds(),
+    )
+    return principal
+
+
+def get_owner_principal(
+    principal: Principal = Depends(get_principal),
+) -> Principal:
+    if not principal.is_owner:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
 
-    return owner
+    return principal
+
+
+async def get_principal_async(
+    request: Request, session: AsyncSession = Depends(get_async_session)
+) -> Principal:
+    """
+    The async counterpart of get_principal, used by the async handlers.
+
+    Args:
+        request (Request): The incoming request.
+        session (AsyncSession): The async database session of the request.
 
+    Returns:
+        Principal: The authenticated principal.
 
-def get_user_from_session(user_session: UserSession) -> User:
+    Raises:
+        HTTPException: If the session_id is invalid.
+    """
+    session_id = get_session_id(request)
+
+    if SESSION_MODE == "signed":
+        claims = verify_token(session_id)
+        if claims is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid session_id",
+            )
+
+        return Principal(
+            id=claims["sub"], is_owner=claims["own"], username=claims["usr"]
+        )
+
+    principal = session_cache.get(session_id)
+    if principal is not None:
+        return principal
+
+    stmt = select(UserSession).where(
+        UserSession.session_id == session_id,
+        UserSession.expires_at > datetime.utcnow(),
+    )
+    user_session = await session.scalar(stmt)
+    if not user_session:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid session_id",
+        )
+
+    Entity = Owner if user_session.is_owner else User
+
+    user = await session.get(Entity, user_session.user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid session_id",
+        )
+
+    principal = Principal(
+        id=user.id,
+        is_owner=user_session.is_owner,
+        username=user.username,
+    )
+
+    session_cache.set(
+        session_id,
+        principal,
+        ttl=(user_session.expires_at - datetime.utcnow()).total_seconds(),
+    )
+    return principal
+
+
+async def get_owner_principal_async(
+    principal: Principal = Depends(get_principal_async),
+) -> Principal:
+    if not principal.is_owner:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+    return principal
+
+
+def get_authenticated_user(
+    request: Request,
+    principal: Principal = Depends(get_principal),
+    session: Session = Depends(get_session),
+) -> User:
+    """
+    Returns the authenticated user for the given request.
+
+    Args:
+        request (Request): The incoming request.
+        principal (Principal): The principal behind the request's session.
+        session (Session): The database session of the request.
+
+    Returns:
+        User: The authenticated user.
+
+    Raises:
+        HTTPException: If the session_id is invalid.
+    """
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+
+    Entity = Owner if principal.is_owner else User
+
+    user = session.get(Entity, principal.id)
+    if not user:
+        session_cache.pop(get_session_id(request))
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid session_id",
+        )
+
+    return user
+
+
+def get_authenticated_owner(
+    request: Request,
+    principal: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_session),
+) -> Owner:
+    return get_authenticated_user(request, principal, session)
+
+
+def read_authenticated_user(
+    request: Request,
+    principal: Principal = Depends(get_principal),
+    session: Session = Depends(get_read_session),
+) -> User:
+    """
+    Like get_authenticated_user, but loads the user from a read replica.
+    """
+    return get_authenticated_user(request, principal, session)
+
+
+def read_authenticated_owner(
+    request: Request,
+    principal: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_read_session),
+) -> Owner:
+    return get_authenticated_user(request, principal, session)
+
+
+def get_user_from_session(session: Session, user_session: UserSession) -> User:
     """
     Given a UserSession object,
     returns the corresponding User or Owner object from the database.
 
     Args:
+        session (Session): The database session of the request.
         user_session (UserSession):
             The UserSession object containing the user_id and is_owner flag.
 
@@ -158,50 +691,56 @@ def get_user_from_session(user_session: UserSession) -> User:
             If the user_id in the UserSession is invalid or
             does not correspond to a User or Owner object.
     """
-    with session:
-        Entity = Owner if user_session.is_owner else User
+    Entity = Owner if user_session.is_owner else User
 
-        stmt = select(Entity).where(Entity.id == user_session.user_id)
-        user = session.scalar(stmt)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid session_id",
-            )
+    stmt = select(Entity).where(Entity.id == user_session.user_id)
+    user = session.scalar(stmt)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid session_id",
+        )
 
-        return user
+    return user
 
 
-def is_already_logged_in(request: Request) -> bool:
+def is_already_logged_in(request: Request, session: Session) -> bool:
     """
     Check if the user is already logged in
     by checking if the session_id cookie exists and is valid.
 
     Args:
         request (Request): The incoming request object.
+        session (Session): The database session of the request.
 
     Returns:
         bool: True if the user is already logged in, False otherwise.
     """
     if request.cookies.get("session_id"):
-        with session:
-            stmt = select(UserSession).where(
-                UserSession.session_id == request.cookies.get("session_id")
-            )
-            user_session = session.scalar(stmt)
+        if SESSION_MODE == "signed":
+            return verify_token(request.cookies["session_id"]) is not None
 
-            if user_session:
-                return True
+        if session_cache.get(request.cookies["session_id"]) is not None:
+            return True
+
+        stmt = select(UserSession).where(
+            UserSession.session_id == request.cookies.get("session_id"),
+            UserSession.expires_at > datetime.utcnow(),
+        )
+        user_session = session.scalar(stmt)
+
+        if user_session:
+            return True
 
     return False
 
 
-def is_admin(user: User) -> bool:
+def is_admin(user: User | Principal) -> bool:
     """
     Check if the user is an admin user.
 
     Args:
-        user (User): The user to check.
+        user (User | Principal): The user to check.
 
     Returns:
         bool: True if the user is an admin user, False otherwise.
@@ -209,21 +748,20 @@ def is_admin(user: User) -> bool:
     return user.username in os.environ["ADMINS"].split(",")
 
 
-def get_admin_user(request: Request) -> User:
+def get_admin_user(user: Principal = Depends(get_principal)) -> Principal:
     """
-    Returns the authenticated user if they are an admin user,
+    Returns the authenticated principal if they are an admin user,
     otherwise raises a 403 Forbidden error.
 
     Args:
-        request (Request): The request object.
+        user (Principal): The authenticated principal.
 
     Returns:
-        User: The authenticated user.
+        Principal: The authenticated principal.
 
     Raises:
         HTTPException: If the authenticated user is not an admin user.
     """
-    user = get_authenticated_user(request)
 
     if not is_admin(user):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
@@ -231,7 +769,11 @@ def get_admin_user(request: Request) -> User:
     return user
 
 
-def logout(response: Response, session_id: str = Depends(get_session_id)):
+def logout(
+    response: Response,
+    session_id: str = Depends(get_session_id),
+    session: Session = Depends(get_session),
+):
     """
     Logs out the user by deleting the user session from the database and
     deleting the session_id cookie from the response.
@@ -242,6 +784,7 @@ def logout(response: Response, session_id: str = Depends(get_session_id)):
         session_id (str, optional):
             The session ID to use for logging out.
             Defaults to Depends(get_session_id).
+        session (Session): The database session of the request.
 
     Raises:
         HTTPException: If the session ID is invalid.
@@ -249,17 +792,30 @@ def logout(response: Response, session_id: str = Depends(get_session_id)):
     Returns:
         dict: A dictionary containing a success message.
     """
-    with session:
-        stmt = select(UserSession).where(UserSession.session_id == session_id)
-        user_session = session.scalar(stmt)
-        if not user_session:
+    if SESSION_MODE == "signed":
+        claims = verify_token(session_id)
+        if claims is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid session_id",
             )
-        session.delete(user_session)
-        session.commit()
 
+        revocation_list.revoke(claims["jti"], claims["exp"])
         response.delete_cookie(key="session_id")
 
         return {"message": "User logged out successfully"}
+
+    stmt = select(UserSession).where(UserSession.session_id == session_id)
+    user_session = session.scalar(stmt)
+    if not user_session:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid session_id",
+        )
+    session.delete(user_session)
+    session.commit()
+    invalidation_bus.publish(sessions=[session_id])
+
+    response.delete_cookie(key="session_id")
+
+    return {"message": "User logged out successfully"}
@@ -1,21 +1,43 @@
+import logging
 from datetime import datetime
+from typing import Iterable
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select
-
-from db import Booking, FootballField, Owner, User, session
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from db import (
+    ASYNC_DATABASE,
+    Booking,
+    FootballField,
+    Job,
+    get_async_session,
+    get_session,
+    pin_to_primary,
+)
+from db.jobs import background_job, job_queue
 from db.models.booking import BookingStatus
+from db.outbox import outbox_event
 from routers.auth import (
+    Principal,
     get_admin_user,
-    get_authenticated_owner,
-    get_authenticated_user,
+    get_owner_principal,
+    get_owner_principal_async,
+    get_principal,
+    get_principal_async,
+    get_session_id,
     is_admin,
 )
+from routers.fields import invalidate_bookings
 
 router = APIRouter(prefix="/bookings")
 
+logger = logging.getLogger(__name__)
+
 
 class BookingData(BaseModel):
     user_id: int | None
@@ -31,229 +53,360 @@ class BookingUpdate(BaseModel):
     status: BookingStatus
 
 
-def overlap(booking: Booking) -> bool:
-    with session:
-        stmt = select(Booking).where(
-            Booking.field_id == booking.field_id,
-        )
+@job_queue.task("booking.notify")
+def notify_booking(payload: dict):
+    """
+    Tells the user who made a booking about its status. There is no
+    delivery channel yet, so the notice is logged.
+    """
+    logger.info(
+        "Booking %d of user %d is %s",
+        payload["booking_id"],
+        payload["user_id"],
+        payload["status"],
+    )
+
+
+def booking_notice(booking: Booking) -> Job:
+    return background_job(
+        "booking.notify",
+        {
+            "booking_id": booking.id,
+            "user_id": booking.user_id,
+            "status": booking.status,
+        },
+    )
+
+
+def overlap(session: Session, booking: Booking) -> bool:
+    stmt = select(Booking).where(
+        Booking.field_id == booking.field_id,
+    )
+
+    return overlaps(booking, session.scalars(stmt))
+
+
+def overlaps(booking: Booking, existing_bookings: Iterable[Booking]) -> bool:
+    for existing_booking in existing_bookings:
+        if (
+            existing_booking.booking_date == booking.booking_date
+            or existing_booking.booked_until == booking.booked_until
+        ):
+            return True
+
+        if (
+            existing_booking.booking_date < booking.booking_date
+            and existing_booking.booked_until > booking.booked_until
+        ):
+            return True
+
+        if (
+            existing_booking.booked_until > booking.booking_date
+            and existing_booking.booked_until < booking.booked_until
+        ):
+            return True
+
+        if (
+            existing_booking.booking_date < booking.booked_until
+            and existing_booking.booking_date > booking.booking_date
+        ):
+            return True
+
+    return False
+
+
+def booking_price(field: FootballField, booking: Booking) -> float:
+    return (
+        field.price
+        * (booking.booked_until - booking.booking_date).seconds
+        / 3600
+    )
 
-        existing_bookings: list[Booking] = session.scalars(stmt)
 
-        for existing_booking in existing_bookings:
-            if (
-                existing_booking.booking_date == booking.booking_date
-                or existing_booking.booked_until == booking.booked_until
-            ):
-                return True
+def create_booking(
+    data: BookingData,
+    user: Principal = Depends(get_principal),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
+):
+    try:
+        booking = Booking(**(dict(vars(data).items())))
+        booking.user_id = user.id
+
+        stmt = select(FootballField).where(FootballField.id == data.field_id)
+        field: FootballField = session.scalar(stmt)
+        if not field:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Field not found",
+            )
 
-            if (
-                existing_booking.booking_date < booking.booking_date
-                and existing_booking.booked_until > booking.booked_until
-            ):
-                return True
+        if overlap(session, booking):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Bookng overlaps with another booking",
+            )
 
-            if (
-                existing_booking.booked_until > booking.booking_date
-                and existing_booking.booked_until < booking.booked_until
-            ):
-                return True
+        booking.total_price = booking_price(field, booking)
+        owner_id = field.owner_id
 
-            if (
-                existing_booking.booking_date < booking.booked_until
-                and existing_booking.booking_date > booking.booking_date
-            ):
-                return True
+        session.add(booking)
+        session.flush()
+        session.add(
+            outbox_event("booking.created", booking.id, booking.json())
+        )
+        session.add(booking_notice(booking))
+        session.commit()
+        pin_to_primary(session_id)
+        invalidate_bookings(data.field_id, owner_id)
 
-        return False
+        session.refresh(booking)
+        return booking.json()
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-def create_booking(
-    data: BookingData, user: User = Depends(get_authenticated_user)
+async def create_booking_async(
+    data: BookingData,
+    user: Principal = Depends(get_principal_async),
+    session: AsyncSession = Depends(get_async_session),
+    session_id: str = Depends(get_session_id),
 ):
-    with session:
-        try:
-            booking = Booking(**(dict(vars(data).items())))
-            booking.user_id = user.id
+    try:
+        booking = Booking(**(dict(vars(data).items())))
+        booking.user_id = user.id
 
-            stmt = select(FootballField).where(
-                FootballField.id == data.field_id
-            )
-            field: FootballField = session.scalar(stmt)
-            if not field:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Field not found",
-                )
-
-            if overlap(booking):
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail="Bookng overlaps with another booking",
-                )
-
-            booking.total_price = (
-                field.price
-                * (booking.booked_until - booking.booking_date).seconds
-                / 3600
+        field = await session.get(FootballField, data.field_id)
+        if not field:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Field not found",
             )
 
-            session.add(booking)
-            session.commit()
-
-            session.refresh(booking)
-            return booking.json()
-        except IntegrityError:
+        stmt = select(Booking).where(Booking.field_id == booking.field_id)
+        if overlaps(booking, await session.scalars(stmt)):
             raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Bookng overlaps with another booking",
             )
 
+        booking.total_price = booking_price(field, booking)
+        owner_id = field.owner_id
+
+        session.add(booking)
+        await session.flush()
+        session.add(
+            outbox_event("booking.created", booking.id, booking.json())
+        )
+        session.add(booking_notice(booking))
+        await session.commit()
+        pin_to_primary(session_id)
+        await run_in_threadpool(invalidate_bookings, data.field_id, owner_id)
+
+        await session.refresh(booking)
+        return booking.json()
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+router.add_api_route(
+    "/",
+    create_booking_async if ASYNC_DATABASE else create_booking,
+    methods=["POST"],
+    status_code=status.HTTP_201_CREATED,
+)
+
 
 @router.get(
     "/", status_code=status.HTTP_200_OK, dependencies=[Depends(get_admin_user)]
 )
-def get_bookings():
-    with session:
-        stmt = select(Booking)
-        return [booking.json() for booking in session.scalars(stmt)]
+def get_bookings(session: Session = Depends(get_session)):
+    stmt = select(Booking)
+    return ORJSONResponse(
+        [booking.json() for booking in session.scalars(stmt)]
+    )
 
 
 @router.get("/user", status_code=status.HTTP_200_OK)
-def get_user_bookings(user: User = Depends(get_authenticated_user)):
-    with session:
-        stmt = select(Booking).where(Booking.user_id == user.id)
-        return [booking.json() for booking in session.scalars(stmt)]
+def get_user_bookings(
+    user: Principal = Depends(get_principal),
+    session: Session = Depends(get_session),
+):
+    stmt = select(Booking).where(Booking.user_id == user.id)
+    return ORJSONResponse(
+        [booking.json() for booking in session.scalars(stmt)]
+    )
 
 
-@router.get("/field/{field_id}", status_code=status.HTTP_200_OK)
 def get_field_bookings(
-    field_id: int, owner: Owner = Depends(get_authenticated_owner)
+    field_id: int,
+    owner: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_session),
 ):
-    with session:
-        stmt = select(FootballField).where(FootballField.id == field_id)
-        field: FootballField = session.scalar(stmt)
+    stmt = select(FootballField).where(FootballField.id == field_id)
+    field: FootballField = session.scalar(stmt)
 
-        if not field:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Field not found",
-            )
-
-        if field.owner_id != owner.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not allowed to view this field",
-            )
+    if not field:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Field not found",
+        )
 
-        stmt = select(Booking).where(Booking.field_id == field_id)
-        bookings: list[Booking] = session.scalars(stmt)
+    if field.owner_id != owner.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not allowed to view this field",
+        )
 
-        return [booking.json() for booking in bookings]
+    stmt = select(Booking).where(Booking.field_id == field_id)
+    bookings: list[Booking] = session.scalars(stmt)
 
+    return ORJSONResponse([booking.json() for booking in bookings])
 
-@router.get("/{booking_id}", status_code=status.HTTP_200_OK)
-def get_booking(booking_id: int, user: User = Depends(get_authenticated_user)):
-    with session:
-        stmt = select(Booking).where(Booking.id == booking_id)
-        booking: Booking = session.scalar(stmt)
 
-        if not booking:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Booking not found",
-            )
+async def get_field_bookings_async(
+    field_id: int,
+    owner: Principal = Depends(get_owner_principal_async),
+    session: AsyncSession = Depends(get_async_session),
+):
+    field = await session.get(FootballField, field_id)
 
-        if is_admin(user):
-            return booking.json()
+    if not field:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Field not found",
+        )
 
-        stmt = select(FootballField).where(
-            FootballField.id == booking.field_id
+    if field.owner_id != owner.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not allowed to view this field",
         )
-        field: FootballField = session.scalar(stmt)
 
-        if isinstance(user, Owner) and field.owner_id != user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not allowed to view this booking",
-            )
+    stmt = select(Booking).where(Booking.field_id == field_id)
+    bookings = await session.scalars(stmt)
+
+    return ORJSONResponse([booking.json() for booking in bookings])
+
+
+router.add_api_route(
+    "/field/{field_id}",
+    get_field_bookings_async if ASYNC_DATABASE else get_field_bookings,
+    methods=["GET"],
+    status_code=status.HTTP_200_OK,
+)
 
-        if booking.user_id != user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not allowed to view this booking",
-            )
 
+@router.get("/{booking_id}", status_code=status.HTTP_200_OK)
+def get_booking(
+    booking_id: int,
+    user: Principal = Depends(get_principal),
+    session: Session = Depends(get_session),
+):
+    stmt = select(Booking).where(Booking.id == booking_id)
+    booking: Booking = session.scalar(stmt)
+
+    if not booking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found",
+        )
+
+    if is_admin(user):
         return booking.json()
 
+    stmt = select(FootballField).where(FootballField.id == booking.field_id)
+    field: FootballField = session.scalar(stmt)
+
+    if user.is_owner and field.owner_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not allowed to view this booking",
+        )
+
+    if booking.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not allowed to view this booking",
+        )
+
+    return booking.json()
+
 
 @router.delete("/{booking_id}", status_code=status.HTTP_200_OK)
 def delete_booking(
     booking_id: int,
-    user: User = Depends(get_authenticated_user),
+    user: Principal = Depends(get_principal),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
 ):
-    with session:
-        stmt = select(Booking).where(Booking.id == booking_id)
-        booking: Booking = session.scalar(stmt)
-
-        if not booking:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Booking not found",
-            )
+    stmt = select(Booking).where(Booking.id == booking_id)
+    booking: Booking = session.scalar(stmt)
 
-        stmt = select(FootballField).where(
-            FootballField.id == booking.field_id
+    if not booking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found",
         )
-        field: FootballField = session.scalar(stmt)
 
-        if isinstance(user, Owner) and field.owner_id != user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not allowed to delete this booking",
-            )
+    stmt = select(FootballField).where(FootballField.id == booking.field_id)
+    field: FootballField = session.scalar(stmt)
 
-        if booking.user_id != user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not allowed to delete this booking",
-            )
+    if user.is_owner and field.owner_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not allowed to delete this booking",
+        )
 
-        session.delete(booking)
-        session.commit()
+    if booking.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not allowed to delete this booking",
+        )
+
+    owner_id = field.owner_id
+    session.delete(booking)
+    session.add(outbox_event("booking.deleted", booking.id, booking.json()))
+    session.commit()
+    pin_to_primary(session_id)
+    invalidate_bookings(booking.field_id, owner_id)
 
-        return {"message": "Booking deleted successfully"}
+    return {"message": "Booking deleted successfully"}
 
 
 @router.put("/{booking_id}", status_code=status.HTTP_200_OK)
 def set_booking_status(
     booking_id: int,
     update: BookingUpdate,
-    owner: Owner = Depends(get_authenticated_owner),
+    owner: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
 ):
-    with session:
-        stmt = select(Booking).where(Booking.id == booking_id)
-        booking: Booking = session.scalar(stmt)
+    stmt = select(Booking).where(Booking.id == booking_id)
+    booking: Booking = session.scalar(stmt)
 
-        if not booking:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Booking not found",
-            )
-
-        stmt = select(FootballField).where(
-            FootballField.id == booking.field_id
+    if not booking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found",
         )
-        field: FootballField = session.scalar(stmt)
 
-        if field.owner_id != owner.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not allowed to modify this booking",
-            )
+    stmt = select(FootballField).where(FootballField.id == booking.field_id)
+    field: FootballField = session.scalar(stmt)
 
-        booking.status = update.status
-        session.add(booking)
-        session.commit()
-        session.refresh(booking)
+    if field.owner_id != owner.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not allowed to modify this booking",
+        )
 
-        return booking.json()
+    booking.status = update.status
+    session.add(booking)
+    session.add(outbox_event("booking.updated", booking.id, booking.json()))
+    session.add(booking_notice(booking))
+    session.commit()
+    pin_to_primary(session_id)
+    session.refresh(booking)
+    invalidate_bookings(booking.field_id, owner.id)
+
+    return booking.json()
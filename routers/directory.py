@@ -0,0 +1,85 @@
+import os
+import re
+from dataclasses import dataclass
+
+from fastapi import Query, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, or_
+from sqlmodel import Session, select
+
+from db.models.person import Person
+
+PAGE_SIZE = int(os.environ.get("DIRECTORY_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = 1000
+
+
+@dataclass
+class DirectoryQuery:
+    """
+    The query parameters of a page of users or owners.
+
+    Attributes:
+        prefix (str, optional): Keeps people whose username or name starts
+            with it, ignoring case.
+        search (str, optional): Keeps people whose username or name
+            contains it, ignoring case. At least three characters, the
+            shortest a trigram index can look up.
+        after (int, optional): The ID the previous page ended at.
+        limit (int): The page size.
+    """
+
+    prefix: str | None = Query(None, min_length=1)
+    search: str | None = Query(None, min_length=3)
+    after: int | None = None
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+
+def escape_like(value: str) -> str:
+    return re.sub(r"([\\%_])", r"\\\1", value)
+
+
+def directory_page(
+    request: Request,
+    session: Session,
+    model: type[Person],
+    query: DirectoryQuery,
+) -> ORJSONResponse:
+    """
+    Returns a page of ``model`` rows in ID order. When the page is full,
+    the URL of the next one is sent in a ``Link`` header with
+    ``rel="next"``.
+
+    Pages are found by seeking past the last ID rather than by an offset,
+    so that late pages cost as much as the first.
+    """
+    stmt = select(model).order_by(model.id).limit(query.limit)
+
+    if query.after is not None:
+        stmt = stmt.where(model.id > query.after)
+
+    if query.prefix:
+        pattern = f"{escape_like(query.prefix.lower())}%"
+        stmt = stmt.where(
+            or_(
+                func.lower(model.username).like(pattern, escape="\\"),
+                func.lower(model.name).like(pattern, escape="\\"),
+            )
+        )
+
+    if query.search:
+        pattern = f"%{escape_like(query.search)}%"
+        stmt = stmt.where(
+            or_(
+                model.username.ilike(pattern, escape="\\"),
+                model.name.ilike(pattern, escape="\\"),
+            )
+        )
+
+    rows = session.scalars(stmt).all()
+    response = ORJSONResponse([x.json() for x in rows])
+
+    if len(rows) == query.limit:
+        next_page = request.url.include_query_params(after=rows[-1].id)
+        response.headers["Link"] = f'<{next_page}>; rel="next"'
+
+    return response
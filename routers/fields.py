@@ -1,16 +1,116 @@
-from datetime import date, time
+import os
+from datetime import date, datetime, time
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select
-
-from db import Booking, FootballField, Owner, session
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from cache import TTLCache, response_cache
+from db import (
+    ASYNC_DATABASE,
+    Booking,
+    FootballField,
+    get_async_session,
+    get_read_session,
+    get_session,
+    pin_to_primary,
+)
+from db.invalidation import invalidate_caches, invalidation_bus
+from db.maintenance import delete_field as delete_field_cascade
 from db.models.booking import BookingStatus
-from routers.auth import get_authenticated_owner
+from db.outbox import outbox_event
+from routers.auth import Principal, get_owner_principal, get_session_id
 
 router = APIRouter(prefix="/fields")
 
+availability_cache = TTLCache(
+    maxsize=4096,
+    ttl=float(os.environ.get("AVAILABILITY_CACHE_TTL", 60)),
+)
+
+# Booked minutes per day of the month, clipped to the field's opening hours.
+MONTH_AVAILABILITY_QUERY = text(
+    """
+    SELECT
+        CAST(day AS date) AS day,
+        EXTRACT(EPOCH FROM f.end_time - f.start_time) / 60 AS open_minutes,
+        COALESCE(
+            SUM(
+                EXTRACT(
+                    EPOCH FROM
+                    LEAST(b.booked_until, day + f.end_time)
+                    - GREATEST(b.booking_date, day + f.start_time)
+                )
+            ) FILTER (WHERE b.id IS NOT NULL) / 60,
+            0
+        ) AS booked_minutes
+    FROM football_fields AS f
+    CROSS JOIN generate_series(
+        CAST(:first_day AS timestamp),
+        CAST(:last_day AS timestamp),
+        interval '1 day'
+    ) AS day
+    LEFT JOIN bookings AS b
+        ON b.field_id = f.id
+        AND b.status != 'canceled'
+        AND b.booking_date < day + f.end_time
+        AND b.booked_until > day + f.start_time
+    WHERE f.id = :field_id
+    GROUP BY day, f.start_time, f.end_time
+    ORDER BY day
+    """
+)
+
+
+response_cache.cache_route("/fields/", ttl=60, tags=["fields"])
+response_cache.cache_route(
+    "/fields/{field_id:int}", ttl=60, tags=["field:{field_id}"]
+)
+response_cache.cache_route(
+    "/fields/{field_id:int}/bookings/{target_date}",
+    ttl=10,
+    tags=["bookings:{field_id}"],
+)
+
+
+def evict_availability(field_ids: list[str]):
+    field_ids = {int(x) for x in field_ids}
+    availability_cache.evict(lambda key, _: key[0] in field_ids)
+
+
+invalidation_bus.subscribe(
+    "availability", evict_availability, availability_cache.clear
+)
+
+
+def invalidate_availability(*field_ids: int):
+    """
+    Drops every cached month of availability for the given fields.
+
+    Args:
+        *field_ids (int): IDs of the fields whose bookings or hours changed.
+    """
+    invalidate_caches(availability=field_ids)
+
+
+def invalidate_bookings(field_id: int, owner_id: int):
+    """
+    Drops the cached availability and responses that show the given
+    field's bookings, including its owner's profile.
+
+    Args:
+        field_id (int): The ID of the field whose bookings changed.
+        owner_id (int): The ID of the field's owner.
+    """
+    invalidate_caches(
+        availability=[field_id],
+        responses=[f"bookings:{field_id}", f"owner:{owner_id}"],
+    )
+
 
 class FieldData(BaseModel):
     owner_id: int | None
@@ -40,28 +140,34 @@ class FieldData(BaseModel):
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_field(
-    data: FieldData, owner: Owner = Depends(get_authenticated_owner)
+    data: FieldData,
+    owner: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
 ):
-    with session:
-        try:
-            field = FootballField(**(dict(vars(data).items())))
-            field.owner_id = owner.id
-
-            session.add(field)
-            session.commit()
-
-            return {"message": "Field created successfully"}
-        except IntegrityError:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
-            )
+    try:
+        field = FootballField(**(dict(vars(data).items())))
+        field.owner_id = owner.id
+
+        session.add(field)
+        session.flush()
+        session.add(outbox_event("field.created", field.id, field.json()))
+        session.commit()
+        pin_to_primary(session_id)
+        invalidate_caches(responses=["fields", f"owner:{owner.id}"])
+
+        return {"message": "Field created successfully"}
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
 
 @router.get("/owner", status_code=status.HTTP_200_OK)
-def get_owner_fields(owner: Owner = Depends(get_authenticated_owner)):
-    with session:
-        stmt = select(FootballField).where(FootballField.owner_id == owner.id)
-        return [x.json() for x in session.scalars(stmt)]
+def get_owner_fields(
+    owner: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_session),
+):
+    stmt = select(FootballField).where(FootballField.owner_id == owner.id)
+    return ORJSONResponse([x.json() for x in session.scalars(stmt)])
 
 
 @router.put(
@@ -71,65 +177,80 @@ def get_owner_fields(owner: Owner = Depends(get_authenticated_owner)):
 def update_field(
     field_id: int,
     data: FieldData,
-    owner: Owner = Depends(get_authenticated_owner),
+    owner: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
 ):
-    with session:
-        stmt = select(FootballField).where(FootballField.id == field_id)
-        field: FootballField = session.scalar(stmt)
-
-        if not field:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Field not found",
-            )
-
-        if field.owner_id != owner.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not the owner of this field",
-            )
-
-        for key, value in dict(vars(data).items()).items():
-            if value:
-                setattr(field, key, value)
-
-        session.add(field)
-        session.commit()
-
-        return {"message": "Field updated successfully"}
+    stmt = select(FootballField).where(FootballField.id == field_id)
+    field: FootballField = session.scalar(stmt)
+
+    if not field:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Field not found",
+        )
+
+    if field.owner_id != owner.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not the owner of this field",
+        )
+
+    previous_owner_id = field.owner_id
+    for key, value in dict(vars(data).items()).items():
+        if value:
+            setattr(field, key, value)
+
+    session.add(field)
+    session.add(outbox_event("field.updated", field.id, field.json()))
+    session.commit()
+    pin_to_primary(session_id)
+    invalidate_caches(
+        availability=[field_id],
+        responses=[
+            "fields",
+            f"field:{field_id}",
+            *{f"owner:{previous_owner_id}", f"owner:{field.owner_id}"},
+        ],
+    )
+
+    return {"message": "Field updated successfully"}
 
 
 @router.get("/{field_id}", status_code=status.HTTP_200_OK)
-def get_field(field_id: int):
-    with session:
-        stmt = select(FootballField).where(FootballField.id == field_id)
-        field = session.scalar(stmt)
-        if not field:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Field not found",
-            )
-        return field.json()
+def get_field(field_id: int, session: Session = Depends(get_read_session)):
+    stmt = select(FootballField).where(FootballField.id == field_id)
+    field = session.scalar(stmt)
+    if not field:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Field not found",
+        )
+    return field.json()
 
 
 @router.get(
     "/{field_id}/bookings/{target_date}", status_code=status.HTTP_200_OK
 )
-def get_field_bookings(field_id: int, target_date: str):
-    with session:
-        stmt = select(FootballField).where(FootballField.id == field_id)
-        field: FootballField = session.scalar(stmt)
-
-        if not field:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Field not found",
-            )
+def get_field_bookings(
+    field_id: int,
+    target_date: str,
+    session: Session = Depends(get_read_session),
+):
+    stmt = select(FootballField).where(FootballField.id == field_id)
+    field: FootballField = session.scalar(stmt)
+
+    if not field:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Field not found",
+        )
 
-        stmt = select(Booking).where(Booking.field_id == field_id)
-        bookings: list[Booking] = session.scalars(stmt)
+    stmt = select(Booking).where(Booking.field_id == field_id)
+    bookings: list[Booking] = session.scalars(stmt)
 
-        return [
+    return ORJSONResponse(
+        [
             {
                 "from": booking.booking_date.time(),
                 "to": booking.booked_until.time(),
@@ -138,6 +259,77 @@ def get_field_bookings(field_id: int, target_date: str):
             if booking.booking_date.date() == date.fromisoformat(target_date)
             and booking.status != BookingStatus.canceled
         ]
+    )
+
+
+@router.get("/{field_id}/availability", status_code=status.HTTP_200_OK)
+def get_field_availability(
+    field_id: int, month: str, session: Session = Depends(get_read_session)
+):
+    """
+    Returns how booked the field is on every day of the given month.
+
+    Args:
+        field_id (int): The ID of the field.
+        month (str): The month in ``YYYY-MM`` format.
+
+    Returns:
+        list[dict]: The booked minutes and the free share of the opening
+            hours, in percent, for each day of the month.
+
+    Raises:
+        HTTPException: If the month is malformed or the field does not exist.
+    """
+    try:
+        first_day = datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Month must be in YYYY-MM format",
+        )
+
+    cached = availability_cache.get((field_id, first_day))
+    if cached is not None:
+        return cached
+
+    next_month = date(
+        first_day.year + first_day.month // 12, first_day.month % 12 + 1, 1
+    )
+    last_day = date.fromordinal(next_month.toordinal() - 1)
+
+    rows = session.execute(
+        MONTH_AVAILABILITY_QUERY,
+        {
+            "field_id": field_id,
+            "first_day": first_day,
+            "last_day": last_day,
+        },
+    ).all()
+
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Field not found",
+        )
+
+    availability = [
+        {
+            "date": row.day,
+            "booked_minutes": round(row.booked_minutes),
+            "free_percent": round(
+                max(row.open_minutes - row.booked_minutes, 0)
+                / row.open_minutes
+                * 100,
+                2,
+            )
+            if row.open_minutes > 0
+            else 0,
+        }
+        for row in rows
+    ]
+
+    availability_cache.set((field_id, first_day), availability)
+    return availability
 
 
 @router.delete(
@@ -145,32 +337,57 @@ def get_field_bookings(field_id: int, target_date: str):
     status_code=status.HTTP_200_OK,
 )
 def delete_field(
-    field_id: int, owner: Owner = Depends(get_authenticated_owner)
+    field_id: int,
+    owner: Principal = Depends(get_owner_principal),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
 ):
-    with session:
-        stmt = select(FootballField).where(FootballField.id == field_id)
-        field: FootballField = session.scalar(stmt)
-
-        if not field:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Field not found",
-            )
-
-        if field.owner_id != owner.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You are not the owner of this field",
-            )
-
-        session.delete(field)
-        session.commit()
-
-        return {"message": "Field deleted successfully"}
+    stmt = select(FootballField).where(FootballField.id == field_id)
+    field: FootballField = session.scalar(stmt)
+
+    if not field:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Field not found",
+        )
+
+    if field.owner_id != owner.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not the owner of this field",
+        )
+
+    session.close()
+    delete_field_cascade(field_id)
+    pin_to_primary(session_id)
+    invalidate_caches(
+        availability=[field_id],
+        responses=[
+            "fields",
+            f"field:{field_id}",
+            f"bookings:{field_id}",
+            f"owner:{owner.id}",
+        ],
+    )
+
+    return {"message": "Field deleted successfully"}
+
+
+def get_fields(session: Session = Depends(get_read_session)):
+    stmt = select(FootballField)
+    return ORJSONResponse([x.json() for x in session.scalars(stmt)])
+
+
+async def get_fields_async(
+    session: AsyncSession = Depends(get_async_session),
+):
+    stmt = select(FootballField)
+    return ORJSONResponse([x.json() for x in await session.scalars(stmt)])
 
 
-@router.get("/", status_code=status.HTTP_200_OK)
-def get_fields():
-    with session:
-        stmt = select(FootballField)
-        return [x.json() for x in session.scalars(stmt)]
+router.add_api_route(
+    "/",
+    get_fields_async if ASYNC_DATABASE else get_fields,
+    methods=["GET"],
+    status_code=status.HTTP_200_OK,
+)
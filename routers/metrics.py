@@ -0,0 +1,186 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from cache import response_cache
+from db import pool_status, replica_set
+from db.passwords import password_pool
+from routers.auth import session_cache
+from routers.fields import availability_cache
+from telemetry import query_metrics, request_metrics
+from telemetry.metrics import metric
+
+router = APIRouter()
+
+CACHES = {
+    "sessions": session_cache,
+    "availability": availability_cache,
+    "responses": response_cache,
+}
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Returns the app's metrics in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: Request counts and latencies per route, the
+            database pools, the caches and the password hashing queue.
+    """
+    return PlainTextResponse(
+        request_metrics.render()
+        + pool_metrics()
+        + cache_metrics()
+        + password_metrics()
+        + statement_metrics(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+def pool_metrics() -> str:
+    status = pool_status()
+    pools = {
+        "primary": status,
+        **({"async": status["async"]} if "async" in status else {}),
+    }
+
+    def samples(key: str):
+        return (({"pool": name}, x[key]) for name, x in pools.items())
+
+    return (
+        metric(
+            "db_pool_size",
+            "gauge",
+            "Connections kept open by the pool.",
+            samples("size"),
+        )
+        + metric(
+            "db_pool_checked_out",
+            "gauge",
+            "Connections in use.",
+            samples("checked_out"),
+        )
+        + metric(
+            "db_pool_overflow",
+            "gauge",
+            "Connections open beyond the pool size.",
+            samples("overflow"),
+        )
+        + metric(
+            "db_pool_checkouts_total",
+            "counter",
+            "Connections handed out.",
+            samples("checkouts"),
+        )
+        + metric(
+            "db_pool_wait_seconds_total",
+            "counter",
+            "Time spent waiting for a connection.",
+            samples("wait_seconds_total"),
+        )
+        + metric(
+            "db_pool_wait_seconds_max",
+            "gauge",
+            "The longest wait for a connection.",
+            samples("wait_seconds_max"),
+        )
+        + metric(
+            "db_replica_up",
+            "gauge",
+            "Whether a read replica passed its last health check.",
+            (
+                ({"replica": x["replica"]}, int(x["healthy"]))
+                for x in replica_set.status()
+            ),
+        )
+    )
+
+
+def cache_metrics() -> str:
+    def samples(value, caches=CACHES):
+        return (
+            ({"cache": name}, value(cache)) for name, cache in caches.items()
+        )
+
+    return (
+        metric(
+            "cache_hits_total",
+            "counter",
+            "Cache lookups served from the cache.",
+            samples(lambda x: x.hits),
+        )
+        + metric(
+            "cache_misses_total",
+            "counter",
+            "Cache lookups that missed.",
+            samples(lambda x: x.misses),
+        )
+        + metric(
+            "cache_hit_ratio",
+            "gauge",
+            "The share of lookups served from the cache.",
+            samples(
+                lambda x: x.hits / (x.hits + x.misses)
+                if x.hits + x.misses
+                else 0
+            ),
+        )
+        + metric(
+            "cache_entries",
+            "gauge",
+            "Entries currently cached.",
+            # Shared caches keep their entries on their server.
+            samples(
+                len,
+                {k: v for k, v in CACHES.items() if hasattr(v, "__len__")},
+            ),
+        )
+    )
+
+
+def password_metrics() -> str:
+    return (
+        metric(
+            "password_hash_workers",
+            "gauge",
+            "Threads dedicated to bcrypt.",
+            [({}, password_pool.max_workers)],
+        )
+        + metric(
+            "password_hash_pending",
+            "gauge",
+            "Hashes running or waiting for a thread.",
+            [({}, password_pool.pending)],
+        )
+        + metric(
+            "password_hash_queue_depth",
+            "gauge",
+            "Hashes waiting for a thread.",
+            [({}, password_pool.queue_depth)],
+        )
+    )
+
+
+def statement_metrics() -> str:
+    routes = query_metrics.snapshot()
+
+    return (
+        metric(
+            "db_queries_total",
+            "counter",
+            "Statements executed while handling requests.",
+            (({"route": route}, x["queries"]) for route, x in routes.items()),
+        )
+        + metric(
+            "db_query_seconds_total",
+            "counter",
+            "Database time spent handling requests.",
+            (({"route": route}, x["seconds"]) for route, x in routes.items()),
+        )
+        + metric(
+            "db_repeated_statements_total",
+            "counter",
+            "Statements flagged as likely N+1 queries.",
+            [({}, query_metrics.repeated_statements)],
+        )
+    )
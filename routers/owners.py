@@ -1,20 +1,40 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel, validator
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select
-
-from db import Owner, session
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from cache import response_cache
+from db import (
+    Booking,
+    FootballField,
+    Owner,
+    get_read_session,
+    get_session,
+    pin_to_primary,
+)
+from db.invalidation import invalidate_caches
+from db.maintenance import delete_owner as delete_owner_cascade
+from db.models.booking import BookingStatus
 from routers.auth import (
+    SESSION_LIFETIME,
     authenticate_owner,
     create_session,
     get_admin_user,
     get_authenticated_owner,
+    get_session_id,
     is_already_logged_in,
     logout,
+    principal_key,
+    read_authenticated_owner,
+    revoke_tokens,
 )
+from routers.directory import DirectoryQuery, directory_page
 
 router = APIRouter(prefix="/owners")
 
@@ -76,15 +96,23 @@ class SignupCredentials(OwnerCredentials):
 
 
 @router.get("/profile", status_code=status.HTTP_200_OK)
-def get_profile(owner: Owner = Depends(get_authenticated_owner)):
+def get_profile(owner: Owner = Depends(read_authenticated_owner)):
     return owner.json()
 
 
+response_cache.cache_route("/owners/", ttl=60, tags=["owners"])
+response_cache.cache_route(
+    "/owners/{owner_id:int}", ttl=30, tags=["owner:{owner_id}"]
+)
+
+
 @router.get("/")
-def get_owners():
-    with session:
-        stmt = select(Owner)
-        return [owner.json() for owner in session.scalars(stmt)]
+def get_owners(
+    request: Request,
+    query: DirectoryQuery = Depends(),
+    session: Session = Depends(get_read_session),
+):
+    return directory_page(request, session, Owner, query)
 
 
 @router.post(
@@ -92,28 +120,60 @@ def get_owners():
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(get_admin_user)],
 )
-def create_owner(credentials: SignupCredentials):
-    with session:
-        try:
-            credentials.password = Owner.hash_password(credentials.password)
-            owner = Owner(**(dict(vars(credentials).items())))
-
-            session.add(owner)
-            session.commit()
-        except IntegrityError:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
-            )
+async def create_owner(
+    credentials: SignupCredentials, session: Session = Depends(get_session)
+):
+    credentials.password = await Owner.hash_password_async(
+        credentials.password
+    )
+
+    return await run_in_threadpool(insert_owner, session, credentials)
+
+
+def insert_owner(session: Session, credentials: SignupCredentials) -> dict:
+    try:
+        owner = Owner(**(dict(vars(credentials).items())))
 
-        return {"message": "Owner created successfully"}
+        session.add(owner)
+        session.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    invalidate_caches(responses=["owners"])
+    return {"message": "Owner created successfully"}
 
 
 @router.get(
     "/{owner_id}",
     status_code=status.HTTP_200_OK,
 )
-def get_owner(owner_id: int):
-    with session:
+def get_owner(
+    owner_id: int,
+    include: str | None = None,
+    day: date | None = None,
+    session: Session = Depends(get_read_session),
+):
+    """
+    Returns an owner's profile, and with ``include=fields`` their fields
+    too. ``include=fields,bookings`` adds each field's booked intervals on
+    ``day``, today by default.
+
+    The profile takes two queries at most however many fields the owner
+    has: one joining the owner to their fields, one for all their
+    bookings of the day.
+
+    Raises:
+        HTTPException: If the owner does not exist or ``include`` names
+            something else.
+    """
+    includes = set(include.split(",")) if include else set()
+    if not includes <= {"fields", "bookings"} or includes == {"bookings"}:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="include must be fields or fields,bookings",
+        )
+
+    if not includes:
         stmt = select(Owner).where(Owner.id == owner_id)
         owner = session.scalar(stmt)
 
@@ -122,35 +182,93 @@ def get_owner(owner_id: int):
 
         return owner.json()
 
+    stmt = (
+        select(Owner, FootballField)
+        .outerjoin(FootballField, FootballField.owner_id == Owner.id)
+        .where(Owner.id == owner_id)
+        .order_by(FootballField.id)
+    )
+    rows = session.execute(stmt).all()
+
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    fields = [field.json() for _, field in rows if field is not None]
+
+    if "bookings" in includes and fields:
+        day = day or date.today()
+        start = datetime.combine(day, time.min)
+
+        stmt = (
+            select(Booking)
+            .where(
+                Booking.field_id.in_([x["id"] for x in fields]),
+                Booking.booking_date >= start,
+                Booking.booking_date < start + timedelta(days=1),
+                Booking.status != BookingStatus.canceled,
+            )
+            .order_by(Booking.booking_date)
+        )
+        bookings = defaultdict(list)
+        for booking in session.scalars(stmt):
+            bookings[booking.field_id].append(
+                {
+                    "from": booking.booking_date.time(),
+                    "to": booking.booked_until.time(),
+                }
+            )
+
+        for field in fields:
+            field["bookings"] = bookings[field["id"]]
+
+    return ORJSONResponse({**rows[0][0].json(), "fields": fields})
+
 
 @router.delete(
     "/{owner_id}",
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(get_admin_user)],
 )
-def delete_owner(owner_id: int):
-    with session:
-        stmt = select(Owner).where(Owner.id == owner_id)
-        owner = session.scalar(stmt)
-
-        if not owner:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-
-        session.delete(owner)
-        session.commit()
+def delete_owner(owner_id: int, session: Session = Depends(get_session)):
+    stmt = select(Owner).where(Owner.id == owner_id)
+    owner = session.scalar(stmt)
+
+    if not owner:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    session.close()
+    field_ids = delete_owner_cascade(owner_id)
+    revoke_tokens(owner_id, is_owner=True)
+    invalidate_caches(
+        availability=field_ids,
+        responses=[
+            "owners",
+            "fields",
+            f"owner:{owner_id}",
+            *(f"field:{x}" for x in field_ids),
+            *(f"bookings:{x}" for x in field_ids),
+        ],
+        principals=[principal_key(owner_id, is_owner=True)],
+    )
 
-        return {"message": "Owner deleted successfully"}
+    return {"message": "Owner deleted successfully"}
 
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-def login(request: Request, owner: Owner = Depends(authenticate_owner)):
-    if is_already_logged_in(request):
+def login(
+    request: Request,
+    owner: Owner = Depends(authenticate_owner),
+    session: Session = Depends(get_session),
+):
+    if is_already_logged_in(request, session):
         return JSONResponse(
             content={"message": "User already logged in"},
             status_code=status.HTTP_401_UNAUTHORIZED,
         )
 
-    session_id = create_session(owner.id, is_owner=True)
+    session_id = create_session(
+        session, owner.id, is_owner=True, username=owner.username
+    )
     response = JSONResponse(
         content={
             "message": "User logged in successfully",
@@ -164,33 +282,52 @@ def login(request: Request, owner: Owner = Depends(authenticate_owner)):
         samesite="none",
         secure=True,
         httponly=True,
-        expires=60 * 60 * 24 * 7,
+        expires=SESSION_LIFETIME,
     )
 
     return response
 
 
 @router.put("/profile", status_code=status.HTTP_200_OK)
-def update_profile(
+async def update_profile(
     credentials: OwnerCredentials,
     owner: Owner = Depends(get_authenticated_owner),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
 ):
-    with session:
-        for key, value in dict(vars(credentials).items()).items():
-            if value:
-                if key == "username":
-                    continue
-                if key == "password":
-                    value = Owner.hash_password(value)
-                setattr(owner, key, value)
+    if credentials.password:
+        credentials.password = await Owner.hash_password_async(
+            credentials.password
+        )
 
-        session.add(owner)
-        session.commit()
+    response = await run_in_threadpool(
+        save_profile, session, credentials, owner
+    )
+    pin_to_primary(session_id)
+
+    return response
+
+
+def save_profile(
+    session: Session, credentials: OwnerCredentials, owner: Owner
+) -> dict:
+    for key, value in dict(vars(credentials).items()).items():
+        if value:
+            if key == "username":
+                continue
+            setattr(owner, key, value)
+
+    session.add(owner)
+    session.commit()
+    invalidate_caches(
+        responses=["owners", f"owner:{owner.id}"],
+        principals=[principal_key(owner.id, is_owner=True)],
+    )
 
-        return {
-            "message": "Profile updated successfully",
-            "user": owner.json(),
-        }
+    return {
+        "message": "Profile updated successfully",
+        "user": owner.json(),
+    }
 
 
 router.add_api_route(
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from db import get_engine, pool_status, replica_set
+from routers.auth import get_admin_user, get_principal
+from telemetry import list_profiles, query_metrics, read_profile
+
+router = APIRouter(prefix="/system")
+
+
+@router.get(
+    "/pool",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(get_admin_user)],
+)
+def get_pool_status():
+    """
+    Returns the database connection pool's usage and wait statistics.
+
+    Returns:
+        dict: The pool size, connections in use and checkout wait times,
+            along with the health of the read replicas.
+    """
+    return {**pool_status(), "replicas": replica_set.status()}
+
+
+@router.get(
+    "/queries",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(get_admin_user)],
+)
+def get_query_metrics():
+    """
+    Returns the query count and database time accumulated per route.
+
+    Returns:
+        dict: The totals per route template, and how many statements were
+            flagged as likely N+1 queries.
+    """
+    return {
+        "routes": query_metrics.snapshot(),
+        "repeated_statements": query_metrics.repeated_statements,
+    }
+
+
+async def authorize_profiling(request: Request):
+    """
+    Lets ProfilingMiddleware profile a request only if an admin sent it.
+
+    Raises:
+        HTTPException: If the request is not authenticated as an admin.
+    """
+
+    def authorize():
+        with Session(get_engine()) as session:
+            get_admin_user(get_principal(request, session))
+
+    await run_in_threadpool(authorize)
+
+
+@router.get(
+    "/profiles",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(get_admin_user)],
+)
+def get_profiles():
+    """
+    Returns the names of the stored request profiles, newest first.
+
+    Returns:
+        list[str]: The profile names.
+    """
+    return list_profiles()
+
+
+@router.get(
+    "/profiles/{name}",
+    status_code=status.HTTP_200_OK,
+    response_class=PlainTextResponse,
+    dependencies=[Depends(get_admin_user)],
+)
+def get_profile(name: str):
+    """
+    Returns a stored request profile as folded stacks, which flamegraph.pl
+    and speedscope render as a flame graph.
+
+    Args:
+        name (str): The profile's name, from the X-Profile header.
+
+    Raises:
+        HTTPException: If there is no profile of that name.
+    """
+    profile = read_profile(name)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+        )
+
+    return profile
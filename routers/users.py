@@ -1,21 +1,33 @@
+import os
+
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, ValidationError, validator
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
 
-from db import User, session
+from db import User, get_session, passwords, pin_to_primary
 from routers.auth import (
+    SESSION_LIFETIME,
     authenticate_user,
     create_session,
     get_admin_user,
     get_authenticated_user,
+    get_session_id,
+    invalidate_principal,
     is_already_logged_in,
     logout,
+    read_authenticated_user,
+    revoke_tokens,
 )
+from routers.directory import DirectoryQuery, directory_page
 
 router = APIRouter(prefix="/users")
 
+IMPORT_BATCH_SIZE = int(os.environ.get("USER_IMPORT_BATCH_SIZE", 1000))
+
 
 class UserCredentials(BaseModel):
     """
@@ -80,7 +92,7 @@ class SignupCredentials(UserCredentials):
 
 
 @router.get("/profile", status_code=status.HTTP_200_OK)
-def get_profile(user: User = Depends(get_authenticated_user)):
+def get_profile(user: User = Depends(read_authenticated_user)):
     """
     Returns the JSON representation of the authenticated user's profile.
 
@@ -94,16 +106,18 @@ def get_profile(user: User = Depends(get_authenticated_user)):
 
 
 @router.get("/", dependencies=[Depends(get_admin_user)])
-def get_users():
+def get_users(
+    request: Request,
+    query: DirectoryQuery = Depends(),
+    session: Session = Depends(get_session),
+):
     """
-    Retrieve all users.
+    Retrieve a page of users, optionally searched by username or name.
 
     Returns:
         List[dict]: A list of dictionaries containing user information.
     """
-    with session:
-        stmt = select(User)
-        return [x.json() for x in session.scalars(stmt)]
+    return directory_page(request, session, User, query)
 
 
 @router.get(
@@ -111,7 +125,7 @@ def get_users():
     status_code=status.HTTP_200_OK,
     dependencies=[Depends(get_admin_user)],
 )
-def get_user(user_id: int):
+def get_user(user_id: int, session: Session = Depends(get_session)):
     """
     Retrieve a user by ID.
 
@@ -121,18 +135,19 @@ def get_user(user_id: int):
     Returns:
         dict: A dictionary containing user information.
     """
-    with session:
-        stmt = select(User).where(User.id == user_id)
-        user = session.scalar(stmt)
+    stmt = select(User).where(User.id == user_id)
+    user = session.scalar(stmt)
 
-        if not user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-        return user.json()
+    return user.json()
 
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-def sign_up(credentials: SignupCredentials):
+async def sign_up(
+    credentials: SignupCredentials, session: Session = Depends(get_session)
+):
     """
     Creates a new user in the database.
 
@@ -147,41 +162,167 @@ def sign_up(credentials: SignupCredentials):
             If the user already exists in the database or
             if the user credentials are invalid.
     """
-    with session:
-        try:
-            credentials.password = User.hash_password(credentials.password)
-            user = User(**(dict(vars(credentials).items())))
+    credentials.password = await User.hash_password_async(credentials.password)
 
-            session.add(user)
-            session.commit()
+    return await run_in_threadpool(create_user, session, credentials)
 
-            session_id = create_session(user.id)
-            response = JSONResponse(
-                status_code=status.HTTP_201_CREATED,
-                content={
-                    "message": "User created successfully",
-                },
-            )
 
-            response.set_cookie(
-                key="session_id",
-                value=session_id,
-                samesite="none",
-                secure=True,
-                httponly=False,
-                expires=60 * 60 * 24 * 7,
-            )
+def create_user(
+    session: Session, credentials: SignupCredentials
+) -> JSONResponse:
+    try:
+        user = User(**(dict(vars(credentials).items())))
+
+        session.add(user)
+        session.commit()
+
+        session_id = create_session(session, user.id, username=user.username)
+        response = JSONResponse(
+            status_code=status.HTTP_201_CREATED,
+            content={
+                "message": "User created successfully",
+            },
+        )
+
+        response.set_cookie(
+            key="session_id",
+            value=session_id,
+            samesite="none",
+            secure=True,
+            httponly=False,
+            expires=SESSION_LIFETIME,
+        )
+
+        return response
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Username already exists",
+        )
+
+
+@router.post(
+    "/import",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(get_admin_user)],
+)
+def bulk_import_users(
+    users: list[dict], session: Session = Depends(get_session)
+):
+    """
+    Creates many users at once, such as the members of a partner club.
+
+    Args:
+        users (list[dict]): The users' usernames, names and passwords.
+
+    Returns:
+        dict: The number of users created, and why the others were not.
+    """
+    return import_users(session, users)
 
-            return response
-        except IntegrityError:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="Username already exists",
+
+def import_users(
+    session: Session,
+    records: list[dict],
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> dict:
+    """
+    Validates records with the signup rules and inserts the valid ones in
+    batches of ``batch_size``, each committed on its own. Passwords are
+    hashed in parallel, and only for usernames that are not taken yet.
+
+    Args:
+        session (Session): The database session.
+        records (list[dict]): The users' usernames, names and passwords.
+        batch_size (int, optional): Users inserted per transaction.
+
+    Returns:
+        dict: The number of users created, and an error per record that
+            was not, with its index and username.
+    """
+    errors = []
+    valid = []
+    seen = set()
+
+    def reject(index: int, username: str | None, detail):
+        errors.append({"index": index, "username": username, "detail": detail})
+
+    for index, record in enumerate(records):
+        try:
+            credentials = SignupCredentials.parse_obj(record)
+        except ValidationError as e:
+            reject(index, record.get("username"), e.errors())
+            continue
+
+        if None in (
+            credentials.username,
+            credentials.name,
+            credentials.password,
+        ):
+            reject(
+                index,
+                credentials.username,
+                "Username, name and password are required",
+            )
+        elif credentials.username in seen:
+            reject(index, credentials.username, "Username appears twice")
+        else:
+            seen.add(credentials.username)
+            valid.append((index, credentials))
+
+    created = 0
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start : start + batch_size]
+
+        taken = set(
+            session.scalars(
+                select(User.username).where(
+                    User.username.in_([x.username for _, x in batch])
+                )
             )
+        )
+        new = [x for _, x in batch if x.username not in taken]
+
+        inserted = set()
+        if new:
+            hashes = passwords.hash_passwords([x.password for x in new])
+
+            # Usernames taken meanwhile are skipped rather than failing
+            # the whole batch.
+            inserted = set(
+                session.scalars(
+                    insert(User)
+                    .values(
+                        [
+                            {
+                                "username": x.username,
+                                "name": x.name,
+                                "password": hashed,
+                            }
+                            for x, hashed in zip(new, hashes)
+                        ]
+                    )
+                    .on_conflict_do_nothing(index_elements=["username"])
+                    .returning(User.username)
+                )
+            )
+            session.commit()
+
+        created += len(inserted)
+        for index, credentials in batch:
+            if credentials.username not in inserted:
+                reject(index, credentials.username, "Username already exists")
+
+    errors.sort(key=lambda x: x["index"])
+    return {"created": created, "errors": errors}
 
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-def login(request: Request, user: User = Depends(authenticate_user)):
+def login(
+    request: Request,
+    user: User = Depends(authenticate_user),
+    session: Session = Depends(get_session),
+):
     """
     Logs in a user and creates a session for them.
 
@@ -192,13 +333,13 @@ def login(request: Request, user: User = Depends(authenticate_user)):
     Returns:
         JSONResponse: A JSON response containing a message and session ID cookie.
     """
-    if is_already_logged_in(request):
+    if is_already_logged_in(request, session):
         return JSONResponse(
             content={"message": "User already logged in"},
             status_code=status.HTTP_401_UNAUTHORIZED,
         )
 
-    session_id = create_session(user.id)
+    session_id = create_session(session, user.id, username=user.username)
     response = JSONResponse(
         status_code=status.HTTP_200_OK,
         content={
@@ -212,7 +353,7 @@ def login(request: Request, user: User = Depends(authenticate_user)):
         samesite="none",
         secure=True,
         httponly=False,
-        expires=60 * 60 * 24 * 7,
+        expires=SESSION_LIFETIME,
     )
 
     return response
@@ -222,8 +363,11 @@ def login(request: Request, user: User = Depends(authenticate_user)):
     "/profile",
     status_code=status.HTTP_200_OK,
 )
-def update_profile(
-    credentials: UserCredentials, user: User = Depends(get_authenticated_user)
+async def update_profile(
+    credentials: UserCredentials,
+    user: User = Depends(get_authenticated_user),
+    session: Session = Depends(get_session),
+    session_id: str = Depends(get_session_id),
 ):
     """
     Updates the authenticated user's profile.
@@ -234,17 +378,39 @@ def update_profile(
     Returns:
         dict: A dictionary containing a success message.
     """
-    with session:
-        for key, value in dict(vars(credentials).items()).items():
-            if value:
-                if key == "password":
-                    value = User.hash_password(value)
-                setattr(user, key, value)
+    if credentials.password:
+        credentials.password = await User.hash_password_async(
+            credentials.password
+        )
 
-        session.add(user)
-        session.commit()
+    response = await run_in_threadpool(
+        save_profile, session, credentials, user
+    )
+    pin_to_primary(session_id)
+
+    return response
+
+
+def save_profile(
+    session: Session, credentials: UserCredentials, user: User
+) -> dict:
+    renamed = bool(credentials.username) and (
+        credentials.username != user.username
+    )
+
+    for key, value in dict(vars(credentials).items()).items():
+        if value:
+            setattr(user, key, value)
+
+    session.add(user)
+    session.commit()
+    invalidate_principal(user.id)
+
+    # Signed tokens carry the username, which admin rights depend on.
+    if renamed:
+        revoke_tokens(user.id)
 
-        return {"message": "User updated successfully", "user": user.json()}
+    return {"message": "User updated successfully", "user": user.json()}
 
 
 router.add_api_route(
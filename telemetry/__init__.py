@@ -0,0 +1,25 @@
+from .metrics import MetricsMiddleware, request_metrics
+from .profiling import ProfilingMiddleware, list_profiles, read_profile
+from .queries import (
+    QueryStats,
+    QueryTimingMiddleware,
+    instrument,
+    query_metrics,
+    track_queries,
+)
+from .slow_queries import SlowQueryLog, slow_query_log
+
+__all__ = [
+    "MetricsMiddleware",
+    "ProfilingMiddleware",
+    "QueryStats",
+    "QueryTimingMiddleware",
+    "SlowQueryLog",
+    "instrument",
+    "list_profiles",
+    "query_metrics",
+    "read_profile",
+    "request_metrics",
+    "slow_query_log",
+    "track_queries",
+]
@@ -0,0 +1,196 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .queries import route_template
+
+# The Prometheus client's default latency buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+
+Samples = Iterable[tuple[dict[str, str], float]]
+
+
+class RequestMetrics:
+    """
+    Request counts per status and latency histograms, labeled by method
+    and route template.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._latency = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self._latency_sum = defaultdict(float)
+
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            self._requests[method, route, status] += 1
+            self._latency[method, route][bucket] += 1
+            self._latency_sum[method, route] += seconds
+
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+            self._latency.clear()
+            self._latency_sum.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            requests = dict(self._requests)
+            latency = {key: list(x) for key, x in self._latency.items()}
+            latency_sum = dict(self._latency_sum)
+
+        histogram = []
+        for (method, route), counts in latency.items():
+            labels = {"method": method, "route": route}
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                histogram.append(
+                    (
+                        "_bucket",
+                        {**labels, "le": format_value(bound)},
+                        cumulative,
+                    )
+                )
+
+            histogram.append(("_sum", labels, latency_sum[method, route]))
+            histogram.append(("_count", labels, cumulative))
+
+        return metric(
+            "http_requests_total",
+            "counter",
+            "HTTP requests handled.",
+            (
+                ({"method": method, "route": route, "status": str(status)}, n)
+                for (method, route, status), n in requests.items()
+            ),
+        ) + histogram_metric(
+            "http_request_duration_seconds",
+            "HTTP request latency.",
+            histogram,
+        )
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Records every HTTP request's status and latency in ``metrics``.
+    """
+
+    def __init__(
+        self, app: ASGIApp, metrics: RequestMetrics = request_metrics
+    ):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.observe(
+                scope["method"],
+                route_template(scope),
+                status,
+                time.perf_counter() - started,
+            )
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def metric(name: str, kind: str, help: str, samples: Samples) -> str:
+    """
+    Renders one metric family in the Prometheus text format.
+
+    Args:
+        name (str): The metric name.
+        kind (str): ``counter`` or ``gauge``.
+        help (str): The metric's description.
+        samples: Pairs of labels and values.
+
+    Returns:
+        str: The family's ``HELP`` and ``TYPE`` lines followed by a line
+            per sample.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(
+        f"{name}{format_labels(labels)} {format_value(value)}"
+        for labels, value in samples
+    )
+
+    return "\n".join(lines) + "\n"
+
+
+def histogram_metric(
+    name: str, help: str, samples: Iterable[tuple[str, dict, float]]
+) -> str:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    lines.extend(
+        f"{name}{suffix}{format_labels(labels)} {format_value(value)}"
+        for suffix, labels, value in samples
+    )
+
+    return "\n".join(lines) + "\n"
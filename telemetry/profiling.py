@@ -0,0 +1,219 @@
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable
+from urllib.parse import parse_qsl
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .queries import route_template
+
+# Stacks whose innermost frame is in one of these modules belong to threads
+# waiting for work, such as idle threadpool workers or the event loop's
+# selector, and are left out.
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_MS", 2)) / 1000
+
+
+class Sampler:
+    """
+    Samples the stacks of every thread in the process every ``interval``
+    seconds on a background thread, counting them in the folded format
+    that flamegraph tools read.
+
+    The whole process is sampled, so the threadpool threads running a sync
+    handler are included, as is any request served concurrently.
+    """
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="profiler", daemon=True
+        )
+
+    def __enter__(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        names = {}
+
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+
+            for ident, frame in sys._current_frames().items():
+                if ident == threading.get_ident():
+                    continue
+
+                stack = folded_stack(frame)
+                if stack:
+                    self.stacks[f"{names.get(ident, ident)};{stack}"] += 1
+
+            self.samples += 1
+
+    def folded(self) -> str:
+        """
+        Returns one line per distinct stack, outermost frame first,
+        followed by the number of samples it was seen in.
+        """
+        return "".join(
+            f"{stack} {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+
+def folded_stack(frame) -> str | None:
+    if frame.f_code.co_filename.endswith(IDLE_MODULES):
+        return None
+
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(
+            f"{code.co_name} ({Path(code.co_filename).name}:"
+            f"{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+
+    return ";".join(reversed(frames))
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests that ask for it with an ``X-Profile: 1`` header
+    or a ``_profile=1`` query parameter, once ``authorize`` accepts them, and
+    stores the folded stacks in ``directory``. The stored profile's name
+    is returned in the response's ``X-Profile`` header.
+
+    Other requests only pay for looking for the header and parameter.
+
+    Args:
+        authorize: Called with the request before profiling it, raises
+            HTTPException to refuse.
+        directory (str): Where profiles are written.
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        authorize: Callable[[Request], Awaitable[None]],
+        directory: str = PROFILE_DIR,
+        interval: float = PROFILE_INTERVAL,
+    ):
+        self.app = app
+        self.authorize = authorize
+        self.directory = Path(directory)
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.authorize(Request(scope))
+        except HTTPException as e:
+            response = JSONResponse(
+                {"detail": e.detail}, status_code=e.status_code
+            )
+            await response(scope, receive, send)
+            return
+
+        name = profile_name(scope)
+
+        async def send_with_profile(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile", name.encode()),
+                ]
+
+            await send(message)
+
+        with Sampler(self.interval) as sampler:
+            started = time.perf_counter()
+            await self.app(scope, receive, send_with_profile)
+            elapsed = time.perf_counter() - started
+
+        # Named after the route, whose template is only known by now.
+        await asyncio.to_thread(
+            self.store,
+            name,
+            f"# {scope['method']} {route_template(scope)} "
+            f"{elapsed * 1000:.1f}ms {sampler.samples} samples\n"
+            + sampler.folded(),
+        )
+
+    def store(self, name: str, profile: str):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / name).write_text(profile)
+
+
+def wants_profile(scope: Scope) -> bool:
+    query_string = scope.get("query_string", b"")
+    if b"_profile" in query_string and any(
+        name == "_profile" and is_set(value)
+        for name, value in parse_qsl(query_string.decode("latin-1"))
+    ):
+        return True
+
+    return any(
+        name == b"x-profile" and is_set(value.decode("latin-1"))
+        for name, value in scope["headers"]
+    )
+
+
+def is_set(flag: str) -> bool:
+    return flag.strip().lower() in ("1", "true")
+
+
+def profile_name(scope: Scope) -> str:
+    path = re.sub(r"[^\w-]+", "_", scope["path"]).strip("_") or "root"
+    return (
+        f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{path}-"
+        f"{uuid.uuid4().hex[:8]}.folded"
+    )
+
+
+def read_profile(name: str, directory: str = PROFILE_DIR) -> str | None:
+    """
+    Returns a stored profile, or None if there is no profile of that name.
+    """
+    path = Path(directory) / name
+    if path.name != name or path.suffix != ".folded" or not path.is_file():
+        return None
+
+    return path.read_text()
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> list[str]:
+    """
+    Returns the names of the stored profiles, newest first.
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    return sorted(
+        (x.name for x in Path(directory).glob("*.folded")), reverse=True
+    )
@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .slow_queries import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+# A request issuing the same statement more often than this is logged as
+# a likely N+1 query.
+REPEATED_STATEMENT_THRESHOLD = int(os.environ.get("SQL_REPEAT_THRESHOLD", 10))
+
+
+@dataclass
+class QueryStats:
+    """
+    The queries issued while handling one request.
+
+    Attributes:
+        count (int): The number of statements executed.
+        duration (float): The cumulative database time in seconds.
+        statements (Counter): How often each statement shape ran.
+        scope (Scope | None): The request the statements were issued for.
+    """
+
+    count: int = 0
+    duration: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+    scope: Scope | None = field(default=None, repr=False)
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Returns the statements that ran more than ``threshold`` times.
+        """
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count > threshold
+        ]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar(
+    "query_stats", default=None
+)
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    duration = time.perf_counter() - context._query_started
+    stats = _current.get()
+
+    if stats is not None:
+        stats.record(statement, duration)
+
+    slow_query_log.observe(
+        conn,
+        statement,
+        parameters,
+        duration,
+        route_template(stats.scope) if stats and stats.scope else None,
+    )
+
+
+def instrument():
+    """
+    Hooks every engine, including the replicas' and the async engine's,
+    so that statements run while tracking are recorded and slow statements
+    are logged.
+    """
+    if not event.contains(
+        Engine, "before_cursor_execute", _before_cursor_execute
+    ):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries(scope: Scope | None = None) -> Iterator[QueryStats]:
+    """
+    Records the statements executed within the block, including those run
+    from threadpool threads that inherit the current context.
+
+    Args:
+        scope (Scope | None): The request the statements are issued for,
+            to attribute slow queries to its route.
+    """
+    stats = QueryStats(scope=scope)
+    token = _current.set(stats)
+
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class RouteQueryMetrics:
+    """
+    Query counts and database time accumulated per route.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(
+            lambda: {"requests": 0, "queries": 0, "seconds": 0.0}
+        )
+        self.repeated_statements = 0
+
+    def observe(self, route: str, stats: QueryStats, repeated: int):
+        with self._lock:
+            totals = self._routes[route]
+            totals["requests"] += 1
+            totals["queries"] += stats.count
+            totals["seconds"] += stats.duration
+
+            self.repeated_statements += repeated
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {route: dict(x) for route, x in self._routes.items()}
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self.repeated_statements = 0
+
+
+query_metrics = RouteQueryMetrics()
+
+
+class QueryTimingMiddleware:
+    """
+    Tracks the queries of every HTTP request, reports them in a
+    ``Server-Timing`` header and warns about statements that repeat more
+    than ``threshold`` times within one request.
+    """
+
+    def __init__(
+        self, app: ASGIApp, threshold: int = REPEATED_STATEMENT_THRESHOLD
+    ):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries(scope) as stats:
+
+            async def send_with_timing(message: Message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", server_timing(stats).encode()),
+                    ]
+
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                self.report(scope, stats)
+
+    def report(self, scope: Scope, stats: QueryStats):
+        route = route_template(scope)
+        repeated = stats.repeated(self.threshold)
+
+        for statement, count in repeated:
+            logger.warning(
+                "%s %s ran the same statement %d times, "
+                "likely an N+1 query: %s",
+                scope["method"],
+                route,
+                count,
+                " ".join(statement.split()),
+            )
+
+        query_metrics.observe(route, stats, len(repeated))
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Returns the path template of the route that handled the request, so
+    that requests for different IDs are grouped together.
+    """
+    route = scope.get("route")
+    return route.path if route is not None else "<unmatched>"
+
+
+def server_timing(stats: QueryStats) -> str:
+    return f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"'
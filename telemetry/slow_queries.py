@@ -0,0 +1,221 @@
+import datetime
+import decimal
+import logging
+import os
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# The logger the sampled query plans are written to.
+plan_logger = logging.getLogger(f"{__name__}.plans")
+plan_logger.propagate = False
+
+# Parameter types logged as they are. Anything else, strings included, may
+# be a password hash, an email or a name and is redacted.
+SAFE_PARAMETERS = (
+    bool,
+    int,
+    float,
+    decimal.Decimal,
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+    type(None),
+)
+
+# Plans repeat the parameters as quoted literals.
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+LOCKING_CLAUSE = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b",
+    re.IGNORECASE,
+)
+
+
+class SlowQueryLog:
+    """
+    Logs statements that take longer than ``threshold`` seconds, and runs
+    ``EXPLAIN (ANALYZE, BUFFERS)`` on a sample of the slow ``SELECT``s in
+    the background, writing the plans to ``plan_log``. Queries that
+    ``ANALYZE`` would have side effects for, locking rows or starting with
+    a ``WITH`` that may modify data, are explained without running them.
+
+    Only one plan is captured at a time. Slow statements sampled while a
+    plan is being captured are logged but not explained, so that a burst
+    of slow queries cannot pile up more load on the database.
+
+    Attributes:
+        threshold (float): The duration in seconds above which a
+            statement is logged, or 0 to disable the log.
+        explain_rate (float): The share of slow ``SELECT``s to explain.
+        plan_log (str): The file the plans are written to.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        explain_rate: float = 0.0,
+        plan_log: str = "slow_query_plans.log",
+    ):
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self.plan_log = plan_log
+
+        self._explaining = threading.Semaphore(1)
+        self._executor = None
+        self._handler = None
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        conn: Connection,
+        statement: str,
+        parameters,
+        duration: float,
+        route: str | None,
+    ):
+        if not self.threshold or duration < self.threshold:
+            return
+
+        if statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+
+        logger.warning(
+            "Slow query (%.0fms) from %s: %s; parameters: %s",
+            duration * 1000,
+            route or "<no request>",
+            " ".join(statement.split()),
+            redact(parameters),
+        )
+
+        if (
+            self.explain_rate
+            and is_select(statement)
+            # Statements compiled for an async driver use its own parameter
+            # style and cannot be replayed through a sync connection.
+            and not conn.dialect.is_async
+            and random.random() < self.explain_rate
+            and self._explaining.acquire(blocking=False)
+        ):
+            self.executor().submit(
+                self.explain, conn.engine, statement, parameters, route
+            )
+
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._handler = RotatingFileHandler(
+                    self.plan_log, maxBytes=10 * 1024 * 1024, backupCount=5
+                )
+                self._handler.setFormatter(
+                    logging.Formatter("%(asctime)s %(message)s")
+                )
+                plan_logger.addHandler(self._handler)
+                plan_logger.setLevel(logging.INFO)
+
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="explain"
+                )
+
+            return self._executor
+
+    def explain(self, engine, statement: str, parameters, route: str | None):
+        """
+        Runs ``EXPLAIN (ANALYZE, BUFFERS)`` on the statement and writes its
+        plan to the plan log. The statement runs again in a transaction
+        that is rolled back, unless it is not read-only, in which case it
+        is only planned.
+        """
+        explain = (
+            "EXPLAIN (ANALYZE, BUFFERS)"
+            if is_read_only(statement)
+            else "EXPLAIN"
+        )
+
+        try:
+            with engine.connect() as connection:
+                plan = connection.exec_driver_sql(
+                    f"{explain} {statement}", parameters
+                ).scalars()
+
+                plan_logger.info(
+                    "%s\n%s\nparameters: %s\n%s\n",
+                    route or "<no request>",
+                    statement.strip(),
+                    redact(parameters),
+                    STRING_LITERAL.sub("'***'", "\n".join(plan)),
+                )
+        except Exception:
+            logger.exception("Could not explain a slow query")
+        finally:
+            self._explaining.release()
+
+    def close(self):
+        """
+        Waits for the plans being captured and closes the plan log.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+            if self._handler is not None:
+                plan_logger.removeHandler(self._handler)
+                self._handler.close()
+                self._handler = None
+
+
+def is_select(statement: str) -> bool:
+    words = statement.lstrip().split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH")
+
+
+def is_read_only(statement: str) -> bool:
+    """
+    Returns whether running the query again has no side effects that
+    matter: a plain ``SELECT`` that locks no rows. A ``WITH`` may hold an
+    ``INSERT``, ``UPDATE`` or ``DELETE``, which ``EXPLAIN ANALYZE`` runs.
+    """
+    words = statement.lstrip().split(None, 1)
+    return (
+        bool(words)
+        and words[0].upper() == "SELECT"
+        and not LOCKING_CLAUSE.search(statement)
+    )
+
+
+def redact(parameters):
+    """
+    Replaces the parameter values that may be sensitive with ``'***'``.
+
+    Args:
+        parameters: The parameters of a statement, a sequence or mapping of
+            values or, for ``executemany``, a sequence of those.
+
+    Returns:
+        The parameters with the same shape, with only numbers, dates,
+        booleans and NULLs left as they are.
+    """
+    if isinstance(parameters, dict):
+        return {name: redact(value) for name, value in parameters.items()}
+
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(redact(value) for value in parameters)
+
+    if isinstance(parameters, SAFE_PARAMETERS):
+        return parameters
+
+    return "***"
+
+
+slow_query_log = SlowQueryLog(
+    threshold=float(os.environ.get("SLOW_QUERY_MS", 500)) / 1000,
+    explain_rate=float(os.environ.get("SLOW_QUERY_EXPLAIN_RATE", 0)),
+    plan_log=os.environ.get("SLOW_QUERY_PLAN_LOG", "slow_query_plans.log"),
+)
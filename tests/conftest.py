@@ -3,7 +3,9 @@ import pytest  # noqa
 from tests.fixtures.client import (
     client,
     dummy_admin,
+    dummy_booking,
     dummy_field,  # noqa
     dummy_owner,
     dummy_user,
 )
+from tests.fixtures.redis import redis_server  # noqa
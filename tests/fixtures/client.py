@@ -1,30 +1,43 @@
-from datetime import time
+from datetime import datetime, time
+from typing import Iterator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import SQLModel
+from sqlmodel import Session, SQLModel
 
-from db import FootballField, Owner, User, engine, session
+from cache import response_cache
+from db import Booking, FootballField, Owner, User, engine
+from db.invalidation import invalidation_bus
+from db.replicas import primary_pins
 from main import app
+from routers.auth import session_cache
+from routers.fields import availability_cache
 
 
 @pytest.fixture()
-def client() -> TestClient:
+def client() -> Iterator[TestClient]:
     """
     This fixture is used to create a test client that will be used to make
     requests to the API. The client is created once per test function.
     """
-    client = TestClient(app)
-
     SQLModel.metadata.drop_all(bind=engine)
     SQLModel.metadata.create_all(bind=engine)
+    availability_cache.clear()
+    response_cache.clear()
+    session_cache.clear()
+    primary_pins.clear()
 
-    return client
+    # Entering the client keeps one event loop for the whole test, which
+    # the async engine's connections are bound to.
+    with TestClient(app) as client:
+        # The listener clears every cache once it connects.
+        assert invalidation_bus.connected.wait(timeout=5)
+        yield client
 
 
 @pytest.fixture()
 def dummy_admin():
-    with session:
+    with Session(engine) as session:
         admin_user = User(
             username="testadmin",
             name="testAdmin",
@@ -38,7 +51,7 @@ def dummy_admin():
 
 @pytest.fixture()
 def dummy_owner():
-    with session:
+    with Session(engine) as session:
         owner_user = Owner(
             username="testowner",
             name="testOwner",
@@ -52,7 +65,7 @@ def dummy_owner():
 
 @pytest.fixture()
 def dummy_user():
-    with session:
+    with Session(engine) as session:
         user = User(
             username="testuser",
             name="testUser",
@@ -66,7 +79,7 @@ def dummy_user():
 
 @pytest.fixture()
 def dummy_field():
-    with session:
+    with Session(engine) as session:
         field = FootballField(
             name="testField",
             owner_id=1,
@@ -82,3 +95,19 @@ def dummy_field():
         session.add(field)
         session.commit()
         session.refresh(field)
+
+
+@pytest.fixture()
+def dummy_booking():
+    with Session(engine) as session:
+        booking = Booking(
+            user_id=1,
+            field_id=1,
+            booking_date=datetime(2023, 10, 21, 10, 0, 0),
+            booked_until=datetime(2023, 10, 21, 12, 0, 0),
+            total_price=5200,
+        )
+
+        session.add(booking)
+        session.commit()
+        session.refresh(booking)
@@ -0,0 +1,27 @@
+import re
+
+import httpx
+
+SERVER_TIMING = re.compile(
+    r'db;dur=(?P<duration>[\d.]+);desc="(?P<count>\d+) queries"'
+)
+
+
+def query_count(response: httpx.Response) -> int:
+    """
+    Returns the number of queries the request issued, as reported in the
+    response's ``Server-Timing`` header.
+    """
+    match = SERVER_TIMING.search(response.headers.get("server-timing", ""))
+    assert match, "Response carries no database Server-Timing entry"
+
+    return int(match["count"])
+
+
+def assert_query_budget(response: httpx.Response, budget: int):
+    """
+    Fails if the request behind ``response`` issued more than ``budget``
+    queries.
+    """
+    count = query_count(response)
+    assert count <= budget, f"{count} queries issued, budget is {budget}"
@@ -0,0 +1,144 @@
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Iterator
+
+import pytest
+
+from cache.resp import Connection
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """
+    A local stand-in for a Redis server, speaking the protocol for the
+    handful of commands the response cache sends.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RedisHandler)
+        self.lock = threading.Lock()
+        self.values = {}
+        self.expiries = {}
+        self.commands = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"redis://{host}:{port}/0"
+
+    def alive(self, key: bytes) -> bool:
+        expires = self.expiries.get(key)
+        if expires is not None and expires < time.monotonic():
+            self.values.pop(key, None)
+            self.expiries.pop(key, None)
+
+        return key in self.values
+
+    def run(self, command: list[bytes]):
+        name, *args = command
+        name = name.decode().upper()
+        self.commands.append(name)
+
+        with self.lock:
+            if name in ("PING", "SELECT"):
+                return "PONG" if name == "PING" else "OK"
+
+            if name == "GET":
+                return (
+                    self.values.get(args[0]) if self.alive(args[0]) else None
+                )
+
+            if name == "SET":
+                key, value, *options = args
+                self.values[key] = value
+                self.expiries.pop(key, None)
+                if options and options[0].upper() == b"PX":
+                    self.expiries[key] = (
+                        time.monotonic() + int(options[1]) / 1000
+                    )
+                return "OK"
+
+            if name == "DEL":
+                deleted = [key for key in args if self.alive(key)]
+                for key in deleted:
+                    del self.values[key]
+                return len(deleted)
+
+            if name == "SADD":
+                key, *members = args
+                if not self.alive(key):
+                    self.values[key] = set()
+                added = set(members) - self.values[key]
+                self.values[key] |= added
+                return len(added)
+
+            if name == "SMEMBERS":
+                return (
+                    list(self.values[args[0]]) if self.alive(args[0]) else []
+                )
+
+            if name == "PEXPIRE":
+                if not self.alive(args[0]):
+                    return 0
+                self.expiries[args[0]] = time.monotonic() + int(args[1]) / 1000
+                return 1
+
+            if name == "SCAN":
+                pattern = args[args.index(b"MATCH") + 1].decode()
+                keys = [
+                    key
+                    for key in list(self.values)
+                    if self.alive(key)
+                    and fnmatch.fnmatchcase(key.decode(), pattern)
+                ]
+                return [b"0", keys]
+
+        raise ValueError(f"ERR unknown command '{name}'")
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        connection = Connection(self.request)
+
+        while True:
+            try:
+                command = connection.read()
+            except ConnectionError:
+                return
+
+            try:
+                reply = self.server.run(command)
+            except ValueError as e:
+                self.wfile.write(f"-{e}\r\n".encode())
+                continue
+
+            self.wfile.write(reply_bytes(reply))
+
+
+def reply_bytes(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+    return b"*%d\r\n" % len(reply) + b"".join(reply_bytes(x) for x in reply)
+
+
+@pytest.fixture()
+def redis_server() -> Iterator[RedisStandIn]:
+    server = RedisStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
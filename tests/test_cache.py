@@ -0,0 +1,253 @@
+import logging
+import time
+from datetime import date, datetime
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session
+
+from cache import RedisBackend, ResponseCache, response_cache
+from db import Owner, engine
+from db.invalidation import invalidation_bus
+from routers.auth import Principal, create_session, session_cache
+from routers.fields import availability_cache
+from tests.fixtures.redis import RedisStandIn
+
+
+def cached(response) -> bool:
+    assert response.status_code == 200
+    return response.headers["x-cache"] == "hit"
+
+
+def check_invalidation(client: TestClient):
+    with Session(engine) as session:
+        user = {"Cookie": f"session_id={create_session(session, 1)}"}
+        owner = {
+            "Cookie": "session_id=" + create_session(session, 1, is_owner=True)
+        }
+
+    today = datetime.today().date().isoformat()
+    urls = [
+        "/fields/",
+        "/fields/1",
+        f"/fields/1/bookings/{today}",
+        "/owners/1?include=fields,bookings",
+    ]
+
+    for url in urls:
+        assert not cached(client.get(url))
+        assert cached(client.get(url))
+
+    # The query string is normalized, the path is not.
+    assert cached(client.get("/owners/1?include=fields,bookings&"))
+    assert not cached(client.get("/owners/1"))
+
+    noon = datetime.today().replace(hour=12, minute=0, second=0, microsecond=0)
+    response = client.post(
+        "/bookings/",
+        json={
+            "field_id": 1,
+            "booking_date": noon.isoformat(),
+            "booked_until": noon.replace(hour=13).isoformat(),
+        },
+        headers=user,
+    )
+    assert response.status_code == 201
+
+    assert cached(client.get("/fields/"))
+    assert cached(client.get("/fields/1"))
+
+    response = client.get(f"/fields/1/bookings/{today}")
+    assert not cached(response)
+    assert response.json() == [{"from": "12:00:00", "to": "13:00:00"}]
+
+    response = client.get("/owners/1?include=fields,bookings")
+    assert not cached(response)
+    assert len(response.json()["fields"][0]["bookings"]) == 1
+
+    response = client.put(
+        "/fields/1", json={"name": "renamedField"}, headers=owner
+    )
+    assert response.status_code == 200
+
+    response = client.get("/fields/")
+    assert not cached(response)
+    assert response.json()[0]["name"] == "renamedField"
+    assert not cached(client.get("/fields/1"))
+    assert cached(client.get(f"/fields/1/bookings/{today}"))
+
+    # Authenticated routes sharing a prefix are never cached.
+    assert "x-cache" not in client.get("/fields/owner", headers=owner).headers
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner", "dummy_field")
+def test_response_cache(client: TestClient):
+    check_invalidation(client)
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner", "dummy_field")
+def test_redis_response_cache(
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    redis_server: RedisStandIn,
+):
+    monkeypatch.setattr(
+        response_cache, "backend", RedisBackend(redis_server.url)
+    )
+
+    check_invalidation(client)
+
+    assert {"GET", "SET", "SADD", "SMEMBERS", "DEL"} <= set(
+        redis_server.commands
+    )
+
+
+@pytest.mark.usefixtures("client")
+def test_cached_responses_keep_headers(client: TestClient):
+    with Session(engine) as session:
+        session.add_all(
+            Owner(username=f"owner{i}", name=f"Owner {i}", password="x")
+            for i in range(3)
+        )
+        session.commit()
+
+    miss = client.get("/owners/", params={"limit": 2})
+    hit = client.get("/owners/", params={"limit": 2})
+
+    assert not cached(miss) and cached(hit)
+    assert hit.json() == miss.json()
+    assert hit.headers["link"] == miss.headers["link"]
+    assert hit.headers["content-type"] == miss.headers["content-type"]
+    assert hit.headers["content-length"] == str(len(hit.content))
+
+
+def test_redis_backend(redis_server: RedisStandIn):
+    cache = ResponseCache(RedisBackend(redis_server.url))
+
+    cache.set("/a?", b"application/json\n[1]", 60, ["x", "y"])
+    cache.set("/b?", b"application/json\n[2]", 60, ["y"])
+    cache.set("/c?", b"application/json\n[3]", 0.001, [])
+    time.sleep(0.01)
+
+    assert cache.get("/a?") == b"application/json\n[1]"
+    assert cache.get("/c?") is None
+
+    cache.invalidate("x")
+
+    assert cache.get("/a?") is None
+    assert cache.get("/b?") == b"application/json\n[2]"
+
+    cache.clear()
+
+    assert cache.get("/b?") is None
+    assert cache.hits == 2 and cache.misses == 3
+
+
+@pytest.mark.usefixtures("client", "dummy_owner", "dummy_field")
+def test_response_cache_unavailable(
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+):
+    # Nothing listens on port 1.
+    monkeypatch.setattr(
+        response_cache, "backend", RedisBackend("redis://127.0.0.1:1")
+    )
+
+    with caplog.at_level(logging.WARNING):
+        assert not cached(client.get("/fields/1"))
+        assert not cached(client.get("/fields/1"))
+
+    assert "Response cache lookup failed" in caplog.text
+
+
+def notify(**keys):
+    payload = orjson.dumps({"origin": "another-worker", "keys": keys})
+
+    with engine.begin() as connection:
+        connection.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": invalidation_bus.channel, "payload": payload.decode()},
+        )
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+
+    return False
+
+
+OCTOBER = date(2023, 10, 1)
+
+
+def cache_availability(client: TestClient):
+    response = client.get(
+        "/fields/1/availability", params={"month": "2023-10"}
+    )
+    assert response.status_code == 200
+    assert availability_cache.get((1, OCTOBER)) is not None
+
+
+def fill_caches(client: TestClient):
+    cache_availability(client)
+    availability_cache.set((2, OCTOBER), [])
+    session_cache.set("a", Principal(id=1, is_owner=False, username="a"))
+    session_cache.set("b", Principal(id=1, is_owner=True, username="b"))
+    response_cache.set("/fields/1?", b"application/json\n{}", 60, ["field:1"])
+
+
+@pytest.mark.usefixtures("client", "dummy_owner", "dummy_field")
+def test_invalidation_from_another_worker(client: TestClient):
+    fill_caches(client)
+    received = invalidation_bus.received
+
+    notify(
+        availability=["1"],
+        principals=["owner:1"],
+        responses=["field:1"],
+        unknown=["1"],
+    )
+    assert wait_for(lambda: invalidation_bus.received > received)
+
+    assert availability_cache.get((1, OCTOBER)) is None
+    assert availability_cache.get((2, OCTOBER)) == []
+    assert session_cache.get("a") is not None
+    assert session_cache.get("b") is None
+    assert response_cache.get("/fields/1?") is None
+
+    # A worker skips its own notifications, it evicted the keys already.
+    invalidation_bus.publish(sessions=["a"])
+    notify(sessions=["missing"])
+    assert wait_for(lambda: invalidation_bus.received == received + 2)
+    assert session_cache.get("a") is None
+
+
+@pytest.mark.usefixtures("client", "dummy_owner", "dummy_field")
+def test_invalidation_listener_reconnects(client: TestClient):
+    # Whatever is cached may miss an invalidation while disconnected.
+    fill_caches(client)
+    connections = invalidation_bus.connections
+
+    with engine.begin() as connection:
+        terminated = connection.execute(
+            text(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE query LIKE 'LISTEN %'"
+            )
+        ).scalars()
+        assert list(terminated) == [True]
+
+    assert wait_for(lambda: invalidation_bus.connections > connections)
+
+    assert len(availability_cache) == 0 and len(session_cache) == 0
+    assert response_cache.get("/fields/1?") is None
+
+    cache_availability(client)
+    notify(availability=["1"])
+    assert wait_for(lambda: availability_cache.get((1, OCTOBER)) is None)
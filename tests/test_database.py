@@ -0,0 +1,526 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, delete, func, select
+
+from db import (
+    Booking,
+    FootballField,
+    OutboxEvent,
+    Owner,
+    User,
+    dispose_async_engine,
+    engine,
+    get_session,
+    replicas,
+)
+from db.maintenance import delete_field
+from db.invalidation import invalidation_bus
+from db.replicas import ReplicaSet, pin_key, primary_pins
+from main import app
+from routers.auth import create_session
+from routers.bookings import create_booking_async, get_field_bookings_async
+from routers.fields import get_fields_async
+from telemetry import (
+    QueryTimingMiddleware,
+    SlowQueryLog,
+    instrument,
+    queries,
+    request_metrics,
+)
+from tests.fixtures.queries import assert_query_budget, query_count
+from tests.test_cache import notify, wait_for
+from tests.test_fields import field_json
+
+
+@pytest.mark.usefixtures("client", "dummy_owner")
+def test_concurrent_requests_use_separate_sessions(client: TestClient):
+    lock = threading.Lock()
+    active = set()
+    shared = []
+
+    def tracked_session():
+        for session in get_session():
+            with lock:
+                if id(session) in active:
+                    shared.append(session)
+
+                active.add(id(session))
+
+            try:
+                yield session
+            finally:
+                with lock:
+                    active.discard(id(session))
+
+    with Session(engine) as session:
+        session_id = create_session(session, 1, is_owner=True)
+
+    headers = {"Cookie": f"session_id={session_id}"}
+
+    def create_field(i: int):
+        return client.post(
+            "/fields/",
+            json={**field_json, "name": f"field{i}"},
+            headers=headers,
+        )
+
+    def list_fields(_: int):
+        return client.get("/fields/")
+
+    app.dependency_overrides[get_session] = tracked_session
+
+    try:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            created = list(executor.map(create_field, range(50)))
+            listed = list(executor.map(list_fields, range(50)))
+    finally:
+        app.dependency_overrides.pop(get_session)
+
+    assert [x.status_code for x in created] == [201] * 50
+    assert [x.status_code for x in listed] == [200] * 50
+    assert not shared
+
+    with Session(engine) as session:
+        assert session.scalar(select(func.count(FootballField.id))) == 50
+
+
+@pytest.mark.usefixtures("client", "dummy_admin")
+def test_pool_status(client: TestClient):
+    with Session(engine) as session:
+        session_id = create_session(session, 1)
+
+    response = client.get(
+        "/system/pool", headers={"Cookie": f"session_id={session_id}"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["checkouts"] > 0
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner", "dummy_field")
+def test_async_handlers():
+    async_app = FastAPI()
+    async_app.add_api_route("/fields/", get_fields_async)
+    async_app.add_api_route(
+        "/bookings/", create_booking_async, methods=["POST"]
+    )
+    async_app.add_api_route(
+        "/bookings/field/{field_id}", get_field_bookings_async
+    )
+
+    with Session(engine) as session:
+        user_session_id = create_session(session, 1)
+        owner_session_id = create_session(session, 1, is_owner=True)
+
+    with TestClient(async_app) as client:
+        response = client.get("/fields/")
+
+        assert response.status_code == 200
+        assert [x["name"] for x in response.json()] == ["testField"]
+
+        booking = {
+            "field_id": 1,
+            "booking_date": datetime(2023, 10, 21, 10, 0, 0).isoformat(),
+            "booked_until": datetime(2023, 10, 21, 12, 0, 0).isoformat(),
+        }
+        response = client.post(
+            "/bookings/",
+            json=booking,
+            headers={"Cookie": f"session_id={user_session_id}"},
+        )
+
+        assert response.status_code == 200
+        assert response.json()["total_price"] == 5200
+
+        response = client.post(
+            "/bookings/",
+            json=booking,
+            headers={"Cookie": f"session_id={user_session_id}"},
+        )
+
+        assert response.status_code == 422
+
+        response = client.get(
+            "/bookings/field/1",
+            headers={"Cookie": f"session_id={owner_session_id}"},
+        )
+
+        assert response.status_code == 200
+        assert [x["user_id"] for x in response.json()] == [1]
+
+        response = client.get(
+            "/bookings/field/1",
+            headers={"Cookie": f"session_id={user_session_id}"},
+        )
+
+        assert response.status_code == 403
+
+        client.portal.call(dispose_async_engine)
+
+
+def test_replica_set():
+    url = engine.url.render_as_string(hide_password=False)
+    replica_set = ReplicaSet(
+        ["postgresql+psycopg2://postgres@/postgres?host=/tmp/missing", url],
+        health_interval=60,
+    )
+
+    replica_set.check_all()
+    chosen = [replica_set.choose() for _ in range(3)]
+
+    assert chosen == [replica_set.replicas[1].engine] * 3
+    assert [x["healthy"] for x in replica_set.status()] == [False, True]
+
+
+def test_replica_checks_stay_off_the_request_path(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    replica_set = ReplicaSet(
+        ["postgresql+psycopg2://postgres@/postgres?host=/tmp/missing"],
+        health_interval=60,
+    )
+    replica = replica_set.replicas[0]
+    release = threading.Event()
+    checks = []
+
+    # Unchecked replicas are skipped.
+    monkeypatch.setattr(replica_set, "check", checks.append)
+    assert replica_set.choose() is None
+    for _ in range(100):
+        if checks:
+            break
+        time.sleep(0.01)
+
+    assert checks == [replica]
+
+    replica.healthy = True
+    replica.checked_at = float("-inf")
+    replica.checking = False
+
+    def slow_check(replica):
+        checks.append(replica)
+        release.wait(5)
+        replica.healthy = False
+        replica.checked_at = time.monotonic()
+        replica.checking = False
+
+    checks.clear()
+    monkeypatch.setattr(replica_set, "check", slow_check)
+
+    # The stale replica goes by its last result while one check runs.
+    started = time.monotonic()
+    chosen = [replica_set.choose() for _ in range(10)]
+
+    assert time.monotonic() - started < 1
+    assert chosen == [replica.engine] * 10
+    assert checks == [replica]
+
+    release.set()
+    for _ in range(100):
+        if not replica.checking:
+            break
+        time.sleep(0.01)
+
+    assert replica_set.choose() is None
+    assert checks == [replica]
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner", "dummy_field")
+def test_read_your_writes(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    replica_set = ReplicaSet(
+        [engine.url.render_as_string(hide_password=False)]
+    )
+    replica = replica_set.replicas[0].engine
+    chosen = []
+
+    monkeypatch.setattr(replicas, "replica_set", replica_set)
+    monkeypatch.setattr(
+        replica_set, "choose", lambda: chosen.append(replica) or replica
+    )
+
+    with Session(engine) as session:
+        session_id = create_session(session, 1)
+
+    headers = {"Cookie": f"session_id={session_id}"}
+
+    response = client.get("/fields/", headers=headers)
+
+    assert response.status_code == 200
+    assert chosen == [replica]
+
+    response = client.get(
+        "/owners/1", params={"include": "fields,bookings"}, headers=headers
+    )
+
+    assert response.status_code == 200
+    assert chosen == [replica] * 2
+
+    response = client.post(
+        "/bookings/",
+        json={
+            "field_id": 1,
+            "booking_date": datetime(2023, 10, 21, 10, 0, 0).isoformat(),
+            "booked_until": datetime(2023, 10, 21, 12, 0, 0).isoformat(),
+        },
+        headers=headers,
+    )
+
+    assert response.status_code == 201
+    assert primary_pins.get(pin_key(session_id))
+
+    response = client.get("/fields/1", headers=headers)
+
+    assert response.status_code == 200
+    assert chosen == [replica] * 2
+
+    replica.dispose()
+
+
+@pytest.mark.usefixtures("client")
+def test_primary_pins_reach_other_workers():
+    received = invalidation_bus.received
+
+    notify(pins=[pin_key("written-elsewhere")])
+
+    assert wait_for(lambda: invalidation_bus.received > received)
+    assert primary_pins.get(pin_key("written-elsewhere"))
+
+
+def test_import_is_lazy():
+    env = {
+        **os.environ,
+        "POSTGRESQL_URL": "",
+        "POSTGRESQL_REPLICA_URLS": "postgresql+psycopg2://replica/postgres",
+    }
+    worker = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, main; assert 'psycopg2' not in sys.modules",
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    assert worker.returncode == 0, worker.stderr
+
+    worker = subprocess.run(
+        [sys.executable, "-c", "from db import engine"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    assert worker.returncode != 0
+    assert "RuntimeError: POSTGRESQL_URL must be set" in worker.stderr
+
+
+@pytest.mark.usefixtures(
+    "client", "dummy_user", "dummy_owner", "dummy_field", "dummy_booking"
+)
+def test_query_budgets(client: TestClient):
+    with Session(engine) as session:
+        user_session_id = create_session(session, 1)
+        owner_session_id = create_session(session, 1, is_owner=True)
+
+    user = {"Cookie": f"session_id={user_session_id}"}
+    owner = {"Cookie": f"session_id={owner_session_id}"}
+
+    assert_query_budget(client.get("/fields/"), 1)
+    assert_query_budget(client.get("/fields/1"), 1)
+    assert_query_budget(
+        client.get("/fields/1/availability", params={"month": "2023-10"}), 1
+    )
+
+    # Loading the principal costs two queries until it is cached.
+    assert_query_budget(client.get("/bookings/field/1", headers=owner), 4)
+    assert_query_budget(client.get("/bookings/field/1", headers=owner), 2)
+
+    response = client.post(
+        "/bookings/",
+        json={
+            "field_id": 1,
+            "booking_date": datetime(2023, 10, 22, 10, 0, 0).isoformat(),
+            "booked_until": datetime(2023, 10, 22, 12, 0, 0).isoformat(),
+        },
+        headers=user,
+    )
+
+    # One of them appends the outbox event, one queues the notice job and
+    # another notifies the other workers of the evicted availability.
+    assert response.status_code == 201
+    assert_query_budget(response, 9)
+
+
+@pytest.mark.usefixtures("client", "dummy_user")
+def test_repeated_statement_warning(caplog: pytest.LogCaptureFixture):
+    instrument()
+
+    app = FastAPI()
+    app.add_middleware(QueryTimingMiddleware, threshold=2)
+
+    @app.get("/users/{count}")
+    def get_users(count: int, session: Session = Depends(get_session)):
+        return [
+            session.get(User, 1, populate_existing=True).id
+            for _ in range(count)
+        ]
+
+    client = TestClient(app)
+
+    assert query_count(client.get("/users/2")) == 2
+    assert not caplog.records
+
+    assert query_count(client.get("/users/3")) == 3
+    assert "/users/{count} ran the same statement 3 times" in caplog.text
+
+
+@pytest.mark.usefixtures("client", "dummy_owner", "dummy_field")
+def test_metrics(client: TestClient):
+    request_metrics.clear()
+
+    assert client.get("/fields/").status_code == 200
+    assert client.get("/fields/1").status_code == 200
+    assert client.get("/fields/404").status_code == 404
+
+    response = client.get("/metrics")
+    metrics = response.text
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    assert (
+        'http_requests_total{method="GET",route="/fields/",status="200"} 1'
+        in metrics
+    )
+    assert (
+        'http_requests_total{method="GET",route="/fields/{field_id}",'
+        'status="404"} 1' in metrics
+    )
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/fields/{field_id}"} 2' in metrics
+    )
+    assert 'le="+Inf"' in metrics
+
+    assert 'db_pool_size{pool="primary"}' in metrics
+    assert 'cache_hits_total{cache="availability"}' in metrics
+    assert "password_hash_queue_depth 0" in metrics
+
+
+@pytest.mark.usefixtures("client", "dummy_user")
+def test_slow_query_log(
+    caplog: pytest.LogCaptureFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path,
+):
+    instrument()
+
+    slow_queries = SlowQueryLog(
+        threshold=1e-9, explain_rate=1, plan_log=tmp_path / "plans.log"
+    )
+    monkeypatch.setattr(queries, "slow_query_log", slow_queries)
+
+    app = FastAPI()
+    app.add_middleware(QueryTimingMiddleware)
+
+    @app.get("/users/by-name/{username}")
+    def get_user(username: str, session: Session = Depends(get_session)):
+        statement = select(User).where(User.username == username)
+        return session.exec(statement).one().id
+
+    response = TestClient(app).get("/users/by-name/testuser")
+    slow_queries.close()
+
+    assert response.status_code == 200
+    assert "Slow query" in caplog.text
+    assert "from /users/by-name/{username}" in caplog.text
+    assert "'***'" in caplog.text
+    assert "testuser" not in caplog.text
+
+    plans = (tmp_path / "plans.log").read_text()
+    assert "/users/by-name/{username}" in plans
+    assert "Buffers" in plans or "Execution Time" in plans
+    assert "testuser" not in plans
+
+
+@pytest.mark.usefixtures("client", "dummy_user")
+def test_slow_query_plans_have_no_side_effects(tmp_path):
+    slow_queries = SlowQueryLog(
+        threshold=1e-9, explain_rate=1, plan_log=tmp_path / "plans.log"
+    )
+    slow_queries.executor()
+
+    statements = [
+        "WITH d AS (DELETE FROM users RETURNING id) SELECT count(*) FROM d",
+        "SELECT id FROM users WHERE id = %(id)s FOR UPDATE SKIP LOCKED",
+        "SELECT id FROM users WHERE id = %(id)s",
+    ]
+    for statement in statements:
+        slow_queries._explaining.acquire()
+        slow_queries.explain(engine, statement, {"id": 1}, None)
+    slow_queries.close()
+
+    with Session(engine) as session:
+        assert session.scalar(select(func.count()).select_from(User)) == 1
+
+    plans = (tmp_path / "plans.log").read_text().split("\n\n")
+    assert ["Execution Time" in plan for plan in plans if plan] == [
+        False,
+        False,
+        True,
+    ]
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner", "dummy_field")
+def test_delete_in_batches():
+    with Session(engine) as session:
+        session.add_all(
+            Booking(
+                user_id=1,
+                field_id=1,
+                booking_date=datetime(2023, 10, day, 10, 0, 0),
+                booked_until=datetime(2023, 10, day, 11, 0, 0),
+                total_price=2600,
+            )
+            for day in range(1, 6)
+        )
+        session.commit()
+
+    assert delete_field(1, batch_size=2) == 5
+
+    with Session(engine) as session:
+        assert session.scalar(select(func.count()).select_from(Booking)) == 0
+        assert session.get(FootballField, 1) is None
+
+        events = session.scalars(
+            select(OutboxEvent).order_by(OutboxEvent.id)
+        ).all()
+
+    assert [(x.topic, x.key) for x in events] == [
+        *(("booking.deleted", i) for i in range(1, 6)),
+        ("field.deleted", 1),
+    ]
+    assert events[0].payload["booking_date"] == "2023-10-01T10:00:00"
+
+
+@pytest.mark.usefixtures(
+    "client", "dummy_user", "dummy_owner", "dummy_field", "dummy_booking"
+)
+def test_foreign_keys_cascade():
+    with Session(engine) as session:
+        session.execute(delete(Owner).where(Owner.id == 1))
+        session.commit()
+
+        assert session.scalar(select(func.count()).select_from(Booking)) == 0
+        assert session.get(FootballField, 1) is None
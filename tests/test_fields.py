@@ -241,3 +241,41 @@ def test_get_field(client: TestClient):
     )
 
     assert response.status_code == 404
+
+
+@pytest.mark.usefixtures(
+    "client", "dummy_user", "dummy_owner", "dummy_field", "dummy_booking"
+)
+def test_get_field_availability(client: TestClient):
+    response = client.get(
+        "/fields/1/availability", params={"month": "2023-10"}
+    )
+
+    assert response.status_code == 200
+
+    days = response.json()
+
+    assert len(days) == 31
+    assert days[0] == {
+        "date": "2023-10-01",
+        "booked_minutes": 0,
+        "free_percent": 100.0,
+    }
+    assert days[20] == {
+        "date": "2023-10-21",
+        "booked_minutes": 120,
+        "free_percent": 83.33,
+    }
+
+    response = client.get(
+        "/fields/1/availability", params={"month": "2023-13"}
+    )
+
+    assert response.status_code == 422
+
+    response = client.get(
+        "/fields/2/availability", params={"month": "2023-10"}
+    )
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Field not found"}
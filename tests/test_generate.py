@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from db import Booking, FootballField, User, engine, passwords
+from db.generate import DatasetOptions, generate
+
+options = DatasetOptions(
+    owners=3,
+    fields=10,
+    users=20,
+    bookings=500,
+    days=30,
+    password="generated",
+    seed=1,
+)
+
+
+@pytest.mark.usefixtures("client")
+def test_generate():
+    loaded = generate(engine, options)
+
+    assert loaded == {
+        "owners": 3,
+        "football_fields": 10,
+        "users": 20,
+        "bookings": 500,
+    }
+
+    with Session(engine) as session:
+        fields = {x.id: x for x in session.scalars(select(FootballField))}
+        bookings = session.scalars(
+            select(Booking).order_by(Booking.field_id, Booking.booking_date)
+        ).all()
+        user = session.get(User, 1)
+
+    assert passwords.verify_password("generated", user.password)
+
+    previous = None
+    for booking in bookings:
+        field = fields[booking.field_id]
+
+        assert field.start_time <= booking.booking_date.time()
+        assert booking.booked_until.time() <= field.end_time
+        assert booking.booked_until > booking.booking_date
+
+        if previous is not None and previous.field_id == booking.field_id:
+            assert previous.booked_until <= booking.booking_date
+
+        previous = booking
+
+
+@pytest.mark.usefixtures("client")
+def test_generate_appends():
+    generate(engine, options)
+    generate(engine, options)
+
+    with Session(engine) as session:
+        session.add(
+            Booking(
+                user_id=1,
+                field_id=1,
+                booking_date=datetime(2030, 1, 1, 10, 0, 0),
+                booked_until=datetime(2030, 1, 1, 11, 0, 0),
+                total_price=2600,
+            )
+        )
+        session.commit()
+
+        counts = session.execute(
+            text(
+                "SELECT (SELECT count(*) FROM users), "
+                "(SELECT max(id) FROM bookings)"
+            )
+        ).one()
+
+    assert tuple(counts) == (40, 1001)
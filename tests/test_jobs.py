@@ -0,0 +1,207 @@
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from db import Job, engine
+from db.jobs import JobQueue, background_job, job_queue
+from db.models.job import JobStatus
+from routers.auth import create_session
+
+
+def queue(**kwargs) -> tuple[JobQueue, list[dict]]:
+    received = []
+
+    queue = JobQueue(backoff=0, **kwargs)
+    queue.task("test", received.append)
+
+    return queue, received
+
+
+def add_jobs(*jobs: Job):
+    with Session(engine) as session:
+        session.add_all(jobs)
+        session.commit()
+
+
+def jobs() -> list[Job]:
+    with Session(engine) as session:
+        return session.scalars(select(Job).order_by(Job.id)).all()
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner", "dummy_field")
+def test_booking_mutations_queue_jobs(
+    client: TestClient, caplog: pytest.LogCaptureFixture
+):
+    with Session(engine) as session:
+        user = {"Cookie": f"session_id={create_session(session, 1)}"}
+        owner = {
+            "Cookie": "session_id=" + create_session(session, 1, is_owner=True)
+        }
+
+    response = client.post(
+        "/bookings/",
+        json={
+            "field_id": 1,
+            "booking_date": "2023-10-22T10:00:00",
+            "booked_until": "2023-10-22T12:00:00",
+        },
+        headers=user,
+    )
+    assert response.is_success
+    assert client.put(
+        "/bookings/1", json={"status": "confirmed"}, headers=owner
+    ).is_success
+
+    assert [(x.name, x.payload) for x in jobs()] == [
+        ("booking.notify", {"booking_id": 1, "user_id": 1, "status": x})
+        for x in ("pending", "confirmed")
+    ]
+
+    with caplog.at_level(logging.INFO):
+        assert job_queue.drain() == 2
+
+    assert "Booking 1 of user 1 is confirmed" in caplog.text
+    assert jobs() == []
+
+
+@pytest.mark.usefixtures("client")
+def test_jobs_run_once_due():
+    jobs_queue, received = queue(batch_size=2)
+
+    add_jobs(
+        *(background_job("test", {"i": i}) for i in range(3)),
+        background_job("test", {"i": 3}, delay=60),
+    )
+
+    assert jobs_queue.drain() == 3
+    assert received == [{"i": 0}, {"i": 1}, {"i": 2}]
+    assert [x.payload for x in jobs()] == [{"i": 3}]
+
+
+@pytest.mark.usefixtures("client")
+def test_failed_jobs_retry_then_die():
+    jobs_queue, _ = queue()
+    failures = []
+
+    @jobs_queue.task("flaky")
+    def flaky(payload: dict):
+        failures.append(payload)
+        raise RuntimeError("handler failed")
+
+    add_jobs(
+        background_job("flaky", {}, max_attempts=2),
+        background_job("missing", {}, max_attempts=1),
+    )
+
+    assert jobs_queue.drain() == 2
+
+    retried, dead = jobs()
+    assert (retried.status, retried.attempts) == (JobStatus.pending, 1)
+    assert "RuntimeError: handler failed" in retried.last_error
+    assert dead.status == JobStatus.dead
+    assert "No handler for job missing" in dead.last_error
+
+    assert jobs_queue.drain() == 1
+    assert jobs_queue.drain() == 0
+    assert len(failures) == 2
+    assert {x.status for x in jobs()} == {JobStatus.dead}
+
+    assert jobs_queue.requeue_dead("flaky") == 1
+    assert jobs_queue.drain() == 1
+    assert len(failures) == 3
+
+
+def test_retry_delay_backs_off():
+    jobs_queue = JobQueue(backoff=10, max_backoff=60)
+
+    assert 5 <= jobs_queue.retry_delay(1) <= 10
+    assert 20 <= jobs_queue.retry_delay(3) <= 40
+    assert 30 <= jobs_queue.retry_delay(10) <= 60
+
+
+@pytest.mark.usefixtures("client")
+def test_workers_skip_locked_jobs():
+    jobs_queue, received = queue()
+
+    add_jobs(*(background_job("test", {"i": i}) for i in range(2)))
+
+    with Session(engine) as other_worker:
+        locked = other_worker.scalars(
+            select(Job).where(Job.id == 1).with_for_update()
+        ).one()
+
+        # Waiting on the lock would hang here.
+        assert jobs_queue.drain() == 1
+        assert received == [{"i": 1}]
+
+        other_worker.delete(locked)
+        other_worker.commit()
+
+    assert jobs() == []
+
+
+@pytest.mark.usefixtures("client")
+def test_handlers_run_outside_the_claim():
+    jobs_queue, _ = queue()
+    locked = []
+
+    @jobs_queue.task("check")
+    def check(payload: dict):
+        with Session(engine) as other_worker:
+            locked.append(
+                other_worker.scalars(
+                    select(Job).with_for_update(skip_locked=True)
+                ).all()
+            )
+
+    add_jobs(background_job("check", {}))
+
+    assert jobs_queue.drain() == 1
+    assert len(locked[0]) == 1
+    assert jobs() == []
+
+
+@pytest.mark.usefixtures("client")
+def test_jobs_of_a_crashed_worker_run_again():
+    jobs_queue, received = queue(lease=0)
+
+    add_jobs(
+        background_job("test", {"i": 0}),
+        background_job("test", {"i": 1}, max_attempts=1),
+    )
+
+    # A worker claims both and stops before running them.
+    assert len(jobs_queue.claim()) == 2
+
+    assert jobs_queue.drain() == 2
+    assert received == [{"i": 0}]
+
+    job = jobs()[0]
+    assert (job.status, job.attempts) == (JobStatus.dead, 2)
+    assert "stopped during every attempt" in job.last_error
+
+
+@pytest.mark.usefixtures("client")
+def test_worker_entry_point():
+    add_jobs(
+        background_job(
+            "booking.notify",
+            {"booking_id": 1, "user_id": 1, "status": "pending"},
+        )
+    )
+
+    worker = subprocess.run(
+        [sys.executable, "worker.py", "--once"],
+        cwd=Path(__file__).parents[1],
+        capture_output=True,
+        text=True,
+    )
+
+    assert worker.returncode == 0, worker.stderr
+    assert "Ran 1 job(s)" in worker.stdout
+    assert jobs() == []
@@ -0,0 +1,108 @@
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel
+
+from db import engine
+from db.migrations import discover, upgrade
+
+
+def reset_database():
+    SQLModel.metadata.drop_all(bind=engine)
+
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+
+
+def column_types() -> dict[str, dict[str, str]]:
+    inspector = inspect(engine)
+
+    return {
+        table.name: {
+            column["name"]: column["type"].compile(dialect=engine.dialect)
+            for column in inspector.get_columns(table.name)
+        }
+        for table in SQLModel.metadata.sorted_tables
+    }
+
+
+def test_upgrade_matches_models():
+    reset_database()
+    SQLModel.metadata.create_all(bind=engine)
+    created = column_types()
+
+    reset_database()
+
+    applied = upgrade(engine)
+
+    assert [m.version for m in applied] == [m.version for m in discover()]
+    assert upgrade(engine) == []
+
+    migrated = column_types()
+    assert migrated == created
+
+    for table in SQLModel.metadata.sorted_tables:
+        # Read from pg_indexes, since reflection skips expression indexes.
+        with engine.connect() as connection:
+            indexes = set(
+                connection.execute(
+                    text(
+                        "SELECT indexname FROM pg_indexes "
+                        "WHERE tablename = :table"
+                    ),
+                    {"table": table.name},
+                ).scalars()
+            )
+
+        assert set(migrated[table.name]) == set(table.columns.keys())
+        assert {index.name for index in table.indexes} <= indexes
+
+
+def test_upgrade_existing_database():
+    reset_database()
+
+    upgrade(engine, target=1)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO sessions (session_id, user_id, is_owner) "
+                "VALUES ('legacy', 1, false)"
+            )
+        )
+
+    upgrade(engine)
+
+    with engine.begin() as connection:
+        expires_at = connection.execute(
+            text("SELECT expires_at FROM sessions WHERE session_id = 'legacy'")
+        ).scalar()
+
+    assert expires_at is not None
+
+
+def test_upgrade_converts_booking_status():
+    reset_database()
+
+    # As created by create_all before the status was an enum.
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE bookings ("
+                "id SERIAL PRIMARY KEY, user_id INTEGER NOT NULL, "
+                "field_id INTEGER NOT NULL, "
+                "booking_date TIMESTAMP NOT NULL, "
+                "booked_until TIMESTAMP NOT NULL, "
+                "total_price FLOAT NOT NULL, status VARCHAR NOT NULL); "
+                "INSERT INTO bookings (user_id, field_id, booking_date, "
+                "booked_until, total_price, status) "
+                "VALUES (1, 1, now(), now(), 10, 'confirmed')"
+            )
+        )
+
+    upgrade(engine, target=1)
+
+    with engine.connect() as connection:
+        status = connection.execute(
+            text("SELECT pg_typeof(status)::text, status FROM bookings")
+        ).one()
+
+    assert tuple(status) == ("bookingstatus", "confirmed")
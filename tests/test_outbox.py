@@ -0,0 +1,141 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from db import OutboxEvent, engine
+from db.maintenance import delete_owner
+from db.outbox import OutboxDispatcher, outbox_event
+from routers.auth import create_session
+from tests.test_fields import field_json
+
+
+def dispatcher() -> tuple[OutboxDispatcher, list[OutboxEvent]]:
+    received = []
+
+    dispatcher = OutboxDispatcher("test", batch_size=2)
+    dispatcher.subscribe("*", received.append)
+    dispatcher.drain()
+
+    return dispatcher, received
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner")
+def test_mutations_append_events(client: TestClient):
+    with Session(engine) as session:
+        user = {"Cookie": f"session_id={create_session(session, 1)}"}
+        owner = {
+            "Cookie": "session_id=" + create_session(session, 1, is_owner=True)
+        }
+
+    assert client.post("/fields/", json=field_json, headers=owner).is_success
+    assert client.put(
+        "/fields/1", json={"price": 3000}, headers=owner
+    ).is_success
+
+    response = client.post(
+        "/bookings/",
+        json={
+            "field_id": 1,
+            "booking_date": "2023-10-22T10:00:00",
+            "booked_until": "2023-10-22T12:00:00",
+        },
+        headers=user,
+    )
+    assert response.is_success
+    assert client.put(
+        "/bookings/1", json={"status": "confirmed"}, headers=owner
+    ).is_success
+    assert client.delete("/bookings/1", headers=user).is_success
+    assert client.delete("/fields/1", headers=owner).is_success
+
+    with Session(engine) as session:
+        events = session.scalars(
+            select(OutboxEvent).order_by(OutboxEvent.id)
+        ).all()
+
+    assert [(x.topic, x.key) for x in events] == [
+        ("field.created", 1),
+        ("field.updated", 1),
+        ("booking.created", 1),
+        ("booking.updated", 1),
+        ("booking.deleted", 1),
+        ("field.deleted", 1),
+    ]
+    assert events[1].payload["price"] == 3000
+    assert events[3].payload["status"] == "confirmed"
+    assert events[2].payload["booking_date"] == "2023-10-22T10:00:00"
+
+
+@pytest.mark.usefixtures(
+    "client", "dummy_user", "dummy_owner", "dummy_field", "dummy_booking"
+)
+def test_deleting_an_owner_appends_events():
+    assert delete_owner(1, batch_size=1) == [1]
+
+    with Session(engine) as session:
+        events = session.scalars(
+            select(OutboxEvent).order_by(OutboxEvent.id)
+        ).all()
+
+    assert [(x.topic, x.key) for x in events] == [
+        ("booking.deleted", 1),
+        ("field.deleted", 1),
+    ]
+    assert events[0].payload["status"] == "pending"
+
+
+@pytest.mark.usefixtures("client")
+def test_dispatcher_delivers_in_order():
+    outbox, received = dispatcher()
+
+    with Session(engine) as session:
+        session.add_all(outbox_event("test", i, {"i": i}) for i in range(5))
+        session.commit()
+
+    assert outbox.drain() == 5
+    assert [x.key for x in received] == list(range(5))
+
+    assert outbox.drain() == 0
+    assert len(received) == 5
+
+
+@pytest.mark.usefixtures("client")
+def test_dispatcher_redelivers_after_failure():
+    outbox, received = dispatcher()
+    failures = [2]
+
+    @outbox.subscribe("test")
+    def flaky(event: OutboxEvent):
+        if event.key in failures:
+            failures.remove(event.key)
+            raise RuntimeError("subscriber failed")
+
+    with Session(engine) as session:
+        session.add_all(outbox_event("test", i, {}) for i in range(4))
+        session.commit()
+
+    assert outbox.drain() == 2
+    assert outbox.drain() == 2
+
+    # The event that failed reached the other subscriber twice.
+    assert [x.key for x in received] == [0, 1, 2, 2, 3]
+
+
+@pytest.mark.usefixtures("client")
+def test_dispatcher_waits_for_earlier_transactions():
+    outbox, received = dispatcher()
+
+    with Session(engine) as slow, Session(engine) as fast:
+        slow.add(outbox_event("test", 1, {}))
+        slow.flush()
+
+        fast.add(outbox_event("test", 2, {}))
+        fast.commit()
+
+        # The committed event may sort before the pending one.
+        assert outbox.drain() == 0
+
+        slow.commit()
+
+    assert outbox.drain() == 2
+    assert sorted(x.key for x in received) == [1, 2]
@@ -1,5 +1,11 @@
+from datetime import date, datetime, time
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select
+
+from db import Booking, FootballField, UserSession, engine
+from tests.fixtures.queries import query_count
 
 
 @pytest.mark.usefixtures("client", "dummy_admin")
@@ -145,6 +151,39 @@ def test_delete_owner(client: TestClient):
     assert response.json() == {"message": "Owner deleted successfully"}
 
 
+@pytest.mark.usefixtures(
+    "client", "dummy_admin", "dummy_owner", "dummy_field", "dummy_booking"
+)
+def test_delete_owner_deletes_dependents(client: TestClient):
+    client.post(
+        "/owners/login",
+        json={"username": "testowner", "password": "testpass"},
+    )
+    client.cookies.clear()
+
+    response = client.post(
+        "/users/login",
+        json={"username": "testadmin", "password": "testpass"},
+    )
+
+    response = client.delete("/owners/1", cookies=response.cookies)
+
+    assert response.status_code == 200
+
+    with Session(engine) as session:
+        for Model, condition in [
+            (FootballField, True),
+            (Booking, True),
+            (UserSession, UserSession.is_owner == True),  # noqa: E712
+        ]:
+            stmt = select(func.count()).select_from(Model).where(condition)
+            assert session.scalar(stmt) == 0
+
+    response = client.get("/fields/1")
+
+    assert response.status_code == 404
+
+
 @pytest.mark.usefixtures("client", "dummy_owner")
 def test_prevent_logging_twice(client: TestClient):
     response = client.post(
@@ -191,3 +230,94 @@ def test_update_profile(client: TestClient):
             },
         },
     }
+
+
+@pytest.mark.usefixtures("client", "dummy_owner", "dummy_field")
+def test_get_owner_with_fields(client: TestClient):
+    today = date.today()
+
+    with Session(engine) as session:
+        session.add_all(
+            FootballField(
+                name=f"testField{i}",
+                owner_id=1,
+                location="Astana",
+                price=2600,
+                width=45,
+                length=65,
+                start_time=time(8, 0, 0),
+                end_time=time(23, 0, 0),
+            )
+            for i in range(2, 6)
+        )
+        session.commit()
+
+        session.add_all(
+            Booking(
+                user_id=1,
+                field_id=field_id,
+                booking_date=datetime.combine(day, time(hour, 0, 0)),
+                booked_until=datetime.combine(day, time(hour + 1, 0, 0)),
+                total_price=2600,
+                status=status,
+            )
+            for field_id, day, hour, status in [
+                (1, today, 12, "confirmed"),
+                (1, today, 10, "pending"),
+                (1, today, 14, "canceled"),
+                (2, date(2023, 10, 21), 12, "confirmed"),
+                (3, today, 20, "confirmed"),
+            ]
+        )
+        session.commit()
+
+    response = client.get("/owners/1")
+
+    assert response.status_code == 200
+    assert "fields" not in response.json()
+
+    response = client.get("/owners/1", params={"include": "fields"})
+    owner = response.json()
+
+    assert response.status_code == 200
+    assert owner["username"] == "testowner"
+    assert [x["id"] for x in owner["fields"]] == [1, 2, 3, 4, 5]
+    assert "bookings" not in owner["fields"][0]
+    assert query_count(response) == 1
+
+    response = client.get("/owners/1", params={"include": "fields,bookings"})
+    fields = response.json()["fields"]
+
+    assert fields[0]["bookings"] == [
+        {"from": "10:00:00", "to": "11:00:00"},
+        {"from": "12:00:00", "to": "13:00:00"},
+    ]
+    assert fields[1]["bookings"] == []
+    assert fields[2]["bookings"] == [{"from": "20:00:00", "to": "21:00:00"}]
+    assert query_count(response) == 2
+
+    response = client.get(
+        "/owners/1",
+        params={"include": "fields,bookings", "day": "2023-10-21"},
+    )
+
+    assert response.json()["fields"][1]["bookings"] == [
+        {"from": "12:00:00", "to": "13:00:00"}
+    ]
+
+    response = client.get("/owners/404", params={"include": "fields"})
+    assert response.status_code == 404
+
+    response = client.get("/owners/1", params={"include": "bookers"})
+    assert response.status_code == 422
+
+    response = client.get("/owners/1", params={"include": "bookings"})
+    assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("client", "dummy_owner")
+def test_get_owner_without_fields(client: TestClient):
+    response = client.get("/owners/1", params={"include": "fields,bookings"})
+
+    assert response.status_code == 200
+    assert response.json()["fields"] == []
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from db import engine
+from routers.auth import create_session
+
+
+@pytest.mark.usefixtures("client", "dummy_admin", "dummy_user")
+def test_profiling(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, tmp_path
+):
+    monkeypatch.chdir(tmp_path)
+
+    with Session(engine) as session:
+        admin = {"Cookie": f"session_id={create_session(session, 1)}"}
+        user = {"Cookie": f"session_id={create_session(session, 2)}"}
+
+    response = client.get("/users/profile", headers=user)
+    assert response.status_code == 200
+    assert "x-profile" not in response.headers
+
+    response = client.get("/users/profile?_profile=1", headers=user)
+    assert response.status_code == 403
+
+    response = client.get("/fields/", headers={"X-Profile": "1"})
+    assert response.status_code == 401
+
+    for query in ("my_profile=1", "_profile=0"):
+        response = client.get(f"/fields/?{query}")
+        assert response.status_code == 200
+        assert "x-profile" not in response.headers
+
+    response = client.get("/fields/", headers={"X-Profile": "0"})
+    assert response.status_code == 200
+    assert "x-profile" not in response.headers
+
+    response = client.get(
+        "/users/profile", headers={**admin, "X-Profile": "1"}
+    )
+    name = response.headers["x-profile"]
+
+    assert response.status_code == 200
+    assert response.json()["username"] == "testadmin"
+
+    assert client.get("/system/profiles", headers=admin).json() == [name]
+    assert client.get("/system/profiles", headers=user).status_code == 403
+
+    response = client.get(f"/system/profiles/{name}", headers=admin)
+    header, *stacks = response.text.splitlines()
+
+    assert response.status_code == 200
+    assert header.startswith("# GET /users/profile ")
+    for line in stacks:
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+    response = client.get("/system/profiles/..%2Fsecret.folded", headers=admin)
+    assert response.status_code == 404
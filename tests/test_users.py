@@ -1,5 +1,15 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from db import User, UserSession, engine, passwords
+from db.maintenance import purge_expired_sessions
+from routers import auth
+from routers.auth import Principal, create_session, session_cache
 
 
 @pytest.mark.usefixtures("client")
@@ -244,3 +254,274 @@ def test_update_user(client: TestClient):
             "name": "testUser2",
         },
     }
+
+
+@pytest.mark.usefixtures("client", "dummy_user")
+def test_session_cache(client: TestClient):
+    with Session(engine) as session:
+        session_id = create_session(session, 1)
+
+    headers = {"Cookie": f"session_id={session_id}"}
+
+    response = client.get("/users/profile", headers=headers)
+
+    assert response.status_code == 200
+    assert session_cache.get(session_id) == Principal(
+        id=1, is_owner=False, username="testuser"
+    )
+
+    response = client.post("/users/logout", headers=headers)
+
+    assert response.status_code == 200
+    assert session_cache.get(session_id) is None
+
+    response = client.get("/users/profile", headers=headers)
+
+    assert response.status_code == 401
+
+
+@pytest.mark.usefixtures("client", "dummy_user")
+def test_signed_session(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth, "SESSION_MODE", "signed")
+    monkeypatch.setattr(auth, "SESSION_SECRET", "testsecret")
+
+    with Session(engine) as session:
+        session_id = create_session(session, 1)
+
+    headers = {"Cookie": f"session_id={session_id}"}
+
+    response = client.get("/users/profile", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+
+    response = client.get(
+        "/users/profile", headers={"Cookie": f"session_id={session_id}x"}
+    )
+
+    assert response.status_code == 401
+
+    assert auth.verify_token(f"{session_id}é") is None
+
+    response = client.post("/users/logout", headers=headers)
+
+    assert response.status_code == 200
+
+    response = client.get("/users/profile", headers=headers)
+
+    assert response.status_code == 401
+
+
+@pytest.mark.usefixtures("client", "dummy_user", "dummy_owner", "dummy_admin")
+def test_signed_session_revoked_subjects(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(auth, "SESSION_MODE", "signed")
+    monkeypatch.setattr(auth, "SESSION_SECRET", "testsecret")
+
+    with Session(engine) as session:
+        user = {"Cookie": f"session_id={create_session(session, 1)}"}
+        owner = {
+            "Cookie": "session_id=" + create_session(session, 1, is_owner=True)
+        }
+        admin = {"Cookie": f"session_id={create_session(session, 2)}"}
+
+    # The renamed user's token carries the old username.
+    response = client.put(
+        "/users/profile", json={"username": "renamed"}, headers=user
+    )
+    assert response.status_code == 200
+    assert client.get("/users/profile", headers=user).status_code == 401
+
+    response = client.post(
+        "/users/login", json={"username": "renamed", "password": "testpass"}
+    )
+    assert response.status_code == 200
+    renamed = {"Cookie": f"session_id={response.cookies['session_id']}"}
+    assert client.get("/users/profile", headers=renamed).is_success
+
+    assert client.get("/fields/owner", headers=owner).status_code == 200
+    assert client.delete("/owners/1", headers=admin).status_code == 200
+    assert client.get("/fields/owner", headers=owner).status_code == 401
+
+    # Another worker reloads the revocations from the database.
+    auth.revocation_list._not_before.clear()
+    auth.revocation_list.refresh()
+    assert client.get("/fields/owner", headers=owner).status_code == 401
+
+
+def test_revocation_list_reloads_in_the_background(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+):
+    revocation_list = auth.RevocationList(refresh_interval=60)
+    revocation_list.add(["revoked"])
+    claims = {"jti": "revoked", "exp": time.time() + 60, "sub": 1, "own": 0}
+
+    def unreachable():
+        raise ConnectionError("database unreachable")
+
+    monkeypatch.setattr(auth, "get_engine", unreachable)
+
+    # A stale list is still checked without the database.
+    assert revocation_list.revoked(claims)
+
+    async def reload_once():
+        task = asyncio.create_task(revocation_list.refresh_periodically())
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(reload_once())
+
+    assert "Failed to reload revoked tokens" in caplog.text
+    assert revocation_list.revoked(claims)
+
+
+@pytest.mark.usefixtures("client", "dummy_user")
+def test_login_rehashes_password(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+
+    response = client.post(
+        "/users/login", json={"username": "testuser", "password": "testpass"}
+    )
+
+    assert response.status_code == 200
+
+    with Session(engine) as session:
+        user = session.get(User, 1)
+
+        assert user.password.startswith("$2b$04$")
+        assert user.verify_password("testpass")
+
+
+@pytest.mark.usefixtures("client", "dummy_user")
+def test_expired_session(client: TestClient):
+    with Session(engine) as session:
+        session_id = create_session(session, 1)
+
+    with Session(engine) as session:
+        user_session = session.scalar(
+            select(UserSession).where(UserSession.session_id == session_id)
+        )
+        user_session.expires_at = datetime.utcnow() - timedelta(minutes=1)
+
+        session.add(user_session)
+        session.commit()
+
+    response = client.get(
+        "/users/profile", headers={"Cookie": f"session_id={session_id}"}
+    )
+
+    assert response.status_code == 401
+
+    with Session(engine) as session:
+        active_session_id = create_session(session, 1)
+
+    assert purge_expired_sessions(batch_size=1) == 1
+
+    with Session(engine) as session:
+        assert session.scalars(select(UserSession.session_id)).all() == [
+            active_session_id
+        ]
+
+
+@pytest.mark.usefixtures("client", "dummy_admin")
+def test_import_users(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+
+    with Session(engine) as session:
+        headers = {"Cookie": f"session_id={create_session(session, 1)}"}
+
+    users = [
+        {"username": f"member{i}", "name": "Member", "password": "password1"}
+        for i in range(5)
+    ]
+    users += [
+        {"username": "testadmin", "name": "Admin", "password": "password1"},
+        {"username": "member0", "name": "Again", "password": "password1"},
+        {"username": "bad name", "name": "Bad", "password": "password1"},
+        {"username": "nopassword", "name": "None"},
+    ]
+
+    response = client.post("/users/import", json=users, headers=headers)
+    result = response.json()
+
+    assert response.status_code == 200
+    assert result["created"] == 5
+    assert [(x["index"], x["username"]) for x in result["errors"]] == [
+        (5, "testadmin"),
+        (6, "member0"),
+        (7, "bad name"),
+        (8, "nopassword"),
+    ]
+    assert result["errors"][0]["detail"] == "Username already exists"
+    assert result["errors"][2]["detail"][0]["loc"] == ["username"]
+
+    with Session(engine) as session:
+        member = session.scalar(select(User).where(User.username == "member4"))
+
+    assert member.verify_password("password1")
+
+    response = client.post("/users/import", json=users[:2], headers=headers)
+
+    assert response.json()["created"] == 0
+
+    with Session(engine) as session:
+        user_headers = {
+            "Cookie": f"session_id={create_session(session, member.id)}"
+        }
+
+    response = client.post("/users/import", json=users, headers=user_headers)
+
+    assert response.status_code == 403
+
+
+@pytest.mark.usefixtures("client", "dummy_admin")
+def test_user_directory(client: TestClient):
+    with Session(engine) as session:
+        session.add_all(
+            User(username=username, name=name, password="unused")
+            for username, name in [
+                ("aigerim", "Aigerim Omarova"),
+                ("arman_k", "Arman Kassymov"),
+                ("dias", "Dias Abenov"),
+                ("madina", "Madina Armanova"),
+                ("zhanna", "Zhanna 100%"),
+            ]
+        )
+        session.commit()
+
+        headers = {"Cookie": f"session_id={create_session(session, 1)}"}
+
+    def usernames(response) -> list[str]:
+        assert response.status_code == 200
+        return [x["username"] for x in response.json()]
+
+    response = client.get("/users/?limit=4", headers=headers)
+    assert usernames(response) == ["testadmin", "aigerim", "arman_k", "dias"]
+
+    next_page = response.links["next"]["url"]
+    assert "after=4" in next_page
+
+    response = client.get(next_page, headers=headers)
+    assert usernames(response) == ["madina", "zhanna"]
+    assert "link" not in response.headers
+
+    response = client.get("/users/?prefix=AR", headers=headers)
+    assert usernames(response) == ["arman_k"]
+
+    response = client.get("/users/?prefix=a&limit=1&after=2", headers=headers)
+    assert usernames(response) == ["arman_k"]
+
+    response = client.get("/users/?search=arman", headers=headers)
+    assert usernames(response) == ["arman_k", "madina"]
+
+    response = client.get("/users/?search=100%25", headers=headers)
+    assert usernames(response) == ["zhanna"]
+
+    response = client.get("/users/?search=n_k", headers=headers)
+    assert usernames(response) == ["arman_k"]
+
+    response = client.get("/users/?search=ab", headers=headers)
+    assert response.status_code == 422
@@ -0,0 +1,60 @@
+"""
+Runs the background job queue in a process of its own.
+
+Usage:
+    python worker.py [--once]
+    python worker.py requeue-dead [--name NAME]
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from dotenv import load_dotenv
+
+import routers  # noqa: F401, registers the job handlers
+from db.jobs import job_queue
+
+load_dotenv()
+
+
+async def run():
+    task = asyncio.create_task(job_queue.run())
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python worker.py")
+    parser.add_argument(
+        "--once", action="store_true", help="run the due jobs and exit"
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    requeue_parser = commands.add_parser(
+        "requeue-dead", help="make dead jobs pending again"
+    )
+    requeue_parser.add_argument("--name", help="only requeue these jobs")
+
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+
+    if args.command == "requeue-dead":
+        print(f"Requeued {job_queue.requeue_dead(args.name)} job(s)")
+    elif args.once:
+        print(f"Ran {job_queue.drain()} job(s)")
+    else:
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()